@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.utils import timezone
+from crm_cryo.db import estimated_table_rows
+from crm_cryo.exports import export_csv, export_jsonl
+from .changelist import EstimatedCountPaginator, KeysetChangeList
 from .models import Appointment, AppointmentHistory
 
 
@@ -40,6 +43,9 @@ class AppointmentAdmin(admin.ModelAdmin):
         'service__name'
     ]
     readonly_fields = [
+        'appointment_date',
+        'appointment_time',
+        'end_at',
         'end_time',
         'created_at',
         'updated_at',
@@ -50,6 +56,10 @@ class AppointmentAdmin(admin.ModelAdmin):
     date_hierarchy = 'appointment_date'
     inlines = [AppointmentHistoryInline]
     
+    # Above this many rows the changelist switches to estimated counts and
+    # keyset pagination on (appointment_date, appointment_time, id)
+    large_table_rows = 100000
+    
     fieldsets = (
         ('Appointment Details', {
             'fields': (
@@ -61,9 +71,11 @@ class AppointmentAdmin(admin.ModelAdmin):
         }),
         ('Schedule', {
             'fields': (
+                'start_at',
+                'duration_minutes',
+                'end_at',
                 'appointment_date',
                 'appointment_time',
-                'duration_minutes',
                 'end_time'
             )
         }),
@@ -104,7 +116,9 @@ class AppointmentAdmin(admin.ModelAdmin):
         'mark_as_confirmed',
         'mark_as_completed',
         'mark_as_cancelled',
-        'send_reminders'
+        'send_reminders',
+        export_csv,
+        export_jsonl
     ]
     
     def get_package_info(self, obj):
@@ -121,15 +135,41 @@ class AppointmentAdmin(admin.ModelAdmin):
     mark_as_confirmed.short_description = "Mark as confirmed"
     
     def mark_as_completed(self, request, queryset):
+        from django.contrib import messages
+        from django.core.exceptions import ValidationError
+        
+        count = 0
         for appointment in queryset:
             if appointment.status not in ['COMPLETED', 'CANCELLED']:
                 appointment.status = 'COMPLETED'
-                appointment.save()
-        self.message_user(request, f"{queryset.count()} appointments completed.")
+                try:
+                    appointment.save()
+                except ValidationError as e:
+                    # The package refused the session; the appointment is left as it was
+                    self.message_user(request, f"{appointment}: {e.messages[0]}", level=messages.WARNING)
+                    continue
+                count += 1
+        self.message_user(request, f"{count} appointments completed.")
     mark_as_completed.short_description = "Mark as completed"
     
     def mark_as_cancelled(self, request, queryset):
-        queryset.update(status='CANCELLED')
+        from django.db import transaction
+        from clients.models import ClientStats
+        from packages.sessions import refund_session
+        
+        with transaction.atomic():
+            # update() skips save(); give back the package sessions cancelled visits used
+            for appointment in queryset.filter(
+                session_redeemed=True, package_purchase__isnull=False
+            ).select_related('package_purchase'):
+                refund_session(appointment.package_purchase, appointment)
+            # and the stats signals; re-derive clients losing a completed visit
+            client_ids = list(
+                queryset.filter(status='COMPLETED').values_list('client_id', flat=True).distinct()
+            )
+            queryset.update(status='CANCELLED')
+            if client_ids:
+                ClientStats.objects.refresh(client_ids=client_ids)
         self.message_user(request, f"{queryset.count()} appointments cancelled.")
     mark_as_cancelled.short_description = "Mark as cancelled"
     
@@ -139,16 +179,31 @@ class AppointmentAdmin(admin.ModelAdmin):
         for appointment in queryset.filter(
             status__in=['SCHEDULED', 'CONFIRMED'],
             reminder_sent=False
-        ):
-            if appointment.is_upcoming():
-                send_appointment_reminder(appointment.id)
-                count += 1
+        ).upcoming():
+            send_appointment_reminder(appointment.id)
+            count += 1
         self.message_user(request, f"{count} reminders sent.")
     send_reminders.short_description = "Send appointment reminders"
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         return qs.select_related('client', 'service', 'package_purchase')
+    
+    def is_large_table(self, request):
+        if not hasattr(request, '_appointment_rows_estimate'):
+            request._appointment_rows_estimate = estimated_table_rows(self.model)
+        estimate = request._appointment_rows_estimate
+        return estimate is not None and estimate >= self.large_table_rows
+    
+    def get_changelist(self, request, **kwargs):
+        if self.is_large_table(request):
+            return KeysetChangeList
+        return super().get_changelist(request, **kwargs)
+    
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        if self.is_large_table(request):
+            return EstimatedCountPaginator(queryset, per_page, orphans, allow_empty_first_page)
+        return super().get_paginator(request, queryset, per_page, orphans, allow_empty_first_page)
 
 
 @admin.register(AppointmentHistory)
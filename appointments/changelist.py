@@ -0,0 +1,155 @@
+"""Changelist support for very large appointment tables"""
+from datetime import date, time
+
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from crm_cryo.db import estimated_queryset_rows, estimated_table_rows
+
+
+AFTER_VAR = 'after'
+BEFORE_VAR = 'before'
+
+# (appointment_date, appointment_time, id), newest first
+KEYSET_FIELDS = ('appointment_date', 'appointment_time', 'id')
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that trusts planner statistics instead of running COUNT(*)"""
+
+    @cached_property
+    def count(self):
+        estimate = None
+        if hasattr(self.object_list, 'query'):
+            if self.object_list.query.has_filters():
+                estimate = estimated_queryset_rows(self.object_list)
+            else:
+                estimate = estimated_table_rows(self.object_list.model, self.object_list.db)
+        if estimate is None:
+            return super().count
+        return estimate
+
+
+def encode_cursor(appointment):
+    return f"{appointment.appointment_date.isoformat()}_{appointment.appointment_time.isoformat()}_{appointment.pk}"
+
+
+def decode_cursor(value):
+    try:
+        day, at, pk = value.split('_')
+        return date.fromisoformat(day), time.fromisoformat(at), int(pk)
+    except ValueError:
+        raise IncorrectLookupParameters
+
+
+def keyset_before(day, at, pk):
+    """
+    Rows strictly older than the cursor in (date, time, id) order. The
+    redundant date bound is what the planner can use as the range start on
+    the (date, time, id) index; the OR alone would be a filter on every row.
+    """
+    return Q(appointment_date__lte=day) & (
+        Q(appointment_date__lt=day) |
+        Q(appointment_date=day, appointment_time__lt=at) |
+        Q(appointment_date=day, appointment_time=at, id__lt=pk)
+    )
+
+
+def keyset_after(day, at, pk):
+    """Rows strictly newer than the cursor in (date, time, id) order"""
+    return Q(appointment_date__gte=day) & (
+        Q(appointment_date__gt=day) |
+        Q(appointment_date=day, appointment_time__gt=at) |
+        Q(appointment_date=day, appointment_time=at, id__gt=pk)
+    )
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Changelist that pages with a (date, time, id) cursor instead of OFFSET.
+    Used only for the default newest-first ordering; explicit column sorts
+    fall back to regular pages with estimated counts.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.after = request.GET.get(AFTER_VAR)
+        self.before = request.GET.get(BEFORE_VAR)
+        self.keyset = ORDER_VAR not in request.GET
+        self.next_cursor = None
+        self.previous_cursor = None
+        super().__init__(request, *args, **kwargs)
+        # Date drill-down aggregates over the whole table; filters still apply
+        self.date_hierarchy = None
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+        lookup_params.pop(BEFORE_VAR, None)
+        return lookup_params
+
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+
+        if self.keyset:
+            result_list = self.get_keyset_page()
+            multi_page = bool(self.next_cursor or self.previous_cursor)
+        else:
+            try:
+                result_list = paginator.page(self.page_num).object_list
+            except InvalidPage:
+                raise IncorrectLookupParameters
+            multi_page = paginator.count > self.list_per_page
+
+        # Never run the unfiltered COUNT(*) for the "N total" link
+        self.result_count = paginator.count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.result_list = result_list
+        self.can_show_all = False
+        self.multi_page = multi_page
+        self.paginator = paginator
+
+    def get_keyset_page(self):
+        descending = self.queryset.order_by(*('-' + f for f in KEYSET_FIELDS))
+
+        if self.before:
+            # Walk towards newer rows, then flip back to newest-first
+            rows = list(
+                descending.filter(keyset_after(*decode_cursor(self.before)))
+                .reverse()[:self.list_per_page + 1]
+            )
+            has_more = len(rows) > self.list_per_page
+            rows = rows[:self.list_per_page][::-1]
+            if rows:
+                self.next_cursor = encode_cursor(rows[-1])
+                if has_more:
+                    self.previous_cursor = encode_cursor(rows[0])
+            return rows
+
+        if self.after:
+            descending = descending.filter(keyset_before(*decode_cursor(self.after)))
+        rows = list(descending[:self.list_per_page + 1])
+        has_more = len(rows) > self.list_per_page
+        rows = rows[:self.list_per_page]
+        if rows:
+            if has_more:
+                self.next_cursor = encode_cursor(rows[-1])
+            if self.after:
+                self.previous_cursor = encode_cursor(rows[0])
+        return rows
+
+    def get_next_url(self):
+        if self.next_cursor:
+            return self.get_query_string({AFTER_VAR: self.next_cursor}, [BEFORE_VAR])
+
+    def get_previous_url(self):
+        if self.previous_cursor:
+            return self.get_query_string({BEFORE_VAR: self.previous_cursor}, [AFTER_VAR])
+
+    def get_first_url(self):
+        if self.after or self.before:
+            return self.get_query_string(remove=[AFTER_VAR, BEFORE_VAR])
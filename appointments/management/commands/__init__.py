@@ -0,0 +1 @@
+# Appointments Management Commands
@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.utils import timezone
+
+from appointments.models import Appointment, AppointmentHistory
+from appointments.partitioning import (
+    convert_to_partitioned,
+    detach_partitions,
+    ensure_partitions,
+    is_partitioned,
+    month_start,
+)
+
+
+class Command(BaseCommand):
+    help = 'Manage monthly partitions of appointments and appointment history (PostgreSQL only)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='Rebuild unpartitioned tables as monthly range-partitioned tables'
+        )
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=12,
+            help='Number of future months to keep partitions for (default: 12)'
+        )
+        parser.add_argument(
+            '--retain-months',
+            type=int,
+            help='Detach partitions older than this many months; client stats then only count the retained months'
+        )
+        parser.add_argument(
+            '--archive-schema',
+            help='Schema to move detached partitions into'
+        )
+        parser.add_argument(
+            '--drop',
+            action='store_true',
+            help='Drop detached partitions instead of keeping them'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Table partitioning requires PostgreSQL.')
+        executor = MigrationExecutor(connection)
+        if executor.migration_plan(executor.loader.graph.leaf_nodes()):
+            # A pending migration may reference tables that conversion leaves unreferenceable
+            raise CommandError('Apply pending migrations before managing partitions.')
+
+        today = timezone.localdate()
+        # Appointments first: history rows reference them
+        for model in [Appointment, AppointmentHistory]:
+            table = model._meta.db_table
+
+            if not is_partitioned(model):
+                if not options['convert']:
+                    raise CommandError(f'{table} is not partitioned; run with --convert first.')
+                self.stdout.write(f'Converting {table} to monthly partitions...')
+                convert_to_partitioned(model, options['months_ahead'])
+                self.stdout.write(self.style.SUCCESS(f'  ✓ Converted {table}'))
+
+            created = ensure_partitions(model, month_start(today, options['months_ahead']))
+            for name in created:
+                self.stdout.write(f'  ✓ Created partition: {name}')
+
+            if options['retain_months'] is not None:
+                detached = detach_partitions(
+                    model,
+                    before=month_start(today, -options['retain_months']),
+                    archive_schema=options['archive_schema'],
+                    drop=options['drop']
+                )
+                for name in detached:
+                    self.stdout.write(f'  - Detached partition: {name}')
+
+        self.stdout.write(self.style.SUCCESS('Partition maintenance complete.'))
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:41
+
+from datetime import datetime, timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+BATCH_SIZE = 2000
+
+
+def backfill_start_end(apps, schema_editor):
+    """Populate start_at/end_at from the local appointment date and time"""
+    Appointment = apps.get_model('appointments', 'Appointment')
+    
+    rows = Appointment.objects.filter(start_at__isnull=True).only(
+        'id', 'appointment_date', 'appointment_time', 'duration_minutes'
+    ).order_by('id')
+    
+    batch = []
+    for appointment in rows.iterator(chunk_size=BATCH_SIZE):
+        appointment.start_at = timezone.make_aware(
+            datetime.combine(appointment.appointment_date, appointment.appointment_time)
+        )
+        appointment.end_at = appointment.start_at + timedelta(
+            minutes=appointment.duration_minutes
+        )
+        batch.append(appointment)
+        if len(batch) >= BATCH_SIZE:
+            Appointment.objects.bulk_update(batch, ['start_at', 'end_at'])
+            batch = []
+    
+    if batch:
+        Appointment.objects.bulk_update(batch, ['start_at', 'end_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='end_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='start_at',
+            field=models.DateTimeField(db_index=True, help_text='Appointment start (timezone-aware)', null=True),
+        ),
+        migrations.RunPython(backfill_start_end, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_appointment_start_at_end_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('reminder_sent', False), ('status__in', ['SCHEDULED', 'CONFIRMED'])), fields=['start_at', 'client', 'id'], name='appt_reminder_due_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:12
+
+from django.db import migrations, models
+
+
+def mark_redeemed(apps, schema_editor):
+    """Completed package appointments have already been counted against their purchase"""
+    Appointment = apps.get_model('appointments', 'Appointment')
+    Appointment.objects.filter(status='COMPLETED', package_purchase__isnull=False).update(session_redeemed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0003_appointment_appt_reminder_due_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='session_redeemed',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(mark_redeemed, migrations.RunPython.noop),
+    ]
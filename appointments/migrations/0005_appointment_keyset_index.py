@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0004_appointment_session_redeemed'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='appointment',
+            name='appointment_appoint_c5b816_idx',
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['appointment_date', 'appointment_time', 'id'], name='appt_keyset_idx'),
+        ),
+    ]
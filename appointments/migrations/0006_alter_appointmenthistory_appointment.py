@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_appointment_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appointmenthistory',
+            name='appointment',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='history', to='appointments.appointment'),
+        ),
+    ]
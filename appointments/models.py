@@ -1,9 +1,55 @@
-from django.db import models
+from django.db import models, transaction
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 from decimal import Decimal
 
 
+class AppointmentQuerySet(models.QuerySet):
+    """Window queries over the aware start_at column"""
+    
+    def starting_between(self, start, end):
+        """
+        Appointments starting in the half-open window [start, end)
+
+        The window's local dates bound appointment_date too, so that monthly
+        partitions of the table (keyed on appointment_date) are pruned; a day
+        either side covers rows saved under another active timezone.
+        """
+        from datetime import timedelta
+        return self.filter(
+            start_at__gte=start,
+            start_at__lt=end,
+            appointment_date__gte=timezone.localdate(start) - timedelta(days=1),
+            appointment_date__lte=timezone.localdate(end) + timedelta(days=1),
+        )
+    
+    def upcoming(self, within=None):
+        """Appointments starting from now, optionally within a timedelta"""
+        from datetime import timedelta
+        now = timezone.now()
+        if within is None:
+            return self.filter(
+                start_at__gt=now,
+                appointment_date__gte=timezone.localdate(now) - timedelta(days=1)
+            )
+        return self.starting_between(now, now + within)
+    
+    def reminder_due(self):
+        """Open appointments that have not had their reminder yet"""
+        return self.filter(
+            status__in=['SCHEDULED', 'CONFIRMED'],
+            reminder_sent=False
+        )
+    
+    def on_local_date(self, date):
+        """Appointments starting on a calendar day in the current timezone"""
+        from datetime import datetime, time, timedelta
+        start = timezone.make_aware(datetime.combine(date, time.min))
+        end = timezone.make_aware(datetime.combine(date + timedelta(days=1), time.min))
+        return self.starting_between(start, end)
+
+
 class Appointment(models.Model):
     """Client appointments for services"""
     
@@ -40,6 +86,18 @@ class Appointment(models.Model):
     )
     
     # Scheduling
+    start_at = models.DateTimeField(
+        null=True,
+        db_index=True,
+        help_text="Appointment start (timezone-aware)"
+    )
+    end_at = models.DateTimeField(
+        editable=False,
+        null=True,
+        blank=True,
+        db_index=True
+    )
+    # Local wall-clock values derived from start_at on save
     appointment_date = models.DateField()
     appointment_time = models.TimeField()
     duration_minutes = models.PositiveIntegerField()
@@ -93,38 +151,77 @@ class Appointment(models.Model):
     reminder_sent = models.BooleanField(default=False)
     reminder_sent_at = models.DateTimeField(null=True, blank=True)
     
+    # Set once a package session has been used for this appointment
+    session_redeemed = models.BooleanField(default=False, editable=False)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     
+    objects = AppointmentQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-appointment_date', '-appointment_time']
         verbose_name = 'Appointment'
         verbose_name_plural = 'Appointments'
         indexes = [
-            models.Index(fields=['appointment_date', 'appointment_time']),
+            # Keyset pages of the admin changelist seek on (date, time, id)
+            models.Index(fields=['appointment_date', 'appointment_time', 'id'], name='appt_keyset_idx'),
             models.Index(fields=['client', 'status']),
             models.Index(fields=['status']),
+            # Live subset scanned by send_daily_reminders
+            models.Index(
+                fields=['start_at', 'client', 'id'],
+                condition=models.Q(
+                    status__in=['SCHEDULED', 'CONFIRMED'],
+                    reminder_sent=False
+                ),
+                name='appt_reminder_due_idx'
+            ),
         ]
     
     def __str__(self):
-        return f"{self.client.get_full_name()} - {self.service.name} on {self.appointment_date}"
+        from services.catalog import get_catalog
+        service = get_catalog().services.get(self.service_id) or self.service
+        return f"{self.client.get_full_name()} - {service.name} on {self.appointment_date}"
     
-    def save(self, *args, **kwargs):
+    def get_start_at(self):
+        """start_at, or the aware start of a row with only a local date and time; None without either"""
+        from datetime import datetime
+        
+        if self.start_at is None and self.appointment_date and self.appointment_time:
+            return timezone.make_aware(datetime.combine(self.appointment_date, self.appointment_time))
+        return self.start_at
+    
+    def sync_schedule(self):
+        """Derive local date/time and the end of the slot from start_at"""
+        from datetime import timedelta
+        
+        # Rows created with only a local date and time get an aware start
+        self.start_at = self.get_start_at()
+        
+        if self.start_at is None:
+            return
+        
+        local_start = timezone.localtime(self.start_at)
+        self.appointment_date = local_start.date()
+        self.appointment_time = local_start.time()
+        
         # Calculate end time
-        if self.appointment_time and self.duration_minutes:
-            from datetime import datetime, timedelta
-            start_datetime = datetime.combine(
-                self.appointment_date,
-                self.appointment_time
-            )
-            end_datetime = start_datetime + timedelta(minutes=self.duration_minutes)
-            self.end_time = end_datetime.time()
+        if self.duration_minutes:
+            self.end_at = self.start_at + timedelta(minutes=self.duration_minutes)
+            self.end_time = timezone.localtime(self.end_at).time()
+    
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        self.sync_schedule()
         
         # Set service price if not set
         if not self.service_price:
-            self.service_price = self.service.base_price
+            from services.catalog import get_catalog
+            service = get_catalog().services.get(self.service_id) or self.service
+            self.service_price = service.base_price
         
         # Calculate final price
         if self.package_purchase:
@@ -142,22 +239,31 @@ class Appointment(models.Model):
             self.client.last_visit_date = self.appointment_date
             self.client.save()
         
+        if self.pk:
+            # Only redeem_session and refund_session change the flag; never write back a stale copy
+            self.session_redeemed = Appointment.objects.filter(pk=self.pk).values_list(
+                'session_redeemed', flat=True
+            ).first() or False
+        
         super().save(*args, **kwargs)
         
-        # Update package usage if applicable
-        if self.package_purchase and self.status == 'COMPLETED':
-            if self.package_purchase.sessions_used < self.package_purchase.total_sessions:
-                self.package_purchase.sessions_used += 1
-                self.package_purchase.save()
+        # Use a package session once per completed appointment; a refusal rolls back the whole save
+        if self.package_purchase and self.status == 'COMPLETED' and not self.session_redeemed:
+            from packages.sessions import redeem_session
+            redemption = redeem_session(self.package_purchase, self)
+            if not redemption:
+                raise ValidationError(redemption.reason)
+        # ...and give it back if the completion is reverted
+        elif self.package_purchase and self.status != 'COMPLETED' and self.session_redeemed:
+            from packages.sessions import refund_session
+            refund = refund_session(self.package_purchase, self)
+            if not refund:
+                raise ValidationError(refund.reason)
     
     def is_upcoming(self):
         """Check if appointment is in the future"""
-        from datetime import datetime
-        appointment_datetime = datetime.combine(
-            self.appointment_date,
-            self.appointment_time
-        )
-        return appointment_datetime > timezone.now()
+        start_at = self.get_start_at()
+        return start_at is not None and start_at > timezone.now()
     
     def can_be_cancelled(self):
         """Check if appointment can be cancelled"""
@@ -170,7 +276,9 @@ class AppointmentHistory(models.Model):
     appointment = models.ForeignKey(
         Appointment,
         on_delete=models.CASCADE,
-        related_name='history'
+        related_name='history',
+        # The table may be partitioned, which leaves nothing to reference (appointments.partitioning)
+        db_constraint=False
     )
     previous_status = models.CharField(max_length=20)
     new_status = models.CharField(max_length=20)
@@ -0,0 +1,243 @@
+"""Monthly range partitioning of appointment tables on PostgreSQL"""
+import re
+from datetime import date
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Appointment, AppointmentHistory
+
+
+# Partitioned model -> column holding the partition key
+PARTITION_KEYS = {
+    Appointment: 'appointment_date',
+    AppointmentHistory: 'changed_at',
+}
+
+PARTITION_SUFFIX = re.compile(r'_p(\d{4})_(\d{2})$')
+
+
+def month_start(day, offset=0):
+    """First day of the month `offset` months away from `day`"""
+    index = day.year * 12 + day.month - 1 + offset
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month.year:04d}_{month.month:02d}"
+
+
+def default_partition_name(table):
+    return f"{table}_default"
+
+
+def is_partitioned(model):
+    """Whether the model's table is a partitioned parent table"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)",
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def list_partitions(model):
+    """Return {month: partition table} for the partitions attached to the model's table"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = %s::regclass
+            """,
+            [model._meta.db_table]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        match = PARTITION_SUFFIX.search(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def create_default_partition(model):
+    """Create the partition catching rows outside every monthly range; returns its name if created"""
+    table = model._meta.db_table
+    name = default_partition_name(table)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NULL", [name])
+        if not cursor.fetchone()[0]:
+            return None
+        cursor.execute(f'CREATE TABLE "{name}" PARTITION OF "{table}" DEFAULT')
+    return name
+
+
+def create_partition(model, month):
+    """
+    Create the partition holding `month` if it does not exist yet.
+    Rows of that month already in the default partition are moved into it.
+    """
+    table = model._meta.db_table
+    key = PARTITION_KEYS[model]
+    name = partition_name(table, month)
+    default = default_partition_name(table)
+    bounds = [month, month_start(month, 1)]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NULL, to_regclass(%s) IS NOT NULL", [name, default])
+        missing, has_default = cursor.fetchone()
+        if not missing:
+            return name
+        # Attaching a range the default partition has rows for would fail
+        cursor.execute(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+        if has_default:
+            cursor.execute(
+                f'WITH moved AS (DELETE FROM "{default}" WHERE "{key}" >= %s AND "{key}" < %s RETURNING *) '
+                f'INSERT INTO "{name}" SELECT * FROM moved',
+                bounds
+            )
+        cursor.execute(
+            f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" '
+            f"FOR VALUES FROM ('{bounds[0].isoformat()}') TO ('{bounds[1].isoformat()}')"
+        )
+    return name
+
+
+def ensure_partitions(model, until):
+    """
+    Create the default partition if missing and every missing monthly
+    partition from the current month through `until`
+    """
+    existing = list_partitions(model)
+    month = month_start(timezone.localdate())
+    created = [name for name in [create_default_partition(model)] if name]
+    while month <= month_start(until):
+        if month not in existing:
+            created.append(create_partition(model, month))
+        month = month_start(month, 1)
+    return created
+
+
+def detach_partitions(model, before, archive_schema=None, drop=False):
+    """
+    Detach partitions whose whole month is older than `before`.
+    Detached tables are moved to `archive_schema` or dropped if requested.
+
+    Detached rows are gone from every query, including the nightly
+    ClientStats.refresh, which then recomputes lifetime stats from the
+    retained months only.
+    """
+    table = model._meta.db_table
+    detached = []
+    with connection.cursor() as cursor:
+        if archive_schema:
+            cursor.execute(f'CREATE SCHEMA IF NOT EXISTS "{archive_schema}"')
+        for month, name in sorted(list_partitions(model).items()):
+            if month_start(month, 1) > before:
+                continue
+            with transaction.atomic():
+                cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+                if drop:
+                    cursor.execute(f'DROP TABLE "{name}"')
+                elif archive_schema:
+                    cursor.execute(f'ALTER TABLE "{name}" SET SCHEMA "{archive_schema}"')
+            detached.append(name)
+    return detached
+
+
+def convert_to_partitioned(model, months_ahead=12):
+    """
+    Rebuild the model's table as a RANGE-partitioned table by month.
+
+    PostgreSQL requires the partition key in every unique constraint, so the
+    primary key becomes (id, key) and foreign keys pointing at the table are
+    dropped; Django still enforces on_delete behaviour in Python. Nothing can
+    reference the table afterwards, so every ForeignKey to Appointment or
+    AppointmentHistory must be declared with db_constraint=False. A default
+    partition catches rows outside the monthly ranges, such as history rows
+    written before the daily task has created a month's partition.
+    """
+    table = model._meta.db_table
+    key = PARTITION_KEYS[model]
+    staging = f"{table}_partitioned"
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE "{table}" IN ACCESS EXCLUSIVE MODE')
+
+        # Remember secondary indexes and outgoing foreign keys to recreate them
+        cursor.execute(
+            """
+            SELECT pg_get_indexdef(i.indexrelid)
+            FROM pg_index i
+            WHERE i.indrelid = %s::regclass AND NOT i.indisprimary
+            """,
+            [table]
+        )
+        index_definitions = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            """
+            SELECT conname, pg_get_constraintdef(oid)
+            FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype = 'f'
+              AND confrelid NOT IN (
+                  SELECT oid FROM pg_class WHERE relkind = 'p'
+              )
+            """,
+            [table]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            """
+            SELECT conrelid::regclass::text, conname
+            FROM pg_constraint
+            WHERE confrelid = %s::regclass AND contype = 'f'
+            """,
+            [table]
+        )
+        incoming_keys = cursor.fetchall()
+
+        cursor.execute(
+            f'CREATE TABLE "{staging}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE ("{key}")'
+        )
+
+        # Partitions for every month holding data plus the months ahead
+        cursor.execute(f'SELECT MIN("{key}")::date, MAX("{key}")::date FROM "{table}"')
+        first, last = cursor.fetchone()
+        today = timezone.localdate()
+        month = month_start(first or today)
+        until = max(month_start(last or today), month_start(today, months_ahead))
+        while month <= until:
+            cursor.execute(
+                f'CREATE TABLE "{partition_name(table, month)}" PARTITION OF "{staging}" '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{month_start(month, 1).isoformat()}')"
+            )
+            month = month_start(month, 1)
+        cursor.execute(f'CREATE TABLE "{default_partition_name(table)}" PARTITION OF "{staging}" DEFAULT')
+
+        cursor.execute(f'INSERT INTO "{staging}" SELECT * FROM "{table}"')
+        cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM "{table}"')
+        max_id = cursor.fetchone()[0]
+
+        for referencing_table, constraint in incoming_keys:
+            cursor.execute(f'ALTER TABLE {referencing_table} DROP CONSTRAINT "{constraint}"')
+        cursor.execute(f'DROP TABLE "{table}"')
+        cursor.execute(f'ALTER TABLE "{staging}" RENAME TO "{table}"')
+
+        cursor.execute(f'ALTER TABLE "{table}" ADD PRIMARY KEY (id, "{key}")')
+        cursor.execute(f'CREATE SEQUENCE "{table}_id_seq" OWNED BY "{table}".id')
+        cursor.execute(f'''ALTER TABLE "{table}" ALTER COLUMN id SET DEFAULT nextval('"{table}_id_seq"')''')
+        cursor.execute(
+            f'''SELECT setval('"{table}_id_seq"', %s, %s)''',
+            [max(max_id, 1), max_id > 0]
+        )
+
+        for definition in index_definitions:
+            cursor.execute(definition)
+        for constraint, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{constraint}" {definition}')
@@ -0,0 +1,168 @@
+"""Recurring appointment series for package purchases"""
+import math
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Appointment
+
+
+# Statuses that no longer occupy a slot or a package session
+INACTIVE_STATUSES = ['CANCELLED', 'NO_SHOW']
+
+DEFAULT_SESSION_TIME = time(10, 0)
+
+
+def _week_key(day):
+    iso = day.isocalendar()
+    return (iso[0], iso[1])
+
+
+def _overlaps(start, end, busy):
+    return any(b_start < end and start < b_end for b_start, b_end in busy)
+
+
+def propose_series(purchase, service=None, start_date=None, session_time=None,
+                   weekdays=None):
+    """
+    Propose the remaining sessions of a package purchase.
+
+    Sessions are spread evenly over the ISO weeks between start_date and the
+    purchase expiry date, respecting the package's min/max sessions per week.
+    Each week aims at an even share of what is still unbooked, so sessions a
+    week cannot take (a partial first week, excluded weekdays, conflicts)
+    move on to later weeks, and a last pass fills any week with room up to
+    the weekly maximum. Existing bookings for the purchase count towards
+    their week, and every slot is checked against the client's other
+    bookings, fetched in a single query. Returns unsaved Appointment instances.
+    """
+    package = purchase.package
+    if service is None:
+        service = package.services.order_by('id').first()
+    if service is None:
+        raise ValidationError(f"Package '{package.name}' has no services to book.")
+
+    session_time = session_time or DEFAULT_SESSION_TIME
+    duration = timedelta(minutes=service.duration_minutes)
+    start_date = max(start_date or timezone.localdate() + timedelta(days=1), purchase.purchase_date)
+    end_date = purchase.expiry_date
+    if start_date > end_date:
+        raise ValidationError("The package has expired; no sessions can be booked.")
+
+    window_start = timezone.make_aware(datetime.combine(start_date, time.min))
+    window_end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+
+    # One pass over every booking that could collide with the series or count towards its weeks
+    existing = list(
+        Appointment.objects.starting_between(window_start - duration, window_end)
+        .filter(Q(client_id=purchase.client_id) | Q(package_purchase=purchase))
+        .exclude(status__in=INACTIVE_STATUSES)
+        .values_list('start_at', 'end_at', 'client_id', 'package_purchase_id', 'appointment_date')
+    )
+    # Only the client's own time is blocked; bookings of a shared package by others just use sessions
+    busy = [(start, end) for start, end, client_id, _, _ in existing if client_id == purchase.client_id]
+    booked_per_week = {}
+    for _, _, _, purchase_id, day in existing:
+        if purchase_id == purchase.id:
+            booked_per_week[_week_key(day)] = booked_per_week.get(_week_key(day), 0) + 1
+
+    already_booked = Appointment.objects.filter(
+        package_purchase=purchase,
+        status__in=['SCHEDULED', 'CONFIRMED', 'CHECKED_IN', 'IN_PROGRESS']
+    ).count()
+    to_book = purchase.sessions_remaining - already_booked
+    if to_book <= 0:
+        return []
+
+    # Candidate days grouped by ISO week
+    weeks = {}
+    day = start_date
+    while day <= end_date:
+        if weekdays is None or day.weekday() in weekdays:
+            weeks.setdefault(_week_key(day), []).append(day)
+        day += timedelta(days=1)
+    weeks = sorted(weeks.items())
+
+    min_per_week = package.min_sessions_per_week or 1
+    max_per_week = package.max_sessions_per_week or to_book
+    proposals = []
+    taken_days = set()
+
+    def book(days, wanted):
+        """Book up to `wanted` sessions on the week's free days, spread evenly"""
+        days = [d for d in days if d not in taken_days]
+        if wanted <= 0 or not days:
+            return
+        step = max(len(days) // wanted, 1)
+        # Fall back to the other days on conflict
+        ordered = days[::step] + [d for d in days if d not in days[::step]]
+        for candidate in ordered:
+            if wanted <= 0:
+                break
+            start = timezone.make_aware(datetime.combine(candidate, session_time))
+            end = start + duration
+            if _overlaps(start, end, busy):
+                continue
+            appointment = Appointment(
+                client_id=purchase.client_id,
+                service=service,
+                package_purchase=purchase,
+                start_at=start,
+                duration_minutes=service.duration_minutes,
+                service_price=service.base_price,
+                discount_amount=Decimal('0.00'),
+                final_price=Decimal('0.00'),
+            )
+            appointment.sync_schedule()
+            proposals.append(appointment)
+            busy.append((start, end))
+            taken_days.add(candidate)
+            booked_per_week[_week_key(candidate)] = booked_per_week.get(_week_key(candidate), 0) + 1
+            wanted -= 1
+
+    for position, (week, days) in enumerate(weeks):
+        left = to_book - len(proposals)
+        if left <= 0:
+            break
+        # An even share of what is left over the weeks left, so earlier shortfalls carry forward
+        share = min(max_per_week, max(min_per_week, math.ceil(left / (len(weeks) - position))))
+        book(days, min(share - booked_per_week.get(week, 0), left))
+
+    # Whatever still doesn't fit goes into any week with room below the maximum
+    for week, days in weeks:
+        left = to_book - len(proposals)
+        if left <= 0:
+            break
+        book(days, min(max_per_week - booked_per_week.get(week, 0), left))
+
+    if len(proposals) < to_book:
+        raise ValidationError(
+            f"Only {len(proposals)} of {to_book} sessions fit before {end_date} "
+            f"within {max_per_week} sessions per week."
+        )
+
+    proposals.sort(key=lambda appointment: appointment.start_at)
+    return proposals
+
+
+def create_series(purchase, **options):
+    """Propose and insert the remaining sessions of a purchase in one bulk_create"""
+    from clients.models import ClientStats
+    from packages.models import PackagePurchase
+
+    with transaction.atomic():
+        # Serialize series generation per purchase
+        purchase = PackagePurchase.objects.select_for_update().select_related(
+            'package'
+        ).get(pk=purchase.pk)
+        if not purchase.can_book_session():
+            raise ValidationError(f"{purchase} cannot book further sessions.")
+        created = Appointment.objects.bulk_create(propose_series(purchase, **options))
+        # bulk_create skips the signals that keep client stats current
+        if created:
+            ClientStats.objects.apply_delta(purchase.client_id, total_appointments=len(created))
+        return created
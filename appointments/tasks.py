@@ -0,0 +1,17 @@
+from celery import shared_task
+from django.utils import timezone
+
+
+@shared_task
+def ensure_appointment_partitions(months_ahead=12):
+    """Create upcoming monthly partitions when the appointment tables are partitioned"""
+    from .models import Appointment, AppointmentHistory
+    from .partitioning import ensure_partitions, is_partitioned, month_start
+    
+    until = month_start(timezone.localdate(), months_ahead)
+    created = []
+    for model in [Appointment, AppointmentHistory]:
+        if is_partitioned(model):
+            created += ensure_partitions(model, until)
+    
+    return f"Created {len(created)} appointment partitions"
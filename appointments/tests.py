@@ -0,0 +1,205 @@
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.test import RequestFactory, TestCase
+from django.utils import timezone
+
+from clients.models import Client
+from packages.models import Package, PackagePurchase, SessionLedgerEntry
+from services.models import Service, ServiceType
+
+from .changelist import AFTER_VAR, BEFORE_VAR, KEYSET_FIELDS
+from .models import Appointment
+from .series import propose_series
+
+
+class AppointmentTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        service_type = ServiceType.objects.create(name='Cryotherapy', code='CRYO')
+        cls.service = Service.objects.create(
+            name='Whole Body', service_type=service_type, duration_minutes=30, base_price=Decimal('50.00')
+        )
+        cls.package = Package.objects.create(
+            name='Ten Pack', category='CUSTOM', description='Ten sessions', total_sessions=10,
+            price=Decimal('400.00')
+        )
+        cls.client_record = Client.objects.create(
+            first_name='Ann', last_name='Smith', email='ann@example.com', phone='555-0100'
+        )
+
+    def make_purchase(self, sessions=10):
+        return PackagePurchase.objects.create(
+            client=self.client_record, package=self.package,
+            expiry_date=timezone.localdate() + timedelta(days=90),
+            original_price=Decimal('400.00'), final_price=Decimal('400.00'),
+            total_sessions=sessions, sessions_remaining=sessions,
+        )
+
+    def make_appointment(self, start_at, **fields):
+        return Appointment.objects.create(
+            client=self.client_record, service=self.service, start_at=start_at, duration_minutes=30, **fields
+        )
+
+
+class ScheduleTests(AppointmentTestCase):
+
+    def test_local_fields_are_derived_from_the_aware_start(self):
+        with timezone.override('America/New_York'):
+            # 02:30 UTC is still the previous evening in New York
+            appointment = self.make_appointment(datetime(2026, 3, 3, 2, 30, tzinfo=dt_timezone.utc))
+
+        self.assertEqual((appointment.appointment_date, appointment.appointment_time), (date(2026, 3, 2), time(21, 30)))
+        self.assertEqual(appointment.end_at, datetime(2026, 3, 3, 3, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(appointment.end_time, time(22, 0))
+
+    def test_local_date_and_time_give_an_aware_start(self):
+        with timezone.override('America/New_York'):
+            appointment = Appointment.objects.create(
+                client=self.client_record, service=self.service, duration_minutes=30,
+                appointment_date=date(2026, 3, 2), appointment_time=time(21, 30),
+            )
+
+        self.assertEqual(appointment.start_at, datetime(2026, 3, 3, 2, 30, tzinfo=dt_timezone.utc))
+
+    def test_windows_are_half_open_local_days(self):
+        with timezone.override('America/New_York'):
+            day = date(2026, 3, 2)
+            late = self.make_appointment(timezone.make_aware(datetime.combine(day, time(23, 30))))
+            self.make_appointment(timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min)))
+            early = self.make_appointment(timezone.make_aware(datetime.combine(day, time.min)))
+
+            self.assertEqual(set(Appointment.objects.on_local_date(day)), {early, late})
+            self.assertEqual(
+                list(Appointment.objects.starting_between(early.start_at, late.start_at)), [early]
+            )
+
+    def test_is_upcoming_does_not_change_the_appointment(self):
+        self.assertFalse(Appointment(client=self.client_record, service=self.service).is_upcoming())
+
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        appointment = Appointment(
+            client=self.client_record, service=self.service, appointment_date=tomorrow, appointment_time=time(10)
+        )
+        self.assertTrue(appointment.is_upcoming())
+        self.assertIsNone(appointment.start_at)
+        self.assertIsNone(appointment.end_at)
+
+        appointment.appointment_date = timezone.localdate() - timedelta(days=1)
+        self.assertFalse(appointment.is_upcoming())
+
+
+class CancelActionTests(AppointmentTestCase):
+
+    def cancel(self, queryset):
+        request = RequestFactory().post('/')
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        admin.site._registry[Appointment].mark_as_cancelled(request, queryset)
+
+    def test_cancelling_a_completed_package_visit_refunds_its_session(self):
+        purchase = self.make_purchase()
+        appointment = self.make_appointment(
+            timezone.now() - timedelta(days=1), package_purchase=purchase, status='COMPLETED'
+        )
+        purchase.refresh_from_db()
+        self.assertEqual(purchase.sessions_remaining, 9)
+
+        self.cancel(Appointment.objects.filter(pk=appointment.pk))
+
+        appointment.refresh_from_db()
+        purchase.refresh_from_db()
+        self.assertEqual(appointment.status, 'CANCELLED')
+        self.assertFalse(appointment.session_redeemed)
+        self.assertEqual((purchase.sessions_used, purchase.sessions_remaining), (0, 10))
+        self.assertEqual(SessionLedgerEntry.objects.balance(purchase.pk), 10)
+        self.assertTrue(
+            SessionLedgerEntry.objects.filter(purchase=purchase, entry_type='REFUND', appointment=appointment).exists()
+        )
+
+
+class KeysetChangeListTests(AppointmentTestCase):
+
+    def setUp(self):
+        self.admin = admin.site._registry[Appointment]
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        per_page = self.admin.list_per_page
+        self.admin.list_per_page = 3
+        self.addCleanup(setattr, self.admin, 'list_per_page', per_page)
+        # SQLite keeps no row estimates, so the keyset changelist has to be asked for
+        self.admin.is_large_table = lambda request: True
+        self.addCleanup(delattr, self.admin, 'is_large_table')
+        start = timezone.now().replace(microsecond=0)
+        # Several rows share a date and time so pages must break ties on id
+        for offset in [0, 0, 0, 1, 1, 2, 24, 24, 48, 49]:
+            self.make_appointment(start - timedelta(hours=offset))
+
+    def page(self, **params):
+        request = RequestFactory().get('/admin/appointments/appointment/', params)
+        request.user = self.user
+        changelist = self.admin.get_changelist_instance(request)
+        return [row.pk for row in changelist.result_list], changelist
+
+    def test_pages_cover_every_row_once_in_order(self):
+        expected = list(
+            Appointment.objects.order_by(*('-' + field for field in KEYSET_FIELDS)).values_list('pk', flat=True)
+        )
+        pages, params = [], {}
+        while True:
+            rows, changelist = self.page(**params)
+            pages.append(rows)
+            if not changelist.next_cursor:
+                break
+            params = {AFTER_VAR: changelist.next_cursor}
+        self.assertEqual([pk for rows in pages for pk in rows], expected)
+        self.assertEqual([len(rows) for rows in pages], [3, 3, 3, 1])
+
+        # Walking back from the last page returns the same pages
+        back = [pages[-1]]
+        while changelist.previous_cursor:
+            rows, changelist = self.page(**{BEFORE_VAR: changelist.previous_cursor})
+            back.append(rows)
+        self.assertEqual(back[::-1], pages)
+
+
+class ProposeSeriesTests(AppointmentTestCase):
+
+    def setUp(self):
+        self.package.services.add(self.service)
+        Package.objects.filter(pk=self.package.pk).update(min_sessions_per_week=1, max_sessions_per_week=3)
+        self.package.refresh_from_db()
+        today = timezone.localdate()
+        # Three full ISO weeks starting next Monday
+        self.monday = today + timedelta(days=7 - today.weekday())
+        self.purchase = self.make_purchase(sessions=6)
+        PackagePurchase.objects.filter(pk=self.purchase.pk).update(expiry_date=self.monday + timedelta(days=20))
+        self.purchase.refresh_from_db()
+
+    def block_first_week(self, client):
+        for offset in range(7):
+            Appointment.objects.create(
+                client=client, service=self.service, duration_minutes=30,
+                start_at=timezone.make_aware(datetime.combine(self.monday + timedelta(days=offset), time(10, 0))),
+            )
+
+    def test_sessions_lost_to_conflicts_move_to_later_weeks(self):
+        self.block_first_week(self.client_record)
+
+        proposals = propose_series(self.purchase, start_date=self.monday)
+
+        self.assertEqual(len(proposals), 6)
+        weeks = [(appointment.appointment_date - self.monday).days // 7 for appointment in proposals]
+        self.assertEqual([weeks.count(week) for week in range(3)], [0, 3, 3])
+
+    def test_other_clients_bookings_of_the_service_do_not_clash(self):
+        other = Client.objects.create(first_name='Bob', last_name='Jones', email='bob@example.com', phone='555-0101')
+        self.block_first_week(other)
+
+        proposals = propose_series(self.purchase, start_date=self.monday)
+
+        weeks = [(appointment.appointment_date - self.monday).days // 7 for appointment in proposals]
+        self.assertEqual([weeks.count(week) for week in range(3)], [2, 2, 2])
@@ -1,7 +1,58 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
 from django.utils.html import format_html
 from django.urls import reverse
-from .models import Client
+from crm_cryo.exports import export_csv, export_jsonl
+from .models import Client, ClientProfile
+from .phones import PHONE_TERM, normalize_phone
+from .search import search_clients
+
+
+class RankedChangeList(ChangeList):
+    """Order indexed search results by rank unless a column sort is chosen"""
+    
+    def get_ordering(self, request, queryset):
+        if ORDER_VAR not in self.params and 'search_rank' in queryset.query.annotations:
+            return ['-search_rank', '-pk']
+        return super().get_ordering(request, queryset)
+
+
+class ClientProfileInline(admin.StackedInline):
+    model = ClientProfile
+    can_delete = False
+    max_num = 1
+    fieldsets = (
+        ('Address', {
+            'fields': (
+                'address_line1',
+                'address_line2',
+                'city',
+                'state',
+                'zip_code',
+                'country'
+            )
+        }),
+        ('Medical Information', {
+            'fields': (
+                'medical_conditions',
+                'medications',
+                'allergies',
+                'emergency_contact_name',
+                'emergency_contact_phone'
+            )
+        }),
+        ('Notes', {
+            'fields': ('notes',)
+        }),
+    )
+
+
+# Columns read by the changelist and the autocomplete widget
+CHANGELIST_FIELDS = [
+    'first_name', 'last_name', 'email', 'phone', 'is_active', 'registration_date',
+    'last_visit_date', 'stats__total_appointments', 'stats__lifetime_value',
+]
+AUTOCOMPLETE_FIELDS = ['first_name', 'last_name', 'email']
 
 
 @admin.register(Client)
@@ -13,15 +64,16 @@ class ClientAdmin(admin.ModelAdmin):
         'is_active',
         'registration_date',
         'last_visit_date',
-        'get_total_appointments',
-        'get_lifetime_value'
+        'total_appointments',
+        'lifetime_value'
     ]
     list_filter = [
         'is_active',
         'gender',
         'registration_date',
         'marketing_emails',
-        'email_notifications'
+        'email_notifications',
+        'segment__segment'
     ]
     search_fields = [
         'first_name',
@@ -38,9 +90,12 @@ class ClientAdmin(admin.ModelAdmin):
         'get_age',
         'get_total_appointments',
         'get_completed_appointments',
-        'get_lifetime_value'
+        'get_lifetime_value',
+        'referral_network'
     ]
     autocomplete_fields = ['referred_by']
+    inlines = [ClientProfileInline]
+    actions = ['merge_selected_clients', export_csv, export_jsonl]
     
     fieldsets = (
         ('Personal Information', {
@@ -54,27 +109,6 @@ class ClientAdmin(admin.ModelAdmin):
                 'gender'
             )
         }),
-        ('Address', {
-            'fields': (
-                'address_line1',
-                'address_line2',
-                'city',
-                'state',
-                'zip_code',
-                'country'
-            ),
-            'classes': ('collapse',)
-        }),
-        ('Medical Information', {
-            'fields': (
-                'medical_conditions',
-                'medications',
-                'allergies',
-                'emergency_contact_name',
-                'emergency_contact_phone'
-            ),
-            'classes': ('collapse',)
-        }),
         ('Client Status', {
             'fields': (
                 'is_active',
@@ -95,13 +129,10 @@ class ClientAdmin(admin.ModelAdmin):
         ('Referral Information', {
             'fields': (
                 'referred_by',
-                'referral_code'
+                'referral_code',
+                'referral_network'
             )
         }),
-        ('Notes', {
-            'fields': ('notes',),
-            'classes': ('collapse',)
-        }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
@@ -110,4 +141,66 @@ class ClientAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.select_related('referred_by')
+        view = request.resolver_match.url_name if request.resolver_match else None
+        if view == 'autocomplete':
+            return qs.only(*AUTOCOMPLETE_FIELDS)
+        if view == 'clients_client_changelist':
+            # Aggregates come from the one-to-one ClientStats row rather than per-row subqueries
+            return qs.select_related('stats').only(*CHANGELIST_FIELDS)
+        return qs.select_related('referred_by', 'stats')
+    
+    def get_search_results(self, request, queryset, search_term):
+        # A term that is a complete phone number in any format is an exact probe of phone_e164
+        normalized = normalize_phone(search_term) if PHONE_TERM.fullmatch(search_term.strip()) else ''
+        if normalized:
+            return queryset.filter(phone_e164=normalized), False
+        # Ranked lookup through the client search index when it can serve the term
+        results = search_clients(queryset, search_term)
+        if results is None:
+            return super().get_search_results(request, queryset, search_term)
+        return results, False
+    
+    def get_changelist(self, request, **kwargs):
+        return RankedChangeList
+    
+    def merge_selected_clients(self, request, queryset):
+        from django.contrib import messages
+        from .dedup import merge_clients
+        
+        clients = list(queryset.order_by('pk'))
+        if len(clients) < 2:
+            self.message_user(request, "Select at least two clients to merge.", level=messages.WARNING)
+            return
+        # The oldest record is kept
+        kept = clients[0]
+        for duplicate in clients[1:]:
+            kept = merge_clients(kept, duplicate)
+        self.message_user(request, f"{len(clients) - 1} clients merged into {kept}.")
+    merge_selected_clients.short_description = "Merge selected clients into the oldest"
+    
+    def referral_network(self, obj):
+        from .referrals import network_stats
+        
+        if not obj.pk:
+            return '-'
+        stats = network_stats(obj)
+        if not stats['size']:
+            return 'No referrals'
+        return format_html(
+            '{} clients ({} direct), {} levels deep, ${} lifetime value',
+            stats['size'], stats['direct'], stats['depth'], stats['revenue']
+        )
+    referral_network.short_description = "Referral network"
+    
+    def total_appointments(self, obj):
+        # A missing stats row shows as empty until the nightly refresh; never built during a GET
+        stats = getattr(obj, 'stats', None)
+        return stats.total_appointments if stats else None
+    total_appointments.short_description = "Total appointments"
+    total_appointments.admin_order_field = 'stats__total_appointments'
+    
+    def lifetime_value(self, obj):
+        stats = getattr(obj, 'stats', None)
+        return stats.lifetime_value if stats else None
+    lifetime_value.short_description = "Lifetime value"
+    lifetime_value.admin_order_field = 'stats__lifetime_value'
@@ -5,3 +5,20 @@ class ClientsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'clients'
     verbose_name = 'Client Management'
+    
+    def ready(self):
+        import clients.signals
+        from django.db.models.signals import post_migrate
+        post_migrate.connect(restore_search_index, sender=self)
+
+
+def restore_search_index(using='default', **kwargs):
+    """Table rebuilds during migrations drop the SQLite search triggers"""
+    from django.db import connections
+    from django.db.migrations.recorder import MigrationRecorder
+    from .search import install_search_index
+    
+    connection = connections[using]
+    applied = MigrationRecorder(connection).applied_migrations()
+    if ('clients', '0003_client_search_index') in applied:
+        install_search_index(connection)
@@ -0,0 +1,257 @@
+"""Duplicate client detection with blocking keys, and set-based merging"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from itertools import combinations
+
+from django.db import models, transaction
+
+from .models import Client, ClientProfile, ClientStats, ReferralClosure
+from .referrals import rebuild_subtree
+
+
+# Blocks larger than this are shared numbers (reception desks, families) rather than duplicates
+MAX_BLOCK_SIZE = 25
+
+DEFAULT_THRESHOLD = 0.6
+
+# Fields copied from the duplicate when the kept client has them blank
+FILL_FIELDS = ['date_of_birth', 'gender']
+PROFILE_FILL_FIELDS = [
+    'address_line1', 'address_line2', 'city', 'state', 'zip_code',
+    'medical_conditions', 'medications', 'allergies',
+    'emergency_contact_name', 'emergency_contact_phone',
+]
+
+SOUNDEX_CODES = {
+    **dict.fromkeys('BFPV', '1'),
+    **dict.fromkeys('CGJKQSXZ', '2'),
+    **dict.fromkeys('DT', '3'),
+    'L': '4',
+    **dict.fromkeys('MN', '5'),
+    'R': '6',
+}
+
+
+def soundex(name):
+    """American Soundex code of a name, e.g. 'Robert' -> 'R163'"""
+    letters = [c for c in name.upper() if 'A' <= c <= 'Z']
+    if not letters:
+        return ''
+    code = letters[0]
+    previous = SOUNDEX_CODES.get(letters[0], '')
+    for letter in letters[1:]:
+        digit = SOUNDEX_CODES.get(letter, '')
+        if digit and digit != previous:
+            code += digit
+        # H and W do not separate letters with the same code; vowels do
+        if letter not in 'HW':
+            previous = digit
+    return (code + '000')[:4]
+
+
+def blocking_keys(phone_e164, last_name, date_of_birth):
+    keys = []
+    if phone_e164:
+        keys.append(('phone', phone_e164))
+    if last_name and date_of_birth:
+        keys.append(('name_dob', soundex(last_name), date_of_birth))
+    return keys
+
+
+@dataclass
+class DuplicateCandidate:
+    client: Client
+    duplicate: Client
+    score: float
+    reasons: list = field(default_factory=list)
+
+
+def _similarity(a, b):
+    a, b = a.strip().casefold(), b.strip().casefold()
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def score_pair(a, b):
+    """Score 0-1 for how likely two clients are the same person, with the reasons"""
+    score, reasons = 0.0, []
+    if a.phone_e164 and a.phone_e164 == b.phone_e164:
+        score += 0.35
+        reasons.append('same phone')
+    if a.date_of_birth and a.date_of_birth == b.date_of_birth:
+        score += 0.2
+        reasons.append('same date of birth')
+    if a.last_name.strip().casefold() == b.last_name.strip().casefold():
+        score += 0.2
+        reasons.append('same last name')
+    elif soundex(a.last_name) == soundex(b.last_name):
+        score += 0.1
+        reasons.append('similar last name')
+    first_name = _similarity(a.first_name, b.first_name)
+    if first_name >= 0.8:
+        score += 0.15 * first_name
+        reasons.append('same first name' if first_name == 1 else 'similar first name')
+    local_a, local_b = a.email.split('@')[0], b.email.split('@')[0]
+    if _similarity(local_a, local_b) >= 0.8:
+        score += 0.1
+        reasons.append('similar email')
+    return round(min(score, 1.0), 3), reasons
+
+
+def find_duplicates(queryset=None, threshold=DEFAULT_THRESHOLD, chunk_size=5000):
+    """
+    Candidate duplicate pairs scoring at least `threshold`, best first.
+    Clients are bucketed by blocking key in one pass, so only clients
+    sharing a phone number or a phonetic last name plus birth date are
+    ever compared.
+    """
+    queryset = Client.objects.all() if queryset is None else queryset
+
+    blocks = defaultdict(list)
+    for pk, phone_e164, last_name, date_of_birth in queryset.order_by().values_list(
+        'pk', 'phone_e164', 'last_name', 'date_of_birth'
+    ).iterator(chunk_size=chunk_size):
+        for key in blocking_keys(phone_e164, last_name, date_of_birth):
+            blocks[key].append(pk)
+
+    pairs = set()
+    for members in blocks.values():
+        if 1 < len(members) <= MAX_BLOCK_SIZE:
+            pairs.update(combinations(sorted(members), 2))
+
+    clients = Client.objects.only(
+        'first_name', 'last_name', 'email', 'phone_e164', 'date_of_birth'
+    ).in_bulk({pk for pair in pairs for pk in pair})
+
+    candidates = []
+    for first, second in pairs:
+        score, reasons = score_pair(clients[first], clients[second])
+        if score >= threshold:
+            # The older record is kept by default
+            candidates.append(DuplicateCandidate(clients[first], clients[second], score, reasons))
+    candidates.sort(key=lambda candidate: (-candidate.score, candidate.client.pk))
+    return candidates
+
+
+def merge_clients(client, duplicate):
+    """
+    Fold `duplicate` into `client` and delete it. Every foreign key to the
+    duplicate is re-pointed with one UPDATE per relation, all in a single
+    transaction. Returns the refreshed client.
+    """
+    from discounts.models import DiscountClientUsage, Referral
+    from discounts.validation import invalidate_client_usage
+
+    if client.pk == duplicate.pk:
+        raise ValueError("Cannot merge a client into itself.")
+
+    with transaction.atomic():
+        locked = Client.objects.select_for_update().in_bulk([client.pk, duplicate.pk])
+        client, duplicate = locked[client.pk], locked[duplicate.pk]
+
+        # Links between the two records would become self-referrals
+        Referral.objects.filter(
+            models.Q(referrer=client, referred_client=duplicate) |
+            models.Q(referrer=duplicate, referred_client=client)
+        ).delete()
+        if client.referred_by_id == duplicate.pk:
+            client.referred_by = None
+        if client.referred_by_id is None and duplicate.referred_by_id != client.pk and not (
+            # Adopting a referrer the client brought in would close a loop
+            ReferralClosure.objects.filter(ancestor=client, descendant_id=duplicate.referred_by_id).exists()
+        ):
+            client.referred_by_id = duplicate.referred_by_id
+        # Referrals both records share with a third client would break unique_together
+        Referral.objects.filter(
+            referrer=duplicate,
+            referred_client__in=Referral.objects.filter(referrer=client).values('referred_client')
+        ).delete()
+        Referral.objects.filter(
+            referred_client=duplicate,
+            referrer__in=Referral.objects.filter(referred_client=client).values('referrer')
+        ).delete()
+
+        # Usage counters are recounted for the client below; moving them could collide
+        DiscountClientUsage.objects.filter(client=duplicate).delete()
+        invalidate_client_usage(duplicate.pk)
+
+        referred = list(
+            Client.objects.filter(referred_by=duplicate).exclude(pk=client.pk).values_list('pk', flat=True)
+        )
+        # Referrals of the duplicate that brought the client in would close a loop under the client
+        looped = list(
+            ReferralClosure.objects.filter(ancestor_id__in=referred, descendant=client).values_list('ancestor_id', flat=True)
+        )
+        for relation in Client._meta.related_objects:
+            if relation.one_to_one:
+                # The profile is merged below; stats and segment are derived
+                continue
+            if relation.related_model is ReferralClosure:
+                # Rebuilt from referred_by below; re-pointed rows could collide or link the client to itself
+                continue
+            if relation.many_to_many:
+                _merge_many_to_many(relation, client, duplicate)
+                continue
+            rows = relation.related_model._base_manager.filter(**{relation.field.name: duplicate})
+            if relation.related_model is Client:
+                # The client can't become their own referrer, nor that of someone who brought them in
+                rows = rows.exclude(pk__in=[client.pk, *looped])
+            rows.update(**{relation.field.name: client})
+
+        for name in FILL_FIELDS:
+            if not getattr(client, name) and getattr(duplicate, name):
+                setattr(client, name, getattr(duplicate, name))
+        _merge_profile(client, duplicate)
+        if duplicate.last_visit_date and (
+            not client.last_visit_date or duplicate.last_visit_date > client.last_visit_date
+        ):
+            client.last_visit_date = duplicate.last_visit_date
+        client.registration_date = min(client.registration_date, duplicate.registration_date)
+
+        duplicate.delete()
+        client.save()
+        if referred:
+            # Deleting the duplicate detached its referrals in the closure; relink them from referred_by
+            rebuild_subtree([client.pk, *looped])
+        ClientStats.objects.refresh(client_ids=[client.pk])
+        DiscountClientUsage.objects.rebuild(client_ids=[client.pk])
+        invalidate_client_usage(client.pk)
+    return client
+
+
+def _merge_profile(client, duplicate):
+    profiles = ClientProfile.objects.in_bulk([client.pk, duplicate.pk])
+    if duplicate.pk not in profiles:
+        return
+    if client.pk not in profiles:
+        # Adopt the duplicate's profile wholesale
+        ClientProfile.objects.filter(pk=duplicate.pk).update(client=client)
+        return
+    kept, other = profiles[client.pk], profiles[duplicate.pk]
+    for name in PROFILE_FILL_FIELDS:
+        if not getattr(kept, name) and getattr(other, name):
+            setattr(kept, name, getattr(other, name))
+    if other.notes and other.notes not in kept.notes:
+        kept.notes = '\n\n'.join(filter(None, [kept.notes, other.notes]))
+    kept.save()
+
+
+def _merge_many_to_many(relation, client, duplicate):
+    """Move the duplicate's links to the client, dropping ones the client already has"""
+    through = relation.through
+    # The through model's foreign keys to Client and to the other side
+    client_field = next(
+        f.name for f in through._meta.fields
+        if f.is_relation and f.related_model is Client
+    )
+    other_field = next(
+        f.name for f in through._meta.fields
+        if f.is_relation and f.related_model is not Client
+    )
+    existing = through.objects.filter(**{client_field: client}).values(other_field)
+    through.objects.filter(**{client_field: duplicate}).exclude(
+        **{f'{other_field}__in': existing}
+    ).update(**{client_field: client})
+    through.objects.filter(**{client_field: duplicate}).delete()
@@ -0,0 +1,256 @@
+"""Streaming bulk import of clients from CSV or JSON Lines"""
+import csv
+import json
+from dataclasses import dataclass, field
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+
+from .models import Client, ClientProfile, ClientStats, ReferralClosure, generate_referral_code
+from .referrals import invalidate_leaderboard
+from .phones import normalize_phone
+
+
+# Columns filled in by the import itself rather than taken from the input
+MANAGED_FIELDS = {'id', 'client', 'phone_e164', 'referred_by', 'registration_date', 'created_at', 'updated_at'}
+
+TRUE_VALUES = {'1', 't', 'true', 'y', 'yes'}
+
+
+def allocate_referral_codes(count, reserved=()):
+    """
+    Return `count` distinct referral codes unused by any client and not in
+    `reserved`. Each round checks all candidates against the table in one
+    query; collisions are rare, so one round is almost always enough.
+    """
+    codes = set()
+    reserved = set(reserved)
+    while len(codes) < count:
+        candidates = set()
+        while len(candidates) < count - len(codes):
+            code = generate_referral_code()
+            if code not in codes and code not in reserved:
+                candidates.add(code)
+        taken = set(Client.objects.filter(referral_code__in=candidates).values_list('referral_code', flat=True))
+        codes |= candidates - taken
+    return list(codes)
+
+
+def read_rows(stream, format='csv'):
+    """
+    Yield (line number, row dict) from a CSV or JSON Lines text stream. A
+    line that can't be parsed yields a ValidationError in place of the row,
+    so it is reported like any other invalid row.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as error:
+                yield reader.line_num, ValidationError(f"Malformed CSV: {error}")
+                continue
+            yield reader.line_num, row
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as error:
+            yield number, ValidationError(f"Invalid JSON: {error.msg} (column {error.colno})")
+            continue
+        if not isinstance(row, dict):
+            yield number, ValidationError("Each line must be a JSON object.")
+            continue
+        yield number, row
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+
+class ClientImporter:
+    """
+    Validate and insert client rows in batches: one uniqueness query per
+    batch for emails, referral codes and referrers, and one bulk_create.
+    Invalid rows are reported and skipped without aborting the import.
+    """
+
+    def __init__(self, batch_size=1000, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.result = ImportResult()
+        self.fields = {
+            f.name: f for f in Client._meta.concrete_fields
+            if f.name not in MANAGED_FIELDS
+        }
+        # Address, medical and note columns go to the client's profile
+        self.profile_fields = {
+            f.name: f for f in ClientProfile._meta.concrete_fields
+            if f.name not in MANAGED_FIELDS
+        }
+        # Emails and referral codes already used earlier in this import
+        self.seen_emails = set()
+        self.seen_codes = set()
+        # A dry run saves nothing, so referrers accepted by earlier batches are resolved from here
+        self.dry_run_referrers = {}
+
+    def run(self, rows):
+        batch = []
+        for line, row in rows:
+            batch.append((line, row))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        return self.result
+
+    def build(self, row):
+        """Turn an input row into an unsaved, validated Client and its profile (None if empty)"""
+        if isinstance(row, ValidationError):
+            raise row
+        if None in row:
+            # DictReader files values beyond the header under None
+            raise ValidationError(f"Too many fields: the header has {len(row) - 1}.")
+        unknown = set(row) - set(self.fields) - set(self.profile_fields) - {'referred_by_code'}
+        if unknown:
+            raise ValidationError(f"Unknown columns: {', '.join(sorted(unknown))}")
+
+        values, profile_values = {}, {}
+        for name, value in row.items():
+            field = self.fields.get(name) or self.profile_fields.get(name)
+            if field is None:
+                continue
+            if isinstance(value, str):
+                value = value.strip()
+            if value in ('', None):
+                continue
+            if isinstance(field, models.BooleanField) and isinstance(value, str):
+                value = value.lower() in TRUE_VALUES
+            if name in self.fields:
+                values[name] = value
+            else:
+                profile_values[name] = value
+
+        client = Client(**values)
+        client.full_clean(exclude=['referral_code'], validate_unique=False)
+        client.phone_e164 = normalize_phone(client.phone)
+        profile = None
+        if profile_values:
+            profile = ClientProfile(**profile_values)
+            profile.full_clean(exclude=['client'], validate_unique=False)
+        return client, profile
+
+    def import_batch(self, batch):
+        clients = []
+        for line, row in batch:
+            try:
+                client, profile = self.build(row)
+            except ValidationError as error:
+                self.result.add_error(line, '; '.join(error.messages))
+                continue
+            client.import_profile = profile
+            clients.append((line, client, (row.get('referred_by_code') or '').strip()))
+
+        emails = [client.email for _, client, _ in clients]
+        supplied = [client.referral_code for _, client, _ in clients if client.referral_code]
+        existing_emails = set(Client.objects.filter(email__in=emails).values_list('email', flat=True))
+        existing_codes = set(Client.objects.filter(referral_code__in=supplied).values_list('referral_code', flat=True))
+        referrers = dict(
+            Client.objects.filter(
+                referral_code__in={code for _, _, code in clients if code}
+            ).values_list('referral_code', 'pk')
+        )
+
+        batch_codes = {
+            client.referral_code: client for _, client, _ in clients if client.referral_code
+        }
+        accepted, deferred = [], []
+        for line, client, code in clients:
+            if client.email in existing_emails or client.email in self.seen_emails:
+                self.result.add_error(line, f"A client with email {client.email} already exists.")
+                continue
+            if client.referral_code and (
+                client.referral_code in existing_codes or client.referral_code in self.seen_codes
+            ):
+                self.result.add_error(line, f"Referral code {client.referral_code} is already in use.")
+                continue
+            if code in referrers:
+                client.referred_by_id = referrers[code]
+            elif code in self.dry_run_referrers:
+                client.referred_by = self.dry_run_referrers[code]
+            elif code in batch_codes and batch_codes[code] is not client:
+                # Referrer is inserted in this same batch; link it once it has a pk
+                deferred.append((client, batch_codes[code]))
+            elif code:
+                self.result.add_error(line, f"No client has referral code {code}.")
+                continue
+            self.seen_emails.add(client.email)
+            if client.referral_code:
+                self.seen_codes.add(client.referral_code)
+            accepted.append(client)
+
+        accepted, deferred = self.drop_orphaned_referrals(clients, accepted, deferred)
+
+        missing = [client for client in accepted if not client.referral_code]
+        for client, code in zip(missing, allocate_referral_codes(len(missing), reserved=self.seen_codes)):
+            client.referral_code = code
+            self.seen_codes.add(code)
+
+        if self.dry_run or not accepted:
+            if self.dry_run:
+                self.dry_run_referrers.update((client.referral_code, client) for client in accepted)
+            self.result.created += len(accepted)
+            return
+
+        with transaction.atomic():
+            created = Client.objects.bulk_create(accepted)
+            # bulk_create skips save(); start every imported client with an empty stats row
+            ClientStats.objects.bulk_create([ClientStats(client=client) for client in created])
+            profiles = []
+            for client in created:
+                if client.import_profile:
+                    client.import_profile.client = client
+                    profiles.append(client.import_profile)
+            ClientProfile.objects.bulk_create(profiles)
+            for client, referrer in deferred:
+                client.referred_by_id = referrer.pk
+            Client.objects.bulk_update([client for client, _ in deferred], ['referred_by'])
+            if ReferralClosure.objects.add_leaves(
+                (client.pk, client.referred_by_id) for client in created if client.referred_by_id
+            ):
+                invalidate_leaderboard()
+        self.result.created += len(created)
+
+    def drop_orphaned_referrals(self, clients, accepted, deferred):
+        """
+        Reject rows whose referrer is in the same batch but was itself
+        rejected, and in turn the rows they referred. Returns the remaining
+        (accepted, deferred).
+        """
+        lines = {id(client): line for line, client, _ in clients}
+        kept = {id(client) for client in accepted}
+        dropped = True
+        while dropped:
+            dropped = False
+            for client, referrer in deferred:
+                if id(client) in kept and id(referrer) not in kept:
+                    kept.discard(id(client))
+                    dropped = True
+                    self.result.add_error(
+                        lines[id(client)], f"The referrer with code {referrer.referral_code} was rejected."
+                    )
+                    self.seen_emails.discard(client.email)
+                    self.seen_codes.discard(client.referral_code)
+        return (
+            [client for client in accepted if id(client) in kept],
+            [(client, referrer) for client, referrer in deferred if id(client) in kept],
+        )
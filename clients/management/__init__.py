@@ -0,0 +1 @@
+# Clients Management Commands
@@ -0,0 +1,66 @@
+from django.core.exceptions import FieldError
+from django.core.management.base import BaseCommand, CommandError
+from crm_cryo.exports import CHUNK_SIZE, DATASETS, export_filename, get_dataset, write_export
+
+
+class Command(BaseCommand):
+    help = 'Stream clients, appointments, package purchases or email logs to a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'dataset',
+            choices=sorted(DATASETS),
+            help='Dataset to export'
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            default='csv',
+            help='Output format (default: csv)'
+        )
+        parser.add_argument(
+            '--output',
+            help='Output file (default: <dataset>-<date>.<format>[.gz])'
+        )
+        parser.add_argument(
+            '--columns',
+            help='Comma-separated columns to export instead of the defaults; related fields use __'
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Compress the output with gzip (implied by a .gz output name)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help=f'Rows fetched from the database at a time (default: {CHUNK_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        name = options['dataset']
+        model, columns = get_dataset(name)
+        if options['columns']:
+            columns = [column.strip() for column in options['columns'].split(',') if column.strip()]
+
+        compress = options['gzip'] or bool(options['output'] and options['output'].endswith('.gz'))
+        path = options['output'] or export_filename(name, options['format'], compress)
+
+        queryset = model._default_manager.all()
+        try:
+            # Resolve the columns before creating the output file
+            queryset.values_list(*columns)
+        except FieldError as error:
+            raise CommandError(f'Invalid column: {error}')
+
+        count = write_export(
+            queryset,
+            columns,
+            path,
+            format=options['format'],
+            compress=compress,
+            chunk_size=options['chunk_size']
+        )
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Exported {count} {name} rows to {path}'))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from clients.dedup import DEFAULT_THRESHOLD, find_duplicates, merge_clients
+
+
+class Command(BaseCommand):
+    help = 'List likely duplicate clients, optionally merging the most certain matches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=DEFAULT_THRESHOLD,
+            help=f'Minimum match score to report, 0-1 (default: {DEFAULT_THRESHOLD})'
+        )
+        parser.add_argument(
+            '--merge-above',
+            type=float,
+            help='Merge pairs scoring at least this much into the older record'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=100,
+            help='Number of pairs to list (default: 100)'
+        )
+
+    def handle(self, *args, **options):
+        candidates = find_duplicates(threshold=options['threshold'])
+        self.stdout.write(f'Found {len(candidates)} candidate duplicate pairs')
+
+        for candidate in candidates[:options['limit']]:
+            self.stdout.write(
+                f'  {candidate.score:.2f}  #{candidate.client.pk} {candidate.client.get_full_name()} '
+                f'<- #{candidate.duplicate.pk} {candidate.duplicate.get_full_name()}  '
+                f'({", ".join(candidate.reasons)})'
+            )
+
+        if options['merge_above'] is None:
+            return
+
+        merged = set()
+        for candidate in candidates:
+            if candidate.score < options['merge_above']:
+                break
+            # A record already merged away in this run is gone
+            if candidate.client.pk in merged or candidate.duplicate.pk in merged:
+                continue
+            merge_clients(candidate.client, candidate.duplicate)
+            merged.add(candidate.duplicate.pk)
+        self.stdout.write(self.style.SUCCESS(f'✓ Merged {len(merged)} duplicate clients'))
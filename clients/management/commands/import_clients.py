@@ -0,0 +1,76 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from clients.importing import ClientImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Stream clients from a CSV or JSON Lines file into the database in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='File to import, or - to read standard input'
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='Input format (default: taken from the file extension)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows validated and inserted per batch (default: 1000)'
+        )
+        parser.add_argument(
+            '--encoding',
+            default='utf-8-sig',
+            help='Input file encoding (default: utf-8-sig)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate every row without inserting anything'
+        )
+        parser.add_argument(
+            '--max-errors',
+            type=int,
+            default=50,
+            help='Number of rejected rows to list (default: 50)'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format']
+        if format is None:
+            if path.endswith(('.jsonl', '.ndjson')):
+                format = 'jsonl'
+            elif path.endswith('.csv'):
+                format = 'csv'
+            else:
+                raise CommandError('Cannot tell the input format; pass --format csv or --format jsonl.')
+
+        importer = ClientImporter(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        started = time.perf_counter()
+        if path == '-':
+            result = importer.run(read_rows(sys.stdin, format))
+        else:
+            try:
+                stream = open(path, encoding=options['encoding'], newline='')
+            except OSError as error:
+                raise CommandError(f'Cannot open {path}: {error}')
+            with stream:
+                result = importer.run(read_rows(stream, format))
+        elapsed = time.perf_counter() - started
+
+        for line, message in result.errors[:options['max_errors']]:
+            self.stdout.write(self.style.WARNING(f'  Line {line}: {message}'))
+        if len(result.errors) > options['max_errors']:
+            self.stdout.write(f'  ... and {len(result.errors) - options["max_errors"]} more')
+
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {verb} {result.created} clients in {elapsed:.1f}s ({len(result.errors)} rows rejected)'
+        ))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from clients.models import Client
+from clients.phones import normalize_phone
+
+
+class Command(BaseCommand):
+    help = 'Backfill the normalized E.164 phone column in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Clients read and updated per batch (default: 2000)'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = 0
+        updated = unreadable = 0
+
+        self.stdout.write('Normalizing client phone numbers...')
+        while True:
+            # Keyset batches keep every read on the primary key index
+            batch = list(
+                Client.objects.filter(pk__gt=last_pk).order_by('pk')
+                .only('pk', 'phone', 'phone_e164')[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            changed = []
+            for client in batch:
+                normalized = normalize_phone(client.phone)
+                if not normalized:
+                    unreadable += 1
+                if client.phone_e164 != normalized:
+                    client.phone_e164 = normalized
+                    changed.append(client)
+            Client.objects.bulk_update(changed, ['phone_e164'])
+            updated += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Updated {updated} clients'))
+        if unreadable:
+            self.stdout.write(self.style.WARNING(
+                f'{unreadable} phone numbers could not be normalized'
+            ))
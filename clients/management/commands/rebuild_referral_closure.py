@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from clients.models import ReferralClosure
+from clients.referrals import invalidate_leaderboard
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the referral closure table from each client\'s referred_by'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding referral closure...')
+        rows = ReferralClosure.objects.rebuild(batch_size=options['batch_size'])
+        invalidate_leaderboard()
+        self.stdout.write(self.style.SUCCESS(f'✓ Wrote {rows} referral links'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from clients.models import ClientStats
+
+
+class Command(BaseCommand):
+    help = 'Recompute client stats set-based and correct any drifted rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Clients recomputed per batch (default: 2000)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Reconciling client stats...')
+        corrected = ClientStats.objects.refresh(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Corrected {corrected} client stats rows'))
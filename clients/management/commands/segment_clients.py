@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+from clients.segmentation import segment_clients
+
+
+class Command(BaseCommand):
+    help = 'Score every client by recency, frequency and monetary value and store their segment'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Segmenting clients...')
+        started = time.perf_counter()
+        changed = segment_clients()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'✓ Updated {changed} client segments in {elapsed:.1f}s'))
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:49
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BATCH_SIZE = 2000
+
+
+def backfill_client_stats(apps, schema_editor):
+    """Build a stats row per client with grouped aggregates, one batch of clients at a time"""
+    from django.db.models import Count, Max, Q, Sum
+    
+    Client = apps.get_model('clients', 'Client')
+    ClientStats = apps.get_model('clients', 'ClientStats')
+    Appointment = apps.get_model('appointments', 'Appointment')
+    PackagePurchase = apps.get_model('packages', 'PackagePurchase')
+    
+    client_ids = list(Client.objects.order_by('pk').values_list('pk', flat=True))
+    for offset in range(0, len(client_ids), BATCH_SIZE):
+        batch = client_ids[offset:offset + BATCH_SIZE]
+        completed = Q(status='COMPLETED')
+        appointments = {
+            row['client']: row
+            for row in Appointment.objects.filter(client__in=batch).order_by().values('client').annotate(
+                total=Count('pk'),
+                completed=Count('pk', filter=completed),
+                spend=Sum('final_price', filter=completed),
+                last_visit=Max('appointment_date', filter=completed),
+            )
+        }
+        purchases = dict(
+            PackagePurchase.objects.filter(client__in=batch).order_by().values('client').annotate(
+                spend=Sum('final_price')
+            ).values_list('client', 'spend')
+        )
+        
+        rows = []
+        for client_id in batch:
+            appointment_row = appointments.get(client_id, {})
+            appointment_spend = appointment_row.get('spend') or Decimal('0.00')
+            package_spend = purchases.get(client_id) or Decimal('0.00')
+            rows.append(ClientStats(
+                client_id=client_id,
+                total_appointments=appointment_row.get('total', 0),
+                completed_appointments=appointment_row.get('completed', 0),
+                appointment_spend=appointment_spend,
+                package_spend=package_spend,
+                lifetime_value=appointment_spend + package_spend,
+                last_visit_date=appointment_row.get('last_visit'),
+            ))
+        ClientStats.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0001_initial'),
+        ('appointments', '0003_appointment_appt_reminder_due_idx'),
+        ('packages', '0003_packagepurchase_purchase_active_expiry_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientStats',
+            fields=[
+                ('client', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='clients.client')),
+                ('total_appointments', models.PositiveIntegerField(default=0)),
+                ('completed_appointments', models.PositiveIntegerField(default=0)),
+                ('appointment_spend', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Paid for completed individual appointments', max_digits=12)),
+                ('package_spend', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Paid for package purchases', max_digits=12)),
+                ('lifetime_value', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('last_visit_date', models.DateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Client Stats',
+                'verbose_name_plural': 'Client Stats',
+                'indexes': [models.Index(fields=['-lifetime_value'], name='clients_cli_lifetim_d3742f_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_client_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from clients.search import install_search_index
+    install_search_index(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    from clients.search import uninstall_search_index
+    uninstall_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0002_clientstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
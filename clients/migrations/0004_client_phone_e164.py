@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0003_client_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='phone_e164',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Phone number normalized to E.164 for lookups', max_length=16),
+        ),
+    ]
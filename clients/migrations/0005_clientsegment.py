@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0004_client_phone_e164'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientSegment',
+            fields=[
+                ('client', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='segment', serialize=False, to='clients.client')),
+                ('recency_score', models.PositiveSmallIntegerField(help_text='1 (longest ago) to 5 (most recent)')),
+                ('frequency_score', models.PositiveSmallIntegerField(help_text='1 (fewest visits) to 5 (most)')),
+                ('monetary_score', models.PositiveSmallIntegerField(help_text='1 (lowest spend) to 5 (highest)')),
+                ('segment', models.CharField(choices=[('CHAMPIONS', 'Champions'), ('LOYAL', 'Loyal'), ('POTENTIAL', 'Potential Loyalists'), ('NEW', 'New Customers'), ('PROMISING', 'Promising'), ('NEED_ATTENTION', 'Need Attention'), ('ABOUT_TO_SLEEP', 'About to Sleep'), ('AT_RISK', 'At Risk'), ('CANT_LOSE', "Can't Lose"), ('HIBERNATING', 'Hibernating'), ('LOST', 'Lost'), ('PROSPECT', 'Prospect (no visits yet)')], max_length=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Client Segment',
+                'verbose_name_plural': 'Client Segments',
+                'indexes': [models.Index(fields=['segment', 'client'], name='clients_cli_segment_3cfe03_idx')],
+            },
+        ),
+    ]
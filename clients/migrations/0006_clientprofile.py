@@ -0,0 +1,127 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BATCH_SIZE = 2000
+
+PROFILE_FIELDS = [
+    'address_line1', 'address_line2', 'city', 'state', 'zip_code', 'country',
+    'medical_conditions', 'medications', 'allergies', 'emergency_contact_name',
+    'emergency_contact_phone', 'notes',
+]
+
+DEFAULTS = {'country': 'USA'}
+
+
+def copy_to_profiles(apps, schema_editor):
+    """Create a profile for every client holding any address, medical or note data"""
+    Client = apps.get_model('clients', 'Client')
+    ClientProfile = apps.get_model('clients', 'ClientProfile')
+    
+    batch = []
+    for row in Client.objects.order_by('pk').values_list('pk', *PROFILE_FIELDS).iterator(chunk_size=BATCH_SIZE):
+        values = dict(zip(PROFILE_FIELDS, row[1:]))
+        if all(value == DEFAULTS.get(name, '') for name, value in values.items()):
+            continue
+        batch.append(ClientProfile(client_id=row[0], **values))
+        if len(batch) >= BATCH_SIZE:
+            ClientProfile.objects.bulk_create(batch)
+            batch = []
+    ClientProfile.objects.bulk_create(batch)
+
+
+def copy_from_profiles(apps, schema_editor):
+    Client = apps.get_model('clients', 'Client')
+    ClientProfile = apps.get_model('clients', 'ClientProfile')
+    
+    batch = []
+    for row in ClientProfile.objects.order_by('pk').values_list('client_id', *PROFILE_FIELDS).iterator(chunk_size=BATCH_SIZE):
+        batch.append(Client(pk=row[0], **dict(zip(PROFILE_FIELDS, row[1:]))))
+        if len(batch) >= BATCH_SIZE:
+            Client.objects.bulk_update(batch, PROFILE_FIELDS)
+            batch = []
+    Client.objects.bulk_update(batch, PROFILE_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0005_clientsegment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientProfile',
+            fields=[
+                ('client', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='profile', serialize=False, to='clients.client')),
+                ('address_line1', models.CharField(blank=True, max_length=200)),
+                ('address_line2', models.CharField(blank=True, max_length=200)),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('state', models.CharField(blank=True, max_length=100)),
+                ('zip_code', models.CharField(blank=True, max_length=20)),
+                ('country', models.CharField(default='USA', max_length=100)),
+                ('medical_conditions', models.TextField(blank=True, help_text='Any relevant medical conditions or health concerns')),
+                ('medications', models.TextField(blank=True, help_text='Current medications')),
+                ('allergies', models.TextField(blank=True, help_text='Known allergies')),
+                ('emergency_contact_name', models.CharField(blank=True, max_length=200)),
+                ('emergency_contact_phone', models.CharField(blank=True, max_length=20)),
+                ('notes', models.TextField(blank=True, help_text='Internal notes about the client')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Client Profile',
+                'verbose_name_plural': 'Client Profiles',
+            },
+        ),
+        migrations.RunPython(copy_to_profiles, copy_from_profiles),
+        migrations.RemoveField(
+            model_name='client',
+            name='address_line1',
+        ),
+        migrations.RemoveField(
+            model_name='client',
+            name='address_line2',
+        ),
+        migrations.RemoveField(
+            model_name='client',
+            name='allergies',
+        ),
+        migrations.RemoveField(
+            model_name='client',
+            name='city',
+        ),
+        migrations.RemoveField(
+            model_name='client',
+            name='country',
+        ),
+        migrations.RemoveField(
+            model_name='client',
+            name='emergency_contact_name',
+        ),
+        migrations.RemoveField(
+            model_name='client',
+            name='emergency_contact_phone',
+        ),
+        migrations.RemoveField(
+            model_name='client',
+            name='medical_conditions',
+        ),
+        migrations.RemoveField(
+            model_name='client',
+            name='medications',
+        ),
+        migrations.RemoveField(
+            model_name='client',
+            name='notes',
+        ),
+        migrations.RemoveField(
+            model_name='client',
+            name='state',
+        ),
+        migrations.RemoveField(
+            model_name='client',
+            name='zip_code',
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BATCH_SIZE = 2000
+
+
+def build_closure(apps, schema_editor):
+    """One row per (referrer, direct or indirect referral) pair from referred_by"""
+    Client = apps.get_model('clients', 'Client')
+    ReferralClosure = apps.get_model('clients', 'ReferralClosure')
+    
+    parents = dict(
+        Client.objects.filter(referred_by__isnull=False).values_list('pk', 'referred_by_id').iterator(chunk_size=BATCH_SIZE)
+    )
+    batch = []
+    for client_id, referrer_id in parents.items():
+        depth, seen = 1, {client_id}
+        while referrer_id is not None and referrer_id not in seen:
+            batch.append(ReferralClosure(ancestor_id=referrer_id, descendant_id=client_id, depth=depth))
+            seen.add(referrer_id)
+            referrer_id, depth = parents.get(referrer_id), depth + 1
+        if len(batch) >= BATCH_SIZE:
+            ReferralClosure.objects.bulk_create(batch)
+            batch = []
+    ReferralClosure.objects.bulk_create(batch)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0006_clientprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReferralClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField(help_text='1 for a direct referral')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='referral_descendants', to='clients.client')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='referral_ancestors', to='clients.client')),
+            ],
+            options={
+                'verbose_name': 'Referral Closure',
+                'verbose_name_plural': 'Referral Closure',
+                'indexes': [models.Index(fields=['ancestor', 'depth', 'descendant'], name='referral_closure_subtree_idx'), models.Index(fields=['descendant', 'depth'], name='referral_closure_chain_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='referralclosure',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant'), name='referral_closure_unique'),
+        ),
+        migrations.RunPython(build_closure, migrations.RunPython.noop),
+    ]
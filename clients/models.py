@@ -1,6 +1,18 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.core.validators import EmailValidator
 from django.utils import timezone
+from decimal import Decimal
+import random
+import string
+
+
+REFERRAL_CODE_ALPHABET = string.ascii_uppercase + string.digits
+REFERRAL_CODE_LENGTH = 8
+
+
+def generate_referral_code():
+    return ''.join(random.choices(REFERRAL_CODE_ALPHABET, k=REFERRAL_CODE_LENGTH))
 
 
 class Client(models.Model):
@@ -21,32 +33,15 @@ class Client(models.Model):
         validators=[EmailValidator()]
     )
     phone = models.CharField(max_length=20)
-    date_of_birth = models.DateField(null=True, blank=True)
-    gender = models.CharField(max_length=1, choices=GENDER_CHOICES, blank=True)
-    
-    # Address
-    address_line1 = models.CharField(max_length=200, blank=True)
-    address_line2 = models.CharField(max_length=200, blank=True)
-    city = models.CharField(max_length=100, blank=True)
-    state = models.CharField(max_length=100, blank=True)
-    zip_code = models.CharField(max_length=20, blank=True)
-    country = models.CharField(max_length=100, default='USA')
-    
-    # Medical Information
-    medical_conditions = models.TextField(
+    phone_e164 = models.CharField(
+        max_length=16,
         blank=True,
-        help_text="Any relevant medical conditions or health concerns"
+        editable=False,
+        db_index=True,
+        help_text="Phone number normalized to E.164 for lookups"
     )
-    medications = models.TextField(
-        blank=True,
-        help_text="Current medications"
-    )
-    allergies = models.TextField(
-        blank=True,
-        help_text="Known allergies"
-    )
-    emergency_contact_name = models.CharField(max_length=200, blank=True)
-    emergency_contact_phone = models.CharField(max_length=20, blank=True)
+    date_of_birth = models.DateField(null=True, blank=True)
+    gender = models.CharField(max_length=1, choices=GENDER_CHOICES, blank=True)
     
     # Client Status
     is_active = models.BooleanField(default=True)
@@ -67,12 +62,6 @@ class Client(models.Model):
         help_text="Receive SMS notifications"
     )
     
-    # Notes
-    notes = models.TextField(
-        blank=True,
-        help_text="Internal notes about the client"
-    )
-    
     # Referral tracking
     referred_by = models.ForeignKey(
         'self',
@@ -116,40 +105,441 @@ class Client(models.Model):
             )
         return None
     
+    def get_profile(self):
+        """Address and medical details, loaded on demand; unsaved if none exist yet"""
+        try:
+            return self.profile
+        except ClientProfile.DoesNotExist:
+            return ClientProfile(client=self)
+    
+    def get_stats(self):
+        """Precomputed aggregates for this client; unsaved zeros until the nightly refresh builds the row"""
+        try:
+            return self.stats
+        except ClientStats.DoesNotExist:
+            return ClientStats(client=self)
+    
     def get_total_appointments(self):
-        return self.appointments.count()
+        return self.get_stats().total_appointments
     
     def get_completed_appointments(self):
-        return self.appointments.filter(status='COMPLETED').count()
+        return self.get_stats().completed_appointments
     
     def get_active_packages(self):
         return self.package_purchases.filter(status='ACTIVE')
     
     def get_lifetime_value(self):
-        """Calculate total revenue from this client"""
-        from django.db.models import Sum
-        from decimal import Decimal
+        """Total revenue from this client"""
+        return self.get_stats().lifetime_value
+    
+    def clean(self):
+        super().clean()
+        if self.pk and self.referred_by_id and (
+            self.referred_by_id == self.pk or
+            ReferralClosure.objects.filter(ancestor_id=self.pk, descendant_id=self.referred_by_id).exists()
+        ):
+            raise ValidationError({'referred_by': "A client cannot be referred by themselves or by someone they referred."})
+    
+    @transaction.atomic
+    def save(self, *args, **kwargs):
+        # Generate referral code if not exists
+        if not self.referral_code:
+            self.referral_code = generate_referral_code()
+        
+        from .phones import normalize_phone
+        self.phone_e164 = normalize_phone(self.phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_e164'}
+        super().save(*args, **kwargs)
+
+
+class ClientProfile(models.Model):
+    """Address, medical and note fields kept off the frequently read Client row"""
+    
+    client = models.OneToOneField(
+        Client,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='profile'
+    )
+    
+    # Address
+    address_line1 = models.CharField(max_length=200, blank=True)
+    address_line2 = models.CharField(max_length=200, blank=True)
+    city = models.CharField(max_length=100, blank=True)
+    state = models.CharField(max_length=100, blank=True)
+    zip_code = models.CharField(max_length=20, blank=True)
+    country = models.CharField(max_length=100, default='USA')
+    
+    # Medical Information
+    medical_conditions = models.TextField(
+        blank=True,
+        help_text="Any relevant medical conditions or health concerns"
+    )
+    medications = models.TextField(
+        blank=True,
+        help_text="Current medications"
+    )
+    allergies = models.TextField(
+        blank=True,
+        help_text="Known allergies"
+    )
+    emergency_contact_name = models.CharField(max_length=200, blank=True)
+    emergency_contact_phone = models.CharField(max_length=20, blank=True)
+    
+    # Notes
+    notes = models.TextField(
+        blank=True,
+        help_text="Internal notes about the client"
+    )
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Client Profile'
+        verbose_name_plural = 'Client Profiles'
+    
+    def __str__(self):
+        return f"Profile for {self.client_id}"
+
+
+class ClientStatsManager(models.Manager):
+    """Incremental and set-based maintenance of ClientStats rows"""
+    
+    STAT_FIELDS = [
+        'total_appointments',
+        'completed_appointments',
+        'appointment_spend',
+        'package_spend',
+        'lifetime_value',
+        'last_visit_date',
+    ]
+    
+    def apply_delta(self, client_id, total_appointments=0, completed_appointments=0,
+                    appointment_spend=Decimal('0.00'), package_spend=Decimal('0.00'),
+                    last_visit_date=None, create_missing=True):
+        """
+        Adjust a client's counters in place with a single UPDATE.
+        A missing row is built from scratch instead, which already
+        includes the change being applied.
+        """
+        from django.db.models import F
+        from django.db.models.functions import Coalesce, Greatest
+        
+        changes = {
+            'total_appointments': F('total_appointments') + total_appointments,
+            'completed_appointments': F('completed_appointments') + completed_appointments,
+            'appointment_spend': F('appointment_spend') + appointment_spend,
+            'package_spend': F('package_spend') + package_spend,
+            'lifetime_value': F('lifetime_value') + appointment_spend + package_spend,
+            'updated_at': timezone.now(),
+        }
+        if last_visit_date:
+            # Greatest() returns NULL on some backends when either side is NULL
+            changes['last_visit_date'] = Coalesce(
+                Greatest('last_visit_date', models.Value(last_visit_date)),
+                models.Value(last_visit_date)
+            )
         
-        # Sum from package purchases
-        package_total = self.package_purchases.aggregate(
-            total=Sum('final_price')
-        )['total'] or Decimal('0.00')
+        if not self.filter(client_id=client_id).update(**changes) and create_missing:
+            self.refresh(client_ids=[client_id])
+    
+    def recompute_last_visit(self, client_id):
+        """Re-derive last_visit_date after a visit was removed"""
+        from django.db.models import Max, OuterRef, Subquery
+        from appointments.models import Appointment
         
-        # Sum from individual appointments
-        appointment_total = self.appointments.filter(
+        last_visit = Appointment.objects.filter(
+            client=OuterRef('client'),
             status='COMPLETED'
-        ).aggregate(
-            total=Sum('final_price')
-        )['total'] or Decimal('0.00')
+        ).order_by().values('client').annotate(d=Max('appointment_date')).values('d')
+        self.filter(client_id=client_id).update(last_visit_date=Subquery(last_visit))
+    
+    def compute(self, clients):
+        """Annotate a Client queryset with freshly aggregated stats"""
+        from django.db.models import Count, Max, OuterRef, Subquery, Sum, Value
+        from django.db.models.functions import Coalesce
+        from appointments.models import Appointment
+        from packages.models import PackagePurchase
+        
+        money = models.DecimalField(max_digits=12, decimal_places=2)
+        appointments = Appointment.objects.filter(client=OuterRef('pk')).order_by().values('client')
+        completed = appointments.filter(status='COMPLETED')
+        purchases = PackagePurchase.objects.filter(client=OuterRef('pk')).order_by().values('client')
         
-        return package_total + appointment_total
+        return clients.order_by('pk').annotate(
+            stat_total=Coalesce(Subquery(appointments.annotate(n=Count('pk')).values('n')), Value(0)),
+            stat_completed=Coalesce(Subquery(completed.annotate(n=Count('pk')).values('n')), Value(0)),
+            stat_appointment_spend=Coalesce(
+                Subquery(completed.annotate(t=Sum('final_price')).values('t'), output_field=money),
+                Value(Decimal('0.00')),
+                output_field=money
+            ),
+            stat_package_spend=Coalesce(
+                Subquery(purchases.annotate(t=Sum('final_price')).values('t'), output_field=money),
+                Value(Decimal('0.00')),
+                output_field=money
+            ),
+            stat_last_visit=Subquery(completed.annotate(d=Max('appointment_date')).values('d')),
+        ).values_list(
+            'pk', 'stat_total', 'stat_completed', 'stat_appointment_spend',
+            'stat_package_spend', 'stat_last_visit'
+        )
     
-    def save(self, *args, **kwargs):
-        # Generate referral code if not exists
-        if not self.referral_code:
-            import random
-            import string
-            self.referral_code = ''.join(
-                random.choices(string.ascii_uppercase + string.digits, k=8)
+    def refresh(self, client_ids=None, batch_size=2000):
+        """
+        Recompute stats set-based and upsert the rows that drifted.
+        Returns the number of rows written.
+        """
+        clients = Client.objects.all()
+        if client_ids is not None:
+            clients = clients.filter(pk__in=client_ids)
+        
+        written = 0
+        batch = []
+        for row in self.compute(clients).iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                written += self._upsert_changed(batch)
+                batch = []
+        if batch:
+            written += self._upsert_changed(batch)
+        return written
+    
+    def _upsert_changed(self, rows):
+        quantum = Decimal('0.01')
+        current = {
+            stats[0]: stats[1:]
+            for stats in self.filter(client_id__in=[row[0] for row in rows]).values_list(
+                'client_id', *self.STAT_FIELDS
             )
-        super().save(*args, **kwargs)
+        }
+        changed = []
+        for client_id, total, completed, appointment_spend, package_spend, last_visit in rows:
+            appointment_spend = Decimal(appointment_spend).quantize(quantum)
+            package_spend = Decimal(package_spend).quantize(quantum)
+            values = (
+                total, completed, appointment_spend, package_spend,
+                appointment_spend + package_spend, last_visit
+            )
+            if current.get(client_id) != values:
+                changed.append(ClientStats(client_id=client_id, **dict(zip(self.STAT_FIELDS, values))))
+        
+        self.bulk_create(
+            changed,
+            update_conflicts=True,
+            unique_fields=['client'],
+            update_fields=self.STAT_FIELDS + ['updated_at']
+        )
+        return len(changed)
+
+
+class ClientStats(models.Model):
+    """Incrementally maintained per-client aggregates"""
+    
+    client = models.OneToOneField(
+        Client,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    total_appointments = models.PositiveIntegerField(default=0)
+    completed_appointments = models.PositiveIntegerField(default=0)
+    appointment_spend = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text="Paid for completed individual appointments"
+    )
+    package_spend = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text="Paid for package purchases"
+    )
+    lifetime_value = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00')
+    )
+    last_visit_date = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    objects = ClientStatsManager()
+    
+    class Meta:
+        verbose_name = 'Client Stats'
+        verbose_name_plural = 'Client Stats'
+        indexes = [
+            models.Index(fields=['-lifetime_value']),
+        ]
+    
+    def __str__(self):
+        return f"Stats for {self.client_id}"
+
+
+class ClientSegment(models.Model):
+    """Nightly RFM (recency, frequency, monetary) scores and segment per client"""
+    
+    SEGMENT_CHOICES = [
+        ('CHAMPIONS', 'Champions'),
+        ('LOYAL', 'Loyal'),
+        ('POTENTIAL', 'Potential Loyalists'),
+        ('NEW', 'New Customers'),
+        ('PROMISING', 'Promising'),
+        ('NEED_ATTENTION', 'Need Attention'),
+        ('ABOUT_TO_SLEEP', 'About to Sleep'),
+        ('AT_RISK', 'At Risk'),
+        ('CANT_LOSE', "Can't Lose"),
+        ('HIBERNATING', 'Hibernating'),
+        ('LOST', 'Lost'),
+        ('PROSPECT', 'Prospect (no visits yet)'),
+    ]
+    
+    client = models.OneToOneField(
+        Client,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='segment'
+    )
+    recency_score = models.PositiveSmallIntegerField(help_text="1 (longest ago) to 5 (most recent)")
+    frequency_score = models.PositiveSmallIntegerField(help_text="1 (fewest visits) to 5 (most)")
+    monetary_score = models.PositiveSmallIntegerField(help_text="1 (lowest spend) to 5 (highest)")
+    segment = models.CharField(max_length=20, choices=SEGMENT_CHOICES)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Client Segment'
+        verbose_name_plural = 'Client Segments'
+        indexes = [
+            models.Index(fields=['segment', 'client']),
+        ]
+    
+    def __str__(self):
+        return f"{self.client_id}: {self.get_segment_display()}"
+    
+    @property
+    def rfm(self):
+        return f"{self.recency_score}{self.frequency_score}{self.monetary_score}"
+
+
+class ReferralClosureManager(models.Manager):
+    """Incremental maintenance of the referral closure table"""
+    
+    def ancestors_of(self, client_ids):
+        """{client id: [(ancestor id, depth), ...]} for the given clients, themselves excluded"""
+        ancestors = {client_id: [] for client_id in client_ids}
+        for ancestor_id, descendant_id, depth in self.filter(
+            descendant_id__in=client_ids
+        ).values_list('ancestor_id', 'descendant_id', 'depth'):
+            ancestors[descendant_id].append((ancestor_id, depth))
+        return ancestors
+    
+    def add_leaves(self, links):
+        """
+        Link newly referred clients, given as (client id, referrer id) pairs,
+        under their referrers. The clients must not have referrals of their
+        own yet; referrers may be among the clients being linked.
+        """
+        links = dict(links)
+        known = self.ancestors_of([referrer for referrer in links.values() if referrer not in links])
+        rows = []
+        pending = dict(links)
+        while pending:
+            # Link clients whose referrer's own ancestry is already resolved
+            ready = [client for client, referrer in pending.items() if referrer in known]
+            if not ready:
+                raise ValueError("Referral links contain a cycle.")
+            for client in ready:
+                referrer = pending.pop(client)
+                chain = [(referrer, 1)] + [(ancestor, depth + 1) for ancestor, depth in known[referrer]]
+                known[client] = chain
+                rows += [ReferralClosure(ancestor_id=a, descendant_id=client, depth=d) for a, d in chain]
+        self.bulk_create(rows, batch_size=2000)
+        return len(rows)
+    
+    def move(self, client_id, referrer_id):
+        """
+        Re-attach a client and everyone they brought in under a new referrer
+        (None detaches them): drop the links from the old ancestors to the
+        subtree and add the links from the new ones.
+        """
+        subtree = [(client_id, 0)] + list(
+            self.filter(ancestor_id=client_id).values_list('descendant_id', 'depth')
+        )
+        subtree_ids = [descendant for descendant, _ in subtree]
+        if referrer_id in subtree_ids:
+            raise ValueError("A client cannot be referred by someone they referred.")
+        
+        self.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+        if referrer_id is None:
+            return
+        chain = [(referrer_id, 0)] + self.ancestors_of([referrer_id])[referrer_id]
+        self.bulk_create([
+            ReferralClosure(ancestor_id=ancestor, descendant_id=descendant, depth=up + 1 + down)
+            for ancestor, up in chain
+            for descendant, down in subtree
+        ], batch_size=2000)
+    
+    def remove(self, client_id):
+        """Unlink a client about to be deleted; the people they referred become roots"""
+        self.filter(
+            ancestor_id__in=self.filter(descendant_id=client_id).values('ancestor_id'),
+            descendant_id__in=self.filter(ancestor_id=client_id).values('descendant_id'),
+        ).delete()
+    
+    def rebuild(self, batch_size=5000):
+        """Recreate the whole table from Client.referred_by. Returns the number of rows."""
+        parents = dict(
+            Client.objects.filter(referred_by__isnull=False).values_list('pk', 'referred_by_id').iterator(chunk_size=batch_size)
+        )
+        with transaction.atomic():
+            self.all().delete()
+            rows, written = [], 0
+            for client_id in parents:
+                depth, ancestor, seen = 1, parents[client_id], {client_id}
+                # Stop on corrupt data that loops back on itself
+                while ancestor is not None and ancestor not in seen:
+                    rows.append(ReferralClosure(ancestor_id=ancestor, descendant_id=client_id, depth=depth))
+                    seen.add(ancestor)
+                    ancestor, depth = parents.get(ancestor), depth + 1
+                if len(rows) >= batch_size:
+                    self.bulk_create(rows)
+                    written += len(rows)
+                    rows = []
+            self.bulk_create(rows)
+        return written + len(rows)
+
+
+class ReferralClosure(models.Model):
+    """One row per (referrer, client brought in directly or indirectly) pair"""
+    
+    ancestor = models.ForeignKey(
+        Client,
+        on_delete=models.CASCADE,
+        related_name='referral_descendants'
+    )
+    descendant = models.ForeignKey(
+        Client,
+        on_delete=models.CASCADE,
+        related_name='referral_ancestors'
+    )
+    depth = models.PositiveSmallIntegerField(help_text="1 for a direct referral")
+    
+    objects = ReferralClosureManager()
+    
+    class Meta:
+        verbose_name = 'Referral Closure'
+        verbose_name_plural = 'Referral Closure'
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='referral_closure_unique'),
+        ]
+        indexes = [
+            # Subtree sizes and per-depth counts read only this index
+            models.Index(fields=['ancestor', 'depth', 'descendant'], name='referral_closure_subtree_idx'),
+            models.Index(fields=['descendant', 'depth'], name='referral_closure_chain_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
@@ -0,0 +1,65 @@
+"""E.164 phone normalization and caller lookup"""
+import re
+
+from django.conf import settings
+from django.db.models import F
+
+
+# Numbers written without an international prefix belong to this country
+DEFAULT_COUNTRY_CODE = getattr(settings, 'PHONE_DEFAULT_COUNTRY_CODE', '1')
+
+# E.164 allows at most 15 digits; shorter than 8 is never a full number
+MIN_DIGITS = 8
+MAX_DIGITS = 15
+
+# Admin search terms made only of these characters are read as phone numbers
+PHONE_TERM = re.compile(r'[\d\s+().-]+')
+
+EXTENSION = re.compile(r'\s*(?:ext\.?|extension|x|#)\s*\d+\s*$', re.IGNORECASE)
+
+
+def normalize_phone(raw, country_code=None):
+    """
+    Return `raw` as an E.164 string such as '+15551234567', or '' when it
+    cannot be read as a complete number. Extensions are dropped.
+    """
+    if not raw:
+        return ''
+    raw = EXTENSION.sub('', raw.strip())
+    digits = re.sub(r'\D', '', raw)
+    country_code = country_code or DEFAULT_COUNTRY_CODE
+
+    if raw.startswith('+'):
+        number = digits
+    elif digits.startswith('00'):
+        number = digits[2:]
+    elif country_code == '1':
+        # North American numbers: ten digits, optionally after the leading 1
+        if len(digits) == 11 and digits.startswith('1'):
+            digits = digits[1:]
+        if len(digits) != 10:
+            return ''
+        number = country_code + digits
+    else:
+        # Drop the national trunk prefix
+        number = country_code + digits.lstrip('0')
+
+    if number.startswith('0') or not MIN_DIGITS <= len(number) <= MAX_DIGITS:
+        return ''
+    if number.startswith('1') and len(number) != 11:
+        return ''
+    return '+' + number
+
+
+def find_client_by_phone(number, queryset=None):
+    """Resolve an incoming number to a client with one probe of the phone_e164 index"""
+    from .models import Client
+
+    normalized = normalize_phone(number)
+    if not normalized:
+        return None
+    queryset = Client.objects.all() if queryset is None else queryset
+    # Shared household numbers resolve to the active, most recently seen client
+    return queryset.filter(phone_e164=normalized).order_by(
+        '-is_active', F('last_visit_date').desc(nulls_last=True), 'pk'
+    ).first()
@@ -0,0 +1,95 @@
+"""Referral network queries served from the referral closure table"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+
+from .models import Client, ClientStats, ReferralClosure
+
+
+LEADERBOARD_CACHE_KEY = 'clients:referral-leaderboard'
+LEADERBOARD_VERSION_KEY = 'clients:referral-leaderboard:version'
+
+# Upper bound on staleness when the closure is changed outside this process
+LEADERBOARD_TIMEOUT = 15 * 60
+
+
+def network_stats(client):
+    """
+    Size, depth and revenue of everyone a client brought in, directly or
+    through their referrals. Each figure is a single aggregate over the
+    closure rows of the client.
+    """
+    links = ReferralClosure.objects.filter(ancestor=client)
+    totals = links.aggregate(size=Count('descendant'), depth=Max('depth'))
+    by_depth = dict(links.order_by('depth').values_list('depth').annotate(count=Count('descendant')))
+    revenue = ClientStats.objects.filter(
+        client__referral_ancestors__ancestor=client
+    ).aggregate(total=Sum('lifetime_value'))['total']
+    return {
+        'size': totals['size'],
+        'depth': totals['depth'] or 0,
+        'direct': by_depth.get(1, 0),
+        'by_depth': by_depth,
+        'revenue': revenue or Decimal('0.00'),
+    }
+
+
+def rebuild_subtree(client_ids):
+    """
+    Recreate the closure rows of the given clients and everyone they
+    brought in from Client.referred_by, e.g. after their referrers were
+    changed in bulk. The rest of the table is left alone.
+    """
+    parents, frontier = {}, set(client_ids)
+    while frontier:
+        rows = Client.objects.filter(pk__in=frontier).values_list('pk', 'referred_by_id')
+        parents.update(rows)
+        frontier = set(
+            Client.objects.filter(referred_by__in=frontier).exclude(pk__in=parents).values_list('pk', flat=True)
+        )
+    with transaction.atomic():
+        ReferralClosure.objects.filter(descendant_id__in=parents).delete()
+        ReferralClosure.objects.add_leaves(
+            (client_id, referrer_id) for client_id, referrer_id in parents.items() if referrer_id
+        )
+    invalidate_leaderboard()
+
+
+def invalidate_leaderboard():
+    """Drop cached leaderboards once the transaction changing the closure commits"""
+    transaction.on_commit(_bump_leaderboard_version)
+
+
+def _bump_leaderboard_version():
+    try:
+        cache.incr(LEADERBOARD_VERSION_KEY)
+    except ValueError:
+        cache.set(LEADERBOARD_VERSION_KEY, 1, None)
+
+
+def top_referrers(limit=10):
+    """
+    Clients with the largest referral networks, as (client, network size,
+    network revenue) tuples. Results are cached until the network changes.
+    """
+    version = cache.get_or_set(LEADERBOARD_VERSION_KEY, 1, None)
+    key = f'{LEADERBOARD_CACHE_KEY}:{version}:{limit}'
+    leaders = cache.get(key)
+    if leaders is None:
+        leaders = list(
+            ReferralClosure.objects.values('ancestor').annotate(
+                size=Count('descendant'),
+                revenue=Sum('descendant__stats__lifetime_value'),
+            ).order_by('-size', '-revenue', 'ancestor').values_list('ancestor', 'size', 'revenue')[:limit]
+        )
+        cache.set(key, leaders, LEADERBOARD_TIMEOUT)
+    clients = Client.objects.only('first_name', 'last_name', 'email', 'referral_code').in_bulk(
+        [ancestor for ancestor, _, _ in leaders]
+    )
+    return [
+        (clients[ancestor], size, revenue or Decimal('0.00'))
+        for ancestor, size, revenue in leaders
+        if ancestor in clients
+    ]
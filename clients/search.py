@@ -0,0 +1,144 @@
+"""Indexed, ranked client search
+
+PostgreSQL: trigram (pg_trgm) and full-text GIN indexes on an expression
+over the searchable columns. SQLite: an FTS5 trigram table kept in sync by
+triggers on the clients table.
+"""
+import sqlite3
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+
+SEARCH_COLUMNS = ['first_name', 'last_name', 'email', 'phone', 'referral_code']
+
+FTS_TABLE = 'clients_client_fts'
+
+# The FTS5 trigram tokenizer needs at least three characters to match
+MIN_TERM_LENGTH = 3
+
+
+def _pg_expression(prefix=''):
+    # Must be identical (up to qualification) in the index and the queries
+    return 'lower(' + " || ' ' || ".join(prefix + column for column in SEARCH_COLUMNS) + ')'
+
+
+def is_search_index_available(using='default'):
+    vendor = connections[using].vendor
+    if vendor == 'postgresql':
+        return True
+    if vendor == 'sqlite':
+        return sqlite3.sqlite_version_info >= (3, 34, 0)
+    return False
+
+
+def can_search(term, using='default'):
+    """Whether search_clients will serve this term from the index"""
+    return len(term.strip()) >= MIN_TERM_LENGTH and is_search_index_available(using)
+
+
+def install_search_index(connection):
+    """Create the search index structures; safe to run repeatedly"""
+    if not is_search_index_available(connection.alias):
+        return
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            expression = _pg_expression()
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS clients_client_search_trgm "
+                f"ON clients_client USING gin (({expression}) gin_trgm_ops)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS clients_client_search_fts "
+                f"ON clients_client USING gin (to_tsvector('simple'::regconfig, {expression}))"
+            )
+            return
+
+        columns = ', '.join(SEARCH_COLUMNS)
+        new_values = ', '.join('new.' + column for column in SEARCH_COLUMNS)
+        old_values = ', '.join('old.' + column for column in SEARCH_COLUMNS)
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"{columns}, content='clients_client', content_rowid='id', tokenize='trigram')"
+        )
+
+        # Rebuilding the clients table on SQLite drops its triggers
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+            [FTS_TABLE + '_%']
+        )
+        if cursor.fetchone()[0] == 3:
+            return
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON clients_client BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON clients_client BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE ON clients_client BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+        )
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def uninstall_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("DROP INDEX IF EXISTS clients_client_search_trgm")
+            cursor.execute("DROP INDEX IF EXISTS clients_client_search_fts")
+        elif connection.vendor == 'sqlite':
+            for suffix in ['insert', 'delete', 'update']:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def search_clients(queryset, term):
+    """
+    Filter a Client queryset to rows matching `term`, annotated with
+    `search_rank` and ordered best match first. Returns None when the
+    search index cannot serve the term.
+    """
+    if not can_search(term, queryset.db):
+        return None
+    term = term.strip()
+    vendor = connections[queryset.db].vendor
+
+    if vendor == 'postgresql':
+        expression = _pg_expression('clients_client.')
+        rank = RawSQL(
+            f"similarity({expression}, lower(%s)) + "
+            f"ts_rank(to_tsvector('simple'::regconfig, {expression}), "
+            f"plainto_tsquery('simple'::regconfig, %s))",
+            [term, term],
+            output_field=FloatField()
+        )
+        # LIKE and %% (similarity) are served by the trigram index, @@ by the full-text one
+        matches = RawSQL(
+            f"{expression} LIKE %s OR {expression} %% lower(%s) OR "
+            f"to_tsvector('simple'::regconfig, {expression}) @@ "
+            f"plainto_tsquery('simple'::regconfig, %s)",
+            ['%' + escape_like(term.lower()) + '%', term, term],
+            output_field=BooleanField()
+        )
+        return queryset.filter(matches).annotate(search_rank=rank).order_by('-search_rank')
+
+    phrase = '"' + term.replace('"', '""') + '"'
+    rank = RawSQL(
+        f"(SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = clients_client.id)",
+        [phrase],
+        output_field=FloatField()
+    )
+    matching_ids = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [phrase])
+    return queryset.filter(pk__in=matching_ids).annotate(search_rank=rank).order_by('-search_rank')
+
+
+def escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
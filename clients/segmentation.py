@@ -0,0 +1,100 @@
+"""Vectorized RFM scoring and segmentation of all clients"""
+import numpy as np
+from django.utils import timezone
+
+from .models import Client, ClientSegment
+
+
+# Segment per (recency score, combined frequency/monetary score), both 1-5
+SEGMENT_GRID = [
+    # FM:  1                 2                 3                 4              5
+    ['LOST',           'LOST',           'AT_RISK',        'CANT_LOSE',   'CANT_LOSE'],  # R=1
+    ['HIBERNATING',    'HIBERNATING',    'AT_RISK',        'AT_RISK',     'CANT_LOSE'],  # R=2
+    ['ABOUT_TO_SLEEP', 'NEED_ATTENTION', 'NEED_ATTENTION', 'LOYAL',       'LOYAL'],      # R=3
+    ['PROMISING',      'POTENTIAL',      'LOYAL',          'CHAMPIONS',   'CHAMPIONS'],  # R=4
+    ['NEW',            'POTENTIAL',      'POTENTIAL',      'CHAMPIONS',   'CHAMPIONS'],  # R=5
+]
+
+SEGMENT_CODES = np.array([code for code, _ in ClientSegment.SEGMENT_CHOICES])
+SEGMENT_INDEX = np.array([
+    [np.flatnonzero(SEGMENT_CODES == code)[0] for code in row] for row in SEGMENT_GRID
+])
+PROSPECT = np.flatnonzero(SEGMENT_CODES == 'PROSPECT')[0]
+
+
+def quintile_scores(values):
+    """
+    Score each value 1-5 by its quintile among all values. Equal values
+    share the score of their first position, so ties never straddle a boundary.
+    """
+    if not len(values):
+        return np.zeros(0, dtype=np.int64)
+    rank = np.searchsorted(np.sort(values), values, side='left')
+    return 1 + (rank * 5) // len(values)
+
+
+def load_rfm_arrays(chunk_size=10000):
+    """Client ids, days since last visit (-1 if never), completed visits and spend, in one pass"""
+    today = timezone.localdate().toordinal()
+    rows = Client.objects.order_by().values_list(
+        'pk', 'stats__last_visit_date', 'stats__completed_appointments', 'stats__lifetime_value'
+    ).iterator(chunk_size=chunk_size)
+    
+    ids, recency, frequency, monetary = [], [], [], []
+    for pk, last_visit, completed, spend in rows:
+        ids.append(pk)
+        recency.append(today - last_visit.toordinal() if last_visit else -1)
+        frequency.append(completed or 0)
+        monetary.append(spend or 0)
+    return (
+        np.array(ids, dtype=np.int64),
+        np.array(recency, dtype=np.int64),
+        np.array(frequency, dtype=np.int64),
+        np.array(monetary, dtype=np.float64),
+    )
+
+
+def score_rfm(recency, frequency, monetary):
+    """Return (r, f, m, segment code) arrays for the given RFM arrays"""
+    # Clients without a completed visit are prospects and stay out of the quintiles
+    visited = recency >= 0
+    r, f, m = (np.ones(len(recency), dtype=np.int64) for _ in range(3))
+    # Fewer days since the last visit is better
+    r[visited] = quintile_scores(-recency[visited])
+    f[visited] = quintile_scores(frequency[visited])
+    m[visited] = quintile_scores(monetary[visited])
+    fm = (f + m + 1) // 2
+    segments = np.where(visited, SEGMENT_INDEX[r - 1, fm - 1], PROSPECT)
+    return r, f, m, SEGMENT_CODES[segments]
+
+
+def segment_clients(batch_size=5000):
+    """
+    Score every client and upsert the segment rows whose scores changed.
+    Returns the number of rows written.
+    """
+    ids, recency, frequency, monetary = load_rfm_arrays()
+    r, f, m, segments = score_rfm(recency, frequency, monetary)
+    
+    current = {
+        client_id: (rs, fs, ms, segment)
+        for client_id, rs, fs, ms, segment in ClientSegment.objects.values_list(
+            'client_id', 'recency_score', 'frequency_score', 'monetary_score', 'segment'
+        ).iterator(chunk_size=batch_size)
+    }
+    changed = [
+        ClientSegment(client_id=client_id, recency_score=rs, frequency_score=fs,
+                      monetary_score=ms, segment=segment)
+        for client_id, rs, fs, ms, segment in zip(
+            ids.tolist(), r.tolist(), f.tolist(), m.tolist(), segments.tolist()
+        )
+        if current.get(client_id) != (rs, fs, ms, segment)
+    ]
+    ClientSegment.objects.bulk_create(
+        changed,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['client'],
+        update_fields=['recency_score', 'frequency_score', 'monetary_score', 'segment', 'updated_at']
+    )
+    return len(changed)
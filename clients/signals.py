@@ -0,0 +1,151 @@
+from decimal import Decimal
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from appointments.models import Appointment
+from packages.models import PackagePurchase
+from .models import Client, ClientStats, ReferralClosure
+from .referrals import invalidate_leaderboard
+
+
+COUNTERS = ['total_appointments', 'completed_appointments', 'appointment_spend']
+
+
+def _appointment_contribution(client_id, status, final_price, appointment_date):
+    """What one appointment adds to its client's stats"""
+    completed = status == 'COMPLETED'
+    return {
+        'client_id': client_id,
+        'total_appointments': 1,
+        'completed_appointments': 1 if completed else 0,
+        'appointment_spend': (final_price or Decimal('0.00')) if completed else Decimal('0.00'),
+        'last_visit_date': appointment_date if completed else None,
+    }
+
+
+def _apply_appointment_change(old, new, create_missing=True):
+    """Apply the difference between two appointment contributions"""
+    deltas = {}
+    for sign, contribution in [(-1, old), (1, new)]:
+        if contribution:
+            delta = deltas.setdefault(contribution['client_id'], dict.fromkeys(COUNTERS, 0))
+            for field in COUNTERS:
+                delta[field] += sign * contribution[field]
+    
+    old_visit = old['last_visit_date'] if old else None
+    new_visit = new['last_visit_date'] if new else None
+    visit_lost = old_visit and (
+        not new or old['client_id'] != new['client_id'] or not new_visit or new_visit < old_visit
+    )
+    
+    for client_id, delta in deltas.items():
+        visit = new_visit if new and client_id == new['client_id'] else None
+        if any(delta.values()) or (visit and visit != old_visit):
+            ClientStats.objects.apply_delta(
+                client_id, last_visit_date=visit, create_missing=create_missing, **delta
+            )
+        if visit_lost and client_id == old['client_id']:
+            ClientStats.objects.recompute_last_visit(client_id)
+
+
+@receiver(pre_save, sender=Appointment)
+def remember_appointment_stats(sender, instance, **kwargs):
+    """Keep the stored values so post_save can apply the difference"""
+    instance._stats_before = None
+    if instance.pk:
+        row = Appointment.objects.filter(pk=instance.pk).values_list(
+            'client_id', 'status', 'final_price', 'appointment_date'
+        ).first()
+        if row:
+            instance._stats_before = _appointment_contribution(*row)
+
+
+@receiver(post_save, sender=Appointment)
+def update_stats_for_appointment(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _apply_appointment_change(
+        getattr(instance, '_stats_before', None),
+        _appointment_contribution(
+            instance.client_id, instance.status, instance.final_price, instance.appointment_date
+        )
+    )
+
+
+@receiver(post_delete, sender=Appointment)
+def remove_stats_for_appointment(sender, instance, **kwargs):
+    # Never recreate rows here: the client itself may be being deleted
+    _apply_appointment_change(
+        _appointment_contribution(
+            instance.client_id, instance.status, instance.final_price, instance.appointment_date
+        ),
+        None,
+        create_missing=False
+    )
+
+
+@receiver(pre_save, sender=PackagePurchase)
+def remember_purchase_stats(sender, instance, **kwargs):
+    instance._stats_before = None
+    if instance.pk:
+        instance._stats_before = PackagePurchase.objects.filter(pk=instance.pk).values_list(
+            'client_id', 'final_price'
+        ).first()
+
+
+@receiver(post_save, sender=PackagePurchase)
+def update_stats_for_purchase(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_stats_before', None)
+    if before and before[0] != instance.client_id:
+        ClientStats.objects.apply_delta(before[0], package_spend=-before[1], create_missing=False)
+        before = None
+    spend = instance.final_price - (before[1] if before else Decimal('0.00'))
+    if spend:
+        ClientStats.objects.apply_delta(instance.client_id, package_spend=spend)
+
+
+@receiver(post_delete, sender=PackagePurchase)
+def remove_stats_for_purchase(sender, instance, **kwargs):
+    ClientStats.objects.apply_delta(
+        instance.client_id,
+        package_spend=-instance.final_price,
+        create_missing=False
+    )
+
+
+@receiver(pre_save, sender=Client)
+def remember_referrer(sender, instance, **kwargs):
+    instance._referrer_before = None
+    if instance.pk:
+        instance._referrer_before = Client.objects.filter(pk=instance.pk).values_list(
+            'referred_by_id', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=Client)
+def create_client_stats(sender, instance, created, raw=False, **kwargs):
+    """A new client starts with an all-zero stats row"""
+    if created and not raw:
+        ClientStats.objects.get_or_create(client=instance)
+
+
+@receiver(post_save, sender=Client)
+def update_referral_closure(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_referrer_before', None)
+    if instance.referred_by_id == before:
+        return
+    if created:
+        ReferralClosure.objects.add_leaves([(instance.pk, instance.referred_by_id)])
+    else:
+        ReferralClosure.objects.move(instance.pk, instance.referred_by_id)
+    invalidate_leaderboard()
+
+
+@receiver(pre_delete, sender=Client)
+def remove_from_referral_closure(sender, instance, **kwargs):
+    # The client's own rows cascade; the people they referred lose their referrer via SET_NULL
+    ReferralClosure.objects.remove(instance.pk)
+    invalidate_leaderboard()
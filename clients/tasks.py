@@ -0,0 +1,19 @@
+from celery import shared_task
+
+
+@shared_task
+def reconcile_client_stats():
+    """Nightly set-based correction of drifted client stats"""
+    from .models import ClientStats
+    
+    corrected = ClientStats.objects.refresh()
+    return f"Corrected {corrected} client stats rows"
+
+
+@shared_task
+def segment_clients():
+    """Nightly RFM scoring of every client for campaign targeting"""
+    from .segmentation import segment_clients as run_segmentation
+    
+    changed = run_segmentation()
+    return f"Updated {changed} client segments"
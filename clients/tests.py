@@ -0,0 +1,395 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from appointments.models import Appointment
+from crm_cryo.exports import iter_export
+from services.models import Service, ServiceType
+
+from .dedup import find_duplicates, merge_clients, soundex
+from .importing import ClientImporter, read_rows
+from .models import Client, ClientProfile, ClientSegment, ClientStats, ReferralClosure
+from .search import search_clients
+from .segmentation import quintile_scores, segment_clients
+
+
+def make_client(name, referred_by=None):
+    return Client.objects.create(
+        first_name=name,
+        last_name='Test',
+        email=f'{name.lower()}@example.com',
+        phone='555-0100',
+        referred_by=referred_by,
+    )
+
+
+class MergeReferralClosureTests(TestCase):
+
+    def closure(self):
+        return set(ReferralClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+
+    def rebuilt_closure(self):
+        ReferralClosure.objects.rebuild()
+        return self.closure()
+
+    def test_shared_referrer(self):
+        referrer = make_client('Referrer')
+        client = make_client('Client', referred_by=referrer)
+        duplicate = make_client('Duplicate', referred_by=referrer)
+        friend = make_client('Friend', referred_by=duplicate)
+
+        merge_clients(client, duplicate)
+
+        friend.refresh_from_db()
+        self.assertEqual(friend.referred_by_id, client.pk)
+        merged = self.closure()
+        self.assertEqual(merged, {
+            (referrer.pk, client.pk, 1), (client.pk, friend.pk, 1), (referrer.pk, friend.pk, 2),
+        })
+        self.assertEqual(merged, self.rebuilt_closure())
+
+    def test_duplicate_referred_the_client(self):
+        referrer = make_client('Referrer')
+        duplicate = make_client('Duplicate', referred_by=referrer)
+        client = make_client('Client', referred_by=duplicate)
+        friend = make_client('Friend', referred_by=duplicate)
+
+        merge_clients(client, duplicate)
+
+        client.refresh_from_db()
+        friend.refresh_from_db()
+        self.assertEqual(client.referred_by_id, referrer.pk)
+        self.assertEqual(friend.referred_by_id, client.pk)
+        merged = self.closure()
+        self.assertFalse(any(ancestor == descendant for ancestor, descendant, _ in merged))
+        self.assertEqual(merged, {
+            (referrer.pk, client.pk, 1), (client.pk, friend.pk, 1), (referrer.pk, friend.pk, 2),
+        })
+        self.assertEqual(merged, self.rebuilt_closure())
+
+    def test_referral_of_duplicate_who_referred_the_client(self):
+        duplicate = make_client('Duplicate')
+        middle = make_client('Middle', referred_by=duplicate)
+        client = make_client('Client', referred_by=middle)
+
+        merge_clients(client, duplicate)
+
+        middle.refresh_from_db()
+        client.refresh_from_db()
+        self.assertIsNone(middle.referred_by_id)
+        self.assertEqual(client.referred_by_id, middle.pk)
+        self.assertEqual(self.closure(), {(middle.pk, client.pk, 1)})
+
+
+class DuplicateTests(TestCase):
+
+    def make_person(self, first_name, last_name, email, phone='555-0100', date_of_birth=None):
+        return Client.objects.create(
+            first_name=first_name, last_name=last_name, email=email, phone=phone, date_of_birth=date_of_birth
+        )
+
+    def test_soundex(self):
+        self.assertEqual(
+            [soundex(name) for name in ['Robert', 'Rupert', 'Ashcraft', 'Tymczak', 'Pfister', "O'Hara", '']],
+            ['R163', 'R163', 'A261', 'T522', 'P236', 'O600', '']
+        )
+
+    def test_pairs_sharing_a_blocking_key_are_scored(self):
+        ann = self.make_person('Ann', 'Smith', 'ann@example.com', phone='555-123-4567')
+        annie = self.make_person('Anne', 'Smith', 'ann.smith@example.com', phone='(555) 123-4567')
+        born = date(1990, 5, 17)
+        jon = self.make_person('Jon', 'Smith', 'jon@example.com', date_of_birth=born)
+        john = self.make_person('John', 'Smith', 'john@example.org', date_of_birth=born)
+        # Same name but nothing to block on
+        self.make_person('Ann', 'Smith', 'other@example.com')
+
+        candidates = find_duplicates()
+
+        self.assertEqual([(c.client, c.duplicate) for c in candidates], [(ann, annie), (jon, john)])
+        self.assertIn('same phone', candidates[0].reasons)
+        self.assertEqual(candidates[1].reasons[:2], ['same date of birth', 'same last name'])
+        self.assertEqual(find_duplicates(threshold=0.9), [])
+
+    def test_shared_numbers_are_not_compared(self):
+        for name in ['Ann', 'Bob', 'Cy']:
+            self.make_person(name, 'Smith', f'{name.lower()}@example.com', phone='555-123-4567')
+
+        self.assertEqual(len(find_duplicates(threshold=0)), 3)
+        with mock.patch('clients.dedup.MAX_BLOCK_SIZE', 2):
+            self.assertEqual(find_duplicates(threshold=0), [])
+
+    def test_merge_moves_records_and_fills_gaps(self):
+        service_type = ServiceType.objects.create(name='Cryotherapy', code='CRYO')
+        service = Service.objects.create(
+            name='Whole Body', service_type=service_type, duration_minutes=30, base_price=Decimal('50.00')
+        )
+        client = self.make_person('Ann', 'Smith', 'ann@example.com')
+        duplicate = self.make_person('Anne', 'Smith', 'ann.smith@example.com', date_of_birth=date(1990, 5, 17))
+        ClientProfile.objects.create(client=client, notes='Prefers mornings')
+        ClientProfile.objects.create(client=duplicate, city='Austin', notes='Paid in cash')
+        for owner in [client, duplicate]:
+            Appointment.objects.create(
+                client=owner, service=service, duration_minutes=30,
+                start_at=timezone.now() - timedelta(days=1), status='COMPLETED',
+            )
+
+        merged = merge_clients(client, duplicate)
+
+        self.assertFalse(Client.objects.filter(pk=duplicate.pk).exists())
+        self.assertEqual(Appointment.objects.filter(client=client).count(), 2)
+        self.assertEqual(merged.date_of_birth, date(1990, 5, 17))
+        profile = ClientProfile.objects.get(client=client)
+        self.assertEqual(profile.city, 'Austin')
+        self.assertEqual(profile.notes, 'Prefers mornings\n\nPaid in cash')
+        stats = ClientStats.objects.get(client=client)
+        self.assertEqual((stats.completed_appointments, stats.lifetime_value), (2, Decimal('100.00')))
+
+        with self.assertRaises(ValueError):
+            merge_clients(client, client)
+
+
+class ClientImportTests(TestCase):
+
+    def run_import(self, text, format, **options):
+        options.setdefault('batch_size', 10)
+        return ClientImporter(**options).run(read_rows(io.StringIO(text), format))
+
+    def test_csv_row_with_extra_fields_is_rejected(self):
+        result = self.run_import(
+            'first_name,last_name,email,phone\n'
+            'Ann,Smith,ann@example.com,555-0100\n'
+            'Bob,Jones,bob@example.com,555-0101,unexpected\n',
+            'csv'
+        )
+        self.assertEqual(result.created, 1)
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(result.errors[0][0], 3)
+        self.assertIn('Too many fields', result.errors[0][1])
+
+    def test_malformed_json_line_is_rejected(self):
+        result = self.run_import(
+            '{"first_name": "Ann", "last_name": "Smith", "email": "ann@example.com", "phone": "555-0100"}\n'
+            '{"first_name": "Bob",\n'
+            '["not", "an", "object"]\n'
+            '{"first_name": "Cy", "last_name": "Lee", "email": "cy@example.com", "phone": "555-0102"}\n',
+            'jsonl'
+        )
+        self.assertEqual(result.created, 2)
+        self.assertEqual([line for line, _ in result.errors], [2, 3])
+
+    def test_referral_of_rejected_referrer_is_reported(self):
+        make_client('Existing')
+        result = self.run_import(
+            'first_name,last_name,email,phone,referral_code,referred_by_code\n'
+            'Dup,Test,existing@example.com,555-0100,REFDUP01,\n'
+            'Friend,Test,friend@example.com,555-0101,,REFDUP01\n'
+            'Ann,Smith,ann@example.com,555-0102,,\n',
+            'csv'
+        )
+        self.assertEqual(result.created, 1)
+        self.assertEqual(sorted(line for line, _ in result.errors), [2, 3])
+        self.assertFalse(Client.objects.filter(email='friend@example.com').exists())
+
+    def test_dry_run_resolves_referrers_from_earlier_batches(self):
+        result = self.run_import(
+            'first_name,last_name,email,phone,referral_code,referred_by_code\n'
+            'Ann,Smith,ann@example.com,555-0100,REFANN01,\n'
+            'Bob,Jones,bob@example.com,555-0101,REFBOB01,REFANN01\n'
+            'Cy,Lee,cy@example.com,555-0102,,REFBOB01\n'
+            'Dee,Ray,dee@example.com,555-0103,,REFNONE1\n',
+            'csv', batch_size=1, dry_run=True
+        )
+        self.assertEqual(result.created, 3)
+        self.assertEqual(result.errors, [(5, "No client has referral code REFNONE1.")])
+        self.assertFalse(Client.objects.exists())
+
+
+class ClientStatsTests(TestCase):
+
+    def test_new_client_gets_a_stats_row(self):
+        client = make_client('Ann')
+
+        stats = ClientStats.objects.get(client=client)
+        self.assertEqual((stats.total_appointments, stats.lifetime_value), (0, 0))
+
+    def test_missing_stats_row_reads_as_zeros_without_writing(self):
+        client = make_client('Ann')
+        ClientStats.objects.all().delete()
+        client = Client.objects.get(pk=client.pk)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(client.get_total_appointments(), 0)
+            self.assertEqual(client.get_lifetime_value(), 0)
+
+        self.assertFalse(ClientStats.objects.exists())
+        self.assertFalse([query for query in queries if query['sql'].startswith(('INSERT', 'UPDATE'))])
+
+    def test_changelist_does_not_build_missing_stats_rows(self):
+        for name in ['Ann', 'Bob', 'Cy']:
+            make_client(name)
+        ClientStats.objects.all().delete()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:clients_client_changelist'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'ann@example.com')
+        self.assertFalse(ClientStats.objects.exists())
+        writes = [query['sql'] for query in queries if query['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(writes, [])
+
+
+class ClientSearchTests(TestCase):
+
+    def setUp(self):
+        self.ann, self.bob, self.cy = [
+            Client.objects.create(first_name=first, last_name=last, email=email, phone='555-0100')
+            for first, last, email in [
+                ('Ann', 'Smith', 'smith@example.com'),
+                ('Bob', 'Jones', 'bsmith@example.com'),
+                ('Cy', 'Lee', 'cy@example.com'),
+            ]
+        ]
+
+    def test_matches_are_ranked_best_first(self):
+        results = search_clients(Client.objects.all(), ' smith ')
+
+        self.assertEqual(list(results), [self.ann, self.bob])
+        self.assertGreater(results[0].search_rank, results[1].search_rank)
+
+    def test_edited_clients_are_found_by_their_new_values(self):
+        self.cy.last_name = 'Lindqvist'
+        self.cy.save()
+
+        self.assertEqual(list(search_clients(Client.objects.all(), 'lindq')), [self.cy])
+        self.assertEqual(list(search_clients(Client.objects.all(), 'Lee')), [])
+
+    def test_short_terms_fall_back_to_the_admin_search(self):
+        self.assertIsNone(search_clients(Client.objects.all(), 'cy'))
+
+        client_admin = admin.site._registry[Client]
+        results, _ = client_admin.get_search_results(None, Client.objects.all(), 'cy')
+        self.assertEqual(list(results), [self.cy])
+
+
+class ClientAdminSearchTests(TestCase):
+
+    def search(self, term):
+        client_admin = admin.site._registry[Client]
+        results, _ = client_admin.get_search_results(None, Client.objects.all(), term)
+        return set(results.values_list('first_name', flat=True))
+
+    def test_phone_number_term_probes_the_normalized_number(self):
+        Client.objects.create(first_name='Ann', last_name='Test', email='ann@example.com', phone='555-123-4567')
+        make_client('Bob')
+
+        self.assertEqual(self.search('(555) 123-4567'), {'Ann'})
+        self.assertEqual(self.search('+1 555.123.4567'), {'Ann'})
+
+    def test_terms_with_other_characters_are_not_phone_probes(self):
+        Client.objects.create(first_name='Ann', last_name='Test', email='ann@example.com', phone='555-123-4567')
+        Client.objects.create(first_name='John', last_name='Test', email='5551234567@x.com', phone='555-0100')
+
+        self.assertEqual(self.search('5551234567@x.com'), {'John'})
+        self.assertNotIn('Ann', self.search('john 5551234567'))
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.ann = make_client('Ann')
+        self.bob = make_client('Bob', referred_by=self.ann)
+
+    def test_csv_has_a_header_and_one_line_per_row(self):
+        columns = ['id', 'first_name', 'referred_by__referral_code']
+        lines = list(iter_export(Client.objects.all(), columns, chunk_size=1))
+
+        self.assertEqual(list(csv.reader(lines)), [
+            columns,
+            [str(self.ann.pk), 'Ann', ''],
+            [str(self.bob.pk), 'Bob', self.ann.referral_code],
+        ])
+
+    def test_jsonl_rows_are_objects_of_the_columns(self):
+        lines = list(iter_export(Client.objects.all(), ['email', 'created_at'], format='jsonl'))
+
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['email'] for row in rows], ['ann@example.com', 'bob@example.com'])
+        self.assertEqual(rows[0]['created_at'], DjangoJSONEncoder().default(self.ann.created_at))
+
+    def test_command_writes_a_gzipped_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'clients.jsonl.gz')
+            out = io.StringIO()
+            call_command('export_data', 'clients', format='jsonl', output=path, columns='id,email', stdout=out)
+
+            with gzip.open(path, 'rt') as exported:
+                emails = [json.loads(line)['email'] for line in exported]
+        self.assertEqual(emails, ['ann@example.com', 'bob@example.com'])
+        self.assertIn('Exported 2 clients rows', out.getvalue())
+
+    def test_command_rejects_unknown_columns(self):
+        with self.assertRaisesMessage(CommandError, 'Invalid column'):
+            call_command('export_data', 'clients', columns='id,nickname', output=os.devnull)
+
+
+class SegmentationTests(TestCase):
+
+    def test_quintile_scores(self):
+        self.assertEqual(quintile_scores(list(range(10))).tolist(), [1, 1, 2, 2, 3, 3, 4, 4, 5, 5])
+        # Equal values share the score of the first of them
+        self.assertEqual(quintile_scores([5, 5, 5, 1]).tolist(), [2, 2, 2, 1])
+
+    def test_clients_are_scored_and_only_changes_are_written(self):
+        today = timezone.localdate()
+        clients = {}
+        for name, days, visits, spend in [
+            ('Ann', 1, 20, '2000.00'),
+            ('Bob', 10, 10, '1000.00'),
+            ('Cy', 30, 5, '500.00'),
+            ('Dee', 100, 2, '200.00'),
+            ('Eve', 400, 1, '100.00'),
+        ]:
+            clients[name] = make_client(name)
+            ClientStats.objects.filter(client=clients[name]).update(
+                last_visit_date=today - timedelta(days=days), completed_appointments=visits,
+                lifetime_value=Decimal(spend),
+            )
+        clients['Fay'] = make_client('Fay')
+
+        self.assertEqual(segment_clients(), 6)
+
+        segments = dict(ClientSegment.objects.values_list('client__first_name', 'segment'))
+        self.assertEqual(segments, {
+            'Ann': 'CHAMPIONS', 'Bob': 'CHAMPIONS', 'Cy': 'NEED_ATTENTION',
+            'Dee': 'HIBERNATING', 'Eve': 'LOST', 'Fay': 'PROSPECT',
+        })
+        self.assertEqual(
+            ClientSegment.objects.values_list('recency_score', 'frequency_score', 'monetary_score').get(
+                client=clients['Cy']
+            ),
+            (3, 3, 3)
+        )
+        self.assertEqual(segment_clients(), 0)
+
+        # Eve comes back; only the clients whose scores move are rewritten
+        ClientStats.objects.filter(client=clients['Eve']).update(last_visit_date=today)
+        self.assertEqual(segment_clients(), 5)
+        self.assertEqual(ClientSegment.objects.get(client=clients['Eve']).segment, 'NEW')
@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.utils import timezone
-from .models import EmailTemplate, EmailCampaign, ScheduledEmail, EmailLog
+from crm_cryo.exports import export_csv, export_jsonl
+from .models import EmailTemplate, EmailCampaign, ScheduledEmail, EmailLog, JobWatermark
 
 
 @admin.register(EmailTemplate)
@@ -68,7 +69,9 @@ class EmailCampaignAdmin(admin.ModelAdmin):
                 'send_to_all',
                 'target_clients',
                 'only_marketing_subscribers',
-                'only_active_clients'
+                'only_active_clients',
+                'target_segments',
+                'min_breakage_probability'
             )
         }),
         ('Scheduling', {
@@ -228,9 +231,16 @@ class EmailLogAdmin(admin.ModelAdmin):
         'clicked_at'
     ]
     date_hierarchy = 'sent_at'
+    actions = [export_csv, export_jsonl]
     
     def has_add_permission(self, request):
         return False
     
     def has_change_permission(self, request, obj=None):
         return False
+
+
+@admin.register(JobWatermark)
+class JobWatermarkAdmin(admin.ModelAdmin):
+    list_display = ['name', 'processed_until', 'updated_at']
+    readonly_fields = ['updated_at']
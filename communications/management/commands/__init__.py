@@ -0,0 +1 @@
+# Communications Management Commands
@@ -0,0 +1,206 @@
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from appointments.models import Appointment
+from clients.models import Client
+from communications.models import EmailTemplate, ScheduledEmail
+from communications.tasks import (
+    get_expiring_packages_queryset,
+    get_pending_emails_queryset,
+    get_reminder_queryset,
+)
+from packages.models import Package, PackagePurchase
+from services.models import Service, ServiceType
+
+
+BATCH_SIZE = 5000
+
+# One row in LIVE_EVERY belongs to the live subset each job scans
+LIVE_EVERY = 100
+
+# Index each job's plan must use; the last is the generated name of ScheduledEmail's (status, scheduled_for)
+JOB_INDEXES = [
+    ('send_daily_reminders', 'appt_reminder_due_idx'),
+    ('send_package_expiry_warnings', 'purchase_status_expiry_idx'),
+    ('process_scheduled_emails', 'communicati_status_d04599_idx'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed growing volumes of synthetic rows and check that the daily job '
+        'queries stay on their indexes. Fails if a plan uses another index or a '
+        'full scan. All rows are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='1000,10000,100000',
+            help='Comma-separated table sizes to benchmark (default: 1000,10000,100000)'
+        )
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+
+        self.stdout.write(f'{"rows":>10}  {"job":<30} {"access":<8} {"ms":>8}  plan')
+        missed = []
+        with transaction.atomic():
+            self.setup_catalog()
+            seeded = 0
+            for size in sizes:
+                self.seed(seeded, size)
+                seeded = size
+                self.analyze()
+                for job, index_name, queryset in self.get_job_querysets():
+                    plan = self.explain(queryset)
+                    started = time.perf_counter()
+                    list(queryset)
+                    elapsed = (time.perf_counter() - started) * 1000
+                    access, plan_line = self.classify(plan, queryset.model._meta.db_table, index_name)
+                    self.stdout.write(f'{size:>10}  {job:<30} {access:<8} {elapsed:>8.2f}  {plan_line}')
+                    if access != 'expected':
+                        missed.append(f'{job} at {size} rows ({index_name} not used)')
+            transaction.set_rollback(True)
+
+        if missed:
+            raise CommandError('Job queries off their indexes: ' + '; '.join(missed))
+        self.stdout.write(self.style.SUCCESS('✓ Every job query used its index (synthetic rows rolled back).'))
+
+    def explain(self, queryset):
+        """
+        The queryset's plan. SQLite only matches a partial index against
+        literal values, so there the parameters are inlined first, as the
+        PostgreSQL drivers do client-side before the server plans the query.
+        """
+        if connection.vendor != 'sqlite':
+            return queryset.explain()
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + connection.ops.last_executed_query(cursor, sql, params))
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+    def classify(self, plan, table, index_name):
+        """Label how the plan reaches the job's table: its expected index, another index or a full scan"""
+        lines = [line.strip() for line in plan.splitlines() if line.strip()]
+        plan_line = next((line for line in lines if index_name in line), None)
+        if plan_line:
+            return 'expected', plan_line
+        plan_line = next((line for line in lines if table in line), lines[0])
+        if 'Seq Scan' in plan_line or ('SCAN' in plan_line and 'INDEX' not in plan_line):
+            return 'SCAN', plan_line
+        return 'OTHER', plan_line
+
+    def get_job_querysets(self):
+        today = timezone.localdate()
+        querysets = {
+            'send_daily_reminders': get_reminder_queryset(today + timedelta(days=1)),
+            'send_package_expiry_warnings': get_expiring_packages_queryset(today, today + timedelta(days=8)),
+            'process_scheduled_emails': get_pending_emails_queryset(timezone.now()),
+        }
+        return [(job, index_name, querysets[job]) for job, index_name in JOB_INDEXES]
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                for model in [Appointment, PackagePurchase, ScheduledEmail, Client]:
+                    cursor.execute(f'ANALYZE "{model._meta.db_table}"')
+            else:
+                cursor.execute('ANALYZE')
+
+    def setup_catalog(self):
+        service_type = ServiceType.objects.create(name='Benchmark', code='BENCH')
+        self.service = Service.objects.create(
+            name='Benchmark Service',
+            service_type=service_type,
+            duration_minutes=30,
+            base_price=Decimal('50.00')
+        )
+        self.package = Package.objects.create(
+            name='Benchmark Package',
+            category='CUSTOM',
+            description='Benchmark',
+            total_sessions=10,
+            price=Decimal('500.00')
+        )
+        self.template = EmailTemplate.objects.create(
+            name='Benchmark',
+            template_type='CUSTOM',
+            subject='Benchmark',
+            html_content='Benchmark'
+        )
+        self.clients = []
+
+    def seed(self, start, end):
+        today = timezone.localdate()
+        now = timezone.now()
+        tomorrow_at_ten = timezone.make_aware(
+            datetime.combine(today + timedelta(days=1), datetime.min.time())
+        ) + timedelta(hours=10)
+
+        # One client per 50 rows
+        clients = [
+            Client(
+                first_name='Bench',
+                last_name=f'Client {i}',
+                email=f'bench-{i}@example.com',
+                phone='555-0100',
+                referral_code=f'BENCH{i:09d}'
+            )
+            for i in range(len(self.clients), end // 50 + 1)
+        ]
+        self.clients += Client.objects.bulk_create(clients, batch_size=BATCH_SIZE)
+
+        appointments, purchases, emails = [], [], []
+        for i in range(start, end):
+            client = self.clients[i // 50]
+            live = i % LIVE_EVERY == 0
+
+            appointment = Appointment(
+                client=client,
+                service=self.service,
+                start_at=tomorrow_at_ten if live else tomorrow_at_ten - timedelta(days=1 + i % 1000),
+                duration_minutes=30,
+                status='SCHEDULED' if live else 'COMPLETED',
+                reminder_sent=not live,
+                service_price=Decimal('50.00'),
+                final_price=Decimal('50.00')
+            )
+            appointment.sync_schedule()
+            appointments.append(appointment)
+
+            purchases.append(PackagePurchase(
+                client=client,
+                package=self.package,
+                expiry_date=today + timedelta(days=7) if live else today - timedelta(days=1 + i % 1000),
+                status='ACTIVE' if live else 'EXPIRED',
+                original_price=Decimal('500.00'),
+                final_price=Decimal('500.00'),
+                total_sessions=10,
+                sessions_remaining=10
+            ))
+
+            emails.append(ScheduledEmail(
+                client=client,
+                email_type='CUSTOM',
+                template=self.template,
+                scheduled_for=now - timedelta(minutes=5) if live else now - timedelta(days=1 + i % 1000),
+                status='PENDING' if live else 'SENT',
+                subject='Benchmark'
+            ))
+
+            if len(appointments) >= BATCH_SIZE:
+                self.flush(appointments, purchases, emails)
+                appointments, purchases, emails = [], [], []
+
+        self.flush(appointments, purchases, emails)
+
+    def flush(self, appointments, purchases, emails):
+        Appointment.objects.bulk_create(appointments)
+        PackagePurchase.objects.bulk_create(purchases)
+        ScheduledEmail.objects.bulk_create(emails)
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='scheduledemail',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['scheduled_for', 'id'], name='scheduled_email_pending_idx'),
+        ),
+    ]
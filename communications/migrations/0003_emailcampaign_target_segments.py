@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:00
+
+from django.db import migrations
+import multiselectfield.db.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0002_scheduledemail_scheduled_email_pending_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailcampaign',
+            name='target_segments',
+            field=multiselectfield.db.fields.MultiSelectField(blank=True, choices=[('CHAMPIONS', 'Champions'), ('LOYAL', 'Loyal'), ('POTENTIAL', 'Potential Loyalists'), ('NEW', 'New Customers'), ('PROMISING', 'Promising'), ('NEED_ATTENTION', 'Need Attention'), ('ABOUT_TO_SLEEP', 'About to Sleep'), ('AT_RISK', 'At Risk'), ('CANT_LOSE', "Can't Lose"), ('HIBERNATING', 'Hibernating'), ('LOST', 'Lost'), ('PROSPECT', 'Prospect (no visits yet)')], help_text="Only send to clients in these RFM segments (combine with 'Send to all' to reach a whole segment)", max_length=200),
+        ),
+    ]
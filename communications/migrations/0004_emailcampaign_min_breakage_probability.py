@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0003_emailcampaign_target_segments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailcampaign',
+            name='min_breakage_probability',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Only send to clients with an active package at least this likely (0-1) to expire with sessions unused', max_digits=3, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0004_emailcampaign_min_breakage_probability'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('processed_until', models.DateField(help_text='Exclusive end of the last processed date window')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Job Watermark',
+                'verbose_name_plural': 'Job Watermarks',
+            },
+        ),
+    ]
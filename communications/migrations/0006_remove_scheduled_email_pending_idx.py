@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:44
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('communications', '0005_jobwatermark'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='scheduledemail',
+            name='scheduled_email_pending_idx',
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.core.validators import EmailValidator
 from django.utils import timezone
+from multiselectfield import MultiSelectField
+from clients.models import ClientSegment
 
 
 class EmailTemplate(models.Model):
@@ -108,6 +110,19 @@ class EmailCampaign(models.Model):
         default=True,
         help_text="Only send to active clients"
     )
+    target_segments = MultiSelectField(
+        choices=ClientSegment.SEGMENT_CHOICES,
+        max_length=200,
+        blank=True,
+        help_text="Only send to clients in these RFM segments (combine with 'Send to all' to reach a whole segment)"
+    )
+    min_breakage_probability = models.DecimalField(
+        max_digits=3,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        help_text="Only send to clients with an active package at least this likely (0-1) to expire with sessions unused"
+    )
     
     # Scheduling
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='DRAFT')
@@ -151,7 +166,19 @@ class EmailCampaign(models.Model):
         if self.only_marketing_subscribers:
             recipients = recipients.filter(marketing_emails=True)
         
-        return recipients
+        if self.target_segments:
+            recipients = recipients.filter(segment__segment__in=list(self.target_segments))
+        
+        if self.min_breakage_probability is not None:
+            from packages.models import PackagePurchase
+            recipients = recipients.filter(models.Exists(PackagePurchase.objects.filter(
+                client=models.OuterRef('pk'),
+                status='ACTIVE',
+                breakage_forecast__probability__gte=self.min_breakage_probability
+            )))
+        
+        # Sending reads only the contact columns
+        return recipients.only('first_name', 'last_name', 'email')
 
 
 class ScheduledEmail(models.Model):
@@ -199,7 +226,9 @@ class ScheduledEmail(models.Model):
         on_delete=models.CASCADE,
         null=True,
         blank=True,
-        related_name='scheduled_emails'
+        related_name='scheduled_emails',
+        # The table may be partitioned, which leaves nothing to reference (appointments.partitioning)
+        db_constraint=False
     )
     package_purchase = models.ForeignKey(
         'packages.PackagePurchase',
@@ -222,6 +251,7 @@ class ScheduledEmail(models.Model):
         verbose_name = 'Scheduled Email'
         verbose_name_plural = 'Scheduled Emails'
         indexes = [
+            # Due pending emails for process_scheduled_emails
             models.Index(fields=['status', 'scheduled_for']),
             models.Index(fields=['email_type', 'status']),
         ]
@@ -259,6 +289,21 @@ class ScheduledEmail(models.Model):
             return False
 
 
+class JobWatermark(models.Model):
+    """How far a catch-up job has got, so a missed run is made up by the next one"""
+    
+    name = models.CharField(max_length=100, unique=True)
+    processed_until = models.DateField(help_text="Exclusive end of the last processed date window")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Job Watermark'
+        verbose_name_plural = 'Job Watermarks'
+    
+    def __str__(self):
+        return f"{self.name} until {self.processed_until}"
+
+
 class EmailLog(models.Model):
     """Log all emails sent"""
     
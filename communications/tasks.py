@@ -1,8 +1,55 @@
 from celery import shared_task
+from django.db import models, transaction
 from django.utils import timezone
 from datetime import timedelta
 
 
+# Packages are first warned this many days before they expire
+EXPIRY_WARNING_DAYS = 7
+
+EXPIRY_WARNING_BATCH_SIZE = 500
+
+
+def get_reminder_queryset(day):
+    """Appointment ids due a reminder on a local calendar day"""
+    from appointments.models import Appointment
+    
+    # Served by the partial appt_reminder_due_idx index
+    return Appointment.objects.on_local_date(day).reminder_due().filter(
+        client__email_notifications=True
+    ).values_list('id', flat=True)
+
+
+def get_expiring_packages_queryset(start, end):
+    """Active package purchases expiring in [start, end) that have not been warned yet"""
+    from packages.models import PackagePurchase
+    from .models import ScheduledEmail
+    
+    # Served by purchase_status_expiry_idx, whose (status, expiry_date, id) order is the job's
+    return PackagePurchase.objects.filter(
+        status='ACTIVE',
+        expiry_date__gte=start,
+        expiry_date__lt=end,
+        client__email_notifications=True
+    ).exclude(
+        models.Exists(ScheduledEmail.objects.filter(
+            package_purchase=models.OuterRef('pk'),
+            email_type='PACKAGE_EXPIRY'
+        ).exclude(status='CANCELLED'))
+    ).select_related('client', 'package').order_by('expiry_date', 'id')
+
+
+def get_pending_emails_queryset(now):
+    """Pending scheduled emails that are due"""
+    from .models import ScheduledEmail
+    
+    # Served by the (status, scheduled_for) index
+    return ScheduledEmail.objects.filter(
+        status='PENDING',
+        scheduled_for__lte=now
+    ).select_related('client')
+
+
 @shared_task
 def send_appointment_reminder(appointment_id):
     """Send appointment reminder email"""
@@ -64,21 +111,11 @@ def send_appointment_reminder(appointment_id):
 @shared_task
 def send_daily_reminders():
     """Send reminders for appointments in the next 24 hours"""
-    from appointments.models import Appointment
-    from datetime import datetime
-    
-    tomorrow = timezone.now().date() + timedelta(days=1)
-    
-    appointments = Appointment.objects.filter(
-        appointment_date=tomorrow,
-        status__in=['SCHEDULED', 'CONFIRMED'],
-        reminder_sent=False,
-        client__email_notifications=True
-    )
+    tomorrow = timezone.localdate() + timedelta(days=1)
     
     count = 0
-    for appointment in appointments:
-        send_appointment_reminder.delay(appointment.id)
+    for appointment_id in get_reminder_queryset(tomorrow):
+        send_appointment_reminder.delay(appointment_id)
         count += 1
     
     return f"Queued {count} appointment reminders"
@@ -86,18 +123,13 @@ def send_daily_reminders():
 
 @shared_task
 def send_package_expiry_warnings():
-    """Send warnings for packages expiring soon"""
-    from packages.models import PackagePurchase
-    from .models import EmailTemplate, ScheduledEmail
-    
-    # Get packages expiring in 7 days
-    warning_date = timezone.now().date() + timedelta(days=7)
-    
-    expiring_packages = PackagePurchase.objects.filter(
-        expiry_date=warning_date,
-        status='ACTIVE',
-        client__email_notifications=True
-    )
+    """
+    Warn about packages expiring within the next week. Expiry dates are
+    scanned from where the last successful run stopped, so days missed by
+    an outage are caught up on the next run; purchases already warned are
+    skipped.
+    """
+    from .models import EmailTemplate, JobWatermark, ScheduledEmail
     
     template = EmailTemplate.objects.filter(
         template_type='PACKAGE_EXPIRY',
@@ -107,30 +139,61 @@ def send_package_expiry_warnings():
     if not template:
         return "No active package expiry template found"
     
+    today = timezone.localdate()
+    end = today + timedelta(days=EXPIRY_WARNING_DAYS + 1)
+    watermark = JobWatermark.objects.filter(name='package_expiry_warnings').values_list(
+        'processed_until', flat=True
+    ).first()
+    # The first run covers just the day a week out; purchases already expired need no warning
+    start = max(watermark or end - timedelta(days=1), today)
+    if start >= end:
+        return f"Package expiry warnings already created up to {end - timedelta(days=1)}"
+    
+    expiring_packages = get_expiring_packages_queryset(start, end)
     count = 0
-    for package_purchase in expiring_packages:
-        context = {
-            'client_name': package_purchase.client.get_full_name(),
-            'package_name': package_purchase.package.name,
-            'expiry_date': package_purchase.expiry_date,
-            'sessions_remaining': package_purchase.sessions_remaining,
-        }
+    last = None
+    while True:
+        batch = expiring_packages
+        if last:
+            batch = batch.filter(
+                models.Q(expiry_date__gt=last[0]) | models.Q(expiry_date=last[0], id__gt=last[1])
+            )
+        batch = list(batch[:EXPIRY_WARNING_BATCH_SIZE])
+        if not batch:
+            break
         
-        rendered = template.render(context)
-        
-        ScheduledEmail.objects.create(
-            client=package_purchase.client,
-            email_type='PACKAGE_EXPIRY',
-            template=template,
-            scheduled_for=timezone.now(),
-            subject=rendered['subject'],
-            rendered_html=rendered['html'],
-            rendered_text=rendered['text'],
-            package_purchase=package_purchase
-        )
-        count += 1
+        emails = []
+        for package_purchase in batch:
+            context = {
+                'client_name': package_purchase.client.get_full_name(),
+                'package_name': package_purchase.package.name,
+                'expiry_date': package_purchase.expiry_date,
+                'sessions_remaining': package_purchase.sessions_remaining,
+            }
+            
+            rendered = template.render(context)
+            
+            emails.append(ScheduledEmail(
+                client=package_purchase.client,
+                email_type='PACKAGE_EXPIRY',
+                template=template,
+                scheduled_for=timezone.now(),
+                subject=rendered['subject'],
+                rendered_html=rendered['html'],
+                rendered_text=rendered['text'],
+                package_purchase=package_purchase
+            ))
+        with transaction.atomic():
+            ScheduledEmail.objects.bulk_create(emails)
+        count += len(emails)
+        last = (batch[-1].expiry_date, batch[-1].id)
     
-    return f"Created {count} package expiry warnings"
+    # Only a run that got through the whole window moves the watermark
+    JobWatermark.objects.update_or_create(
+        name='package_expiry_warnings', defaults={'processed_until': end}
+    )
+    
+    return f"Created {count} package expiry warnings for expiries from {start} to {end - timedelta(days=1)}"
 
 
 @shared_task
@@ -146,7 +209,7 @@ def send_birthday_greetings():
         date_of_birth__day=today.day,
         is_active=True,
         marketing_emails=True
-    )
+    ).only('first_name', 'last_name', 'email', 'date_of_birth')
     
     template = EmailTemplate.objects.filter(
         template_type='BIRTHDAY',
@@ -260,12 +323,7 @@ def send_email_campaign(campaign_id):
 @shared_task
 def process_scheduled_emails():
     """Process and send scheduled emails"""
-    from .models import ScheduledEmail
-    
-    pending_emails = ScheduledEmail.objects.filter(
-        status='PENDING',
-        scheduled_for__lte=timezone.now()
-    )
+    pending_emails = get_pending_emails_queryset(timezone.now())
     
     sent_count = 0
     failed_count = 0
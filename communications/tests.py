@@ -0,0 +1,96 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from clients.models import Client
+from packages.models import Package, PackagePurchase
+
+from .models import EmailTemplate, JobWatermark, ScheduledEmail
+from .tasks import send_package_expiry_warnings
+
+
+class ExpiryWarningTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.template = EmailTemplate.objects.create(
+            name='Expiry', template_type='PACKAGE_EXPIRY', subject='Your package expires soon',
+            html_content='<p>{{ package_name }} expires on {{ expiry_date }}</p>'
+        )
+        cls.package = Package.objects.create(
+            name='Ten Pack', category='CUSTOM', description='Ten sessions', total_sessions=10,
+            price=Decimal('400.00')
+        )
+        cls.client_record = Client.objects.create(
+            first_name='Ann', last_name='Smith', email='ann@example.com', phone='555-0100'
+        )
+
+    def make_purchase(self, expires_in):
+        return PackagePurchase.objects.create(
+            client=self.client_record, package=self.package,
+            expiry_date=timezone.localdate() + timedelta(days=expires_in),
+            original_price=Decimal('400.00'), final_price=Decimal('400.00'),
+            total_sessions=10, sessions_remaining=10,
+        )
+
+    def set_watermark(self, days_from_today):
+        JobWatermark.objects.create(
+            name='package_expiry_warnings', processed_until=timezone.localdate() + timedelta(days=days_from_today)
+        )
+
+    def watermark(self):
+        days = JobWatermark.objects.get(name='package_expiry_warnings').processed_until - timezone.localdate()
+        return days.days
+
+    def warned(self):
+        return sorted(ScheduledEmail.objects.filter(email_type='PACKAGE_EXPIRY').values_list(
+            'package_purchase_id', flat=True
+        ))
+
+    def test_first_run_warns_a_week_out(self):
+        self.make_purchase(3)
+        week_out = self.make_purchase(7)
+
+        send_package_expiry_warnings()
+
+        self.assertEqual(self.warned(), [week_out.pk])
+        self.assertEqual(self.watermark(), 8)
+
+    def test_missed_day_is_caught_up_without_warning_twice(self):
+        # The last run was two days ago, so expiries six days out were never scanned
+        self.set_watermark(6)
+        missed = self.make_purchase(6)
+        due = self.make_purchase(7)
+        already_warned = self.make_purchase(7)
+        ScheduledEmail.objects.create(
+            client=self.client_record, email_type='PACKAGE_EXPIRY', template=self.template,
+            scheduled_for=timezone.now(), subject='Earlier warning', package_purchase=already_warned
+        )
+
+        send_package_expiry_warnings()
+
+        self.assertEqual(self.warned(), sorted([missed.pk, due.pk, already_warned.pk]))
+        self.assertEqual(ScheduledEmail.objects.filter(package_purchase=already_warned).count(), 1)
+        self.assertEqual(self.watermark(), 8)
+
+        result = send_package_expiry_warnings()
+        self.assertTrue(result.startswith('Package expiry warnings already created'))
+        self.assertEqual(ScheduledEmail.objects.count(), 3)
+
+    def test_watermark_only_advances_when_the_run_completes(self):
+        self.set_watermark(6)
+        missed = self.make_purchase(6)
+        due = self.make_purchase(7)
+
+        with mock.patch.object(EmailTemplate, 'render', side_effect=RuntimeError('Broken template')):
+            with self.assertRaises(RuntimeError):
+                send_package_expiry_warnings()
+        self.assertEqual(self.watermark(), 6)
+        self.assertEqual(self.warned(), [])
+
+        send_package_expiry_warnings()
+        self.assertEqual(self.warned(), sorted([missed.pk, due.pk]))
+        self.assertEqual(self.watermark(), 8)
@@ -21,6 +21,18 @@ app.conf.beat_schedule = {
         'task': 'communications.tasks.send_daily_reminders',
         'schedule': crontab(hour=9, minute=0),  # Every day at 9 AM
     },
+    'sweep-package-statuses': {
+        'task': 'packages.tasks.sweep_package_statuses',
+        'schedule': crontab(hour=0, minute=15),  # Every day at 12:15 AM, before any expiry job
+    },
+    'rollup-revenue': {
+        'task': 'packages.tasks.rollup_revenue',
+        'schedule': crontab(hour=0, minute=45),  # Every day at 12:45 AM, after the status sweep
+    },
+    'forecast-breakage': {
+        'task': 'packages.tasks.forecast_breakage',
+        'schedule': crontab(hour=1, minute=0),  # Every day at 1 AM, after the status sweep
+    },
     'send-package-expiry-warnings': {
         'task': 'communications.tasks.send_package_expiry_warnings',
         'schedule': crontab(hour=10, minute=0),  # Every day at 10 AM
@@ -33,6 +45,18 @@ app.conf.beat_schedule = {
         'task': 'communications.tasks.process_scheduled_emails',
         'schedule': crontab(minute='*/15'),  # Every 15 minutes
     },
+    'ensure-appointment-partitions': {
+        'task': 'appointments.tasks.ensure_appointment_partitions',
+        'schedule': crontab(hour=3, minute=0),  # Every day at 3 AM
+    },
+    'reconcile-client-stats': {
+        'task': 'clients.tasks.reconcile_client_stats',
+        'schedule': crontab(hour=2, minute=0),  # Every day at 2 AM
+    },
+    'segment-clients': {
+        'task': 'clients.tasks.segment_clients',
+        'schedule': crontab(hour=2, minute=30),  # Every day at 2:30 AM, after stats reconciliation
+    },
 }
 
 
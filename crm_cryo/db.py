@@ -0,0 +1,44 @@
+"""Database helpers shared across apps"""
+import json
+
+from django.db import connections, router
+
+
+def is_postgresql(using='default'):
+    return connections[using].vendor == 'postgresql'
+
+
+def estimated_table_rows(model, using=None):
+    """
+    Row estimate for a model's table from planner statistics.
+    Returns None when the backend keeps no statistics (e.g. SQLite).
+    """
+    using = using or router.db_for_read(model)
+    if not is_postgresql(using):
+        return None
+
+    with connections[using].cursor() as cursor:
+        # Partitioned parents carry no tuples of their own, so sum the leaves
+        cursor.execute(
+            """
+            SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)::bigint
+            FROM pg_class c
+            WHERE c.oid = %s::regclass
+               OR c.oid IN (SELECT relid FROM pg_partition_tree(%s::regclass) WHERE isleaf)
+            """,
+            [model._meta.db_table, model._meta.db_table]
+        )
+        return cursor.fetchone()[0]
+
+
+def estimated_queryset_rows(queryset):
+    """
+    Row estimate for a filtered queryset from the planner's EXPLAIN output.
+    Returns None when the backend cannot provide one.
+    """
+    if not is_postgresql(queryset.db):
+        return None
+
+    plan = json.loads(queryset.explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
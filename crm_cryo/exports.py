@@ -0,0 +1,131 @@
+"""Streaming CSV / JSON Lines exports shared by the admin and the export_data command"""
+import csv
+import gzip
+
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+
+CHUNK_SIZE = 2000
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+# Dataset name -> (model label, default columns). Related columns use the ORM's __ paths.
+DATASETS = {
+    'clients': ('clients.Client', [
+        'id', 'first_name', 'last_name', 'email', 'phone', 'phone_e164',
+        'date_of_birth', 'profile__city', 'profile__state', 'profile__country', 'is_active',
+        'registration_date', 'last_visit_date', 'referral_code',
+        'referred_by__referral_code', 'email_notifications',
+        'marketing_emails', 'sms_notifications', 'created_at',
+    ]),
+    'appointments': ('appointments.Appointment', [
+        'id', 'client_id', 'client__email', 'service__name', 'package_purchase_id',
+        'start_at', 'end_at', 'duration_minutes', 'status', 'service_price',
+        'discount_amount', 'final_price', 'rating', 'reminder_sent',
+        'created_at', 'completed_at',
+    ]),
+    'purchases': ('packages.PackagePurchase', [
+        'id', 'client_id', 'client__email', 'package__name', 'purchase_date',
+        'expiry_date', 'status', 'original_price', 'discount_applied',
+        'final_price', 'total_sessions', 'sessions_used', 'sessions_remaining',
+        'created_at',
+    ]),
+    'revenue_days': ('packages.RevenueDay', [
+        'date', 'booked', 'recognized', 'breakage', 'deferred_balance',
+    ]),
+    'email_logs': ('communications.EmailLog', [
+        'id', 'client_id', 'sent_to', 'subject', 'email_type', 'campaign_id',
+        'scheduled_email_id', 'sent_successfully', 'error_message', 'sent_at',
+        'opened_at', 'clicked_at',
+    ]),
+}
+
+
+def get_dataset(name):
+    """Return (model, default columns) for a dataset name"""
+    label, columns = DATASETS[name]
+    return apps.get_model(label), columns
+
+
+def dataset_for_model(model):
+    label = model._meta.label
+    for name, (dataset_label, _) in DATASETS.items():
+        if dataset_label == label:
+            return name
+    raise KeyError(label)
+
+
+class _Echo:
+    """File-like object handing each written CSV line straight back"""
+
+    def write(self, value):
+        return value
+
+
+def iter_export(queryset, columns, format='csv', chunk_size=CHUNK_SIZE):
+    """
+    Yield the export as text lines. Only `columns` are selected and rows
+    are fetched `chunk_size` at a time, so memory stays flat however many
+    rows the queryset holds.
+    """
+    rows = queryset.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size)
+    if format == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow(row)
+    elif format == 'jsonl':
+        encoder = DjangoJSONEncoder()
+        for row in rows:
+            yield encoder.encode(dict(zip(columns, row))) + '\n'
+    else:
+        raise ValueError(f"Unknown export format: {format}")
+
+
+def export_filename(name, format, compress=False):
+    return f"{name}-{timezone.localdate():%Y%m%d}.{format}" + ('.gz' if compress else '')
+
+
+def export_response(queryset, columns, format, filename):
+    """Stream an export to the browser as a download"""
+    response = StreamingHttpResponse(
+        iter_export(queryset, columns, format),
+        content_type=FORMATS[format]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def write_export(queryset, columns, path, format='csv', compress=None, chunk_size=CHUNK_SIZE):
+    """Write an export to `path`, gzip-compressed when asked or when it ends in .gz. Returns the row count."""
+    if compress is None:
+        compress = str(path).endswith('.gz')
+    opener = gzip.open if compress else open
+    count = 0
+    with opener(path, 'wt', encoding='utf-8', newline='') as output:
+        for line in iter_export(queryset, columns, format, chunk_size):
+            output.write(line)
+            count += 1
+    # The CSV header is not a row
+    return count - 1 if format == 'csv' else count
+
+
+def _export_action(format):
+    def action(modeladmin, request, queryset):
+        name = dataset_for_model(queryset.model)
+        _, columns = get_dataset(name)
+        return export_response(queryset, columns, format, export_filename(name, format))
+    action.__name__ = f'export_{format}'
+    action.short_description = f"Export selected to {format.upper()}"
+    return action
+
+
+# Admin actions for the exportable models
+export_csv = _export_action('csv')
+export_jsonl = _export_action('jsonl')
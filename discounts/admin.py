@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Discount, DiscountUsage, Referral
+from .models import Discount, DiscountClientUsage, DiscountUsage, Referral
 
 
 @admin.register(Discount)
@@ -117,6 +117,21 @@ class DiscountUsageAdmin(admin.ModelAdmin):
         return False
 
 
+@admin.register(DiscountClientUsage)
+class DiscountClientUsageAdmin(admin.ModelAdmin):
+    list_display = ['client', 'discount', 'uses']
+    list_filter = ['discount']
+    search_fields = ['client__first_name', 'client__last_name', 'discount__code']
+    list_select_related = ['client', 'discount']
+    
+    def has_add_permission(self, request):
+        # Counts are kept current from discount usages
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Referral)
 class ReferralAdmin(admin.ModelAdmin):
     list_display = [
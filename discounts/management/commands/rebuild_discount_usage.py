@@ -0,0 +1,34 @@
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from discounts.models import Discount, DiscountClientUsage, DiscountUsage
+from discounts.validation import CLIENT_USAGE_CACHE_KEY
+
+
+class Command(BaseCommand):
+    help = 'Recount total and per-client discount usage from the recorded discount usages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        self.stdout.write('Recounting discount usage...')
+        started = time.perf_counter()
+        client_ids = self.counted_clients()
+        counters = DiscountClientUsage.objects.rebuild(batch_size=options['batch_size'])
+        usages = DiscountUsage.objects.filter(discount=OuterRef('pk')).order_by().values('discount')
+        Discount.objects.update(current_uses=Coalesce(
+            Subquery(usages.annotate(count=Count('pk')).values('count')), 0
+        ))
+        # Caches can't be cleared by key prefix on every backend; drop each counted client's entry
+        cache.delete_many([
+            f'{CLIENT_USAGE_CACHE_KEY}:{client_id}' for client_id in client_ids | self.counted_clients()
+        ])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'✓ Wrote {counters} usage counters in {elapsed:.1f}s'))
+
+    def counted_clients(self):
+        return set(DiscountClientUsage.objects.values_list('client_id', flat=True).distinct())
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BATCH_SIZE = 2000
+
+
+def count_usage(apps, schema_editor):
+    """Start every counter at the number of usage rows already recorded"""
+    DiscountUsage = apps.get_model('discounts', 'DiscountUsage')
+    DiscountClientUsage = apps.get_model('discounts', 'DiscountClientUsage')
+    
+    counts = DiscountUsage.objects.order_by().values('discount_id', 'client_id').annotate(uses=models.Count('pk'))
+    DiscountClientUsage.objects.bulk_create(
+        (DiscountClientUsage(**row) for row in counts.iterator(chunk_size=BATCH_SIZE)),
+        batch_size=BATCH_SIZE
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0007_referralclosure'),
+        ('discounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiscountClientUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uses', models.PositiveIntegerField(default=0)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='discount_usage_counts', to='clients.client')),
+                ('discount', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='client_usage_counts', to='discounts.discount')),
+            ],
+            options={
+                'verbose_name': 'Discount Client Usage',
+                'verbose_name_plural': 'Discount Client Usage',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='discountclientusage',
+            constraint=models.UniqueConstraint(fields=('client', 'discount'), name='discount_client_usage_unique'),
+        ),
+        migrations.RunPython(count_usage, migrations.RunPython.noop),
+    ]
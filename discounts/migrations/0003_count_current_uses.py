@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+def count_current_uses(apps, schema_editor):
+    """Nothing maintained current_uses before; start it at the recorded usages"""
+    Discount = apps.get_model('discounts', 'Discount')
+    DiscountUsage = apps.get_model('discounts', 'DiscountUsage')
+    
+    usages = DiscountUsage.objects.filter(discount=models.OuterRef('pk')).order_by().values('discount')
+    Discount.objects.update(current_uses=models.functions.Coalesce(
+        models.Subquery(usages.annotate(count=models.Count('pk')).values('count')), 0
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discounts', '0002_discount_client_usage'),
+    ]
+
+    operations = [
+        migrations.RunPython(count_current_uses, migrations.RunPython.noop),
+    ]
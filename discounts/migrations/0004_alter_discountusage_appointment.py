@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0006_alter_appointmenthistory_appointment'),
+        ('discounts', '0003_count_current_uses'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='discountusage',
+            name='appointment',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='discount_usages', to='appointments.appointment'),
+        ),
+    ]
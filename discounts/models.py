@@ -112,6 +112,15 @@ class Discount(models.Model):
     def __str__(self):
         return f"{self.name} ({self.code})"
     
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # current_uses only moves through conditional UPDATEs; a stale copy must not overwrite it
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'current_uses'
+            ]
+        super().save(*args, **kwargs)
+    
     def is_valid(self):
         """Check if discount is currently valid"""
         now = timezone.now().date()
@@ -140,16 +149,13 @@ class Discount(models.Model):
     
     def can_client_use(self, client):
         """Check if a specific client can use this discount"""
+        from .validation import client_usage
+        
         if not self.is_valid():
             return False
         
-        # Check client usage
-        client_usage = DiscountUsage.objects.filter(
-            discount=self,
-            client=client
-        ).count()
-        
-        return client_usage < self.max_uses_per_client
+        # Usage counts come from the per-client counter table, usually cached
+        return client_usage(client.pk).get(self.pk, 0) < self.max_uses_per_client
 
 
 class DiscountUsage(models.Model):
@@ -179,7 +185,9 @@ class DiscountUsage(models.Model):
         on_delete=models.CASCADE,
         null=True,
         blank=True,
-        related_name='discount_usages'
+        related_name='discount_usages',
+        # The table may be partitioned, which leaves nothing to reference (appointments.partitioning)
+        db_constraint=False
     )
     
     # Discount details
@@ -210,6 +218,71 @@ class DiscountUsage(models.Model):
         return f"{self.client.get_full_name()} - {self.discount.code}"
 
 
+class DiscountClientUsageManager(models.Manager):
+    
+    def record(self, discount_id, client_id, delta):
+        """Move one client's usage count of a discount by `delta`, creating the row if needed"""
+        if delta > 0:
+            self.bulk_create(
+                [DiscountClientUsage(discount_id=discount_id, client_id=client_id, uses=0)],
+                ignore_conflicts=True
+            )
+        counters = self.filter(discount_id=discount_id, client_id=client_id)
+        if delta < 0:
+            # A counter already out of step is left for rebuild() rather than taken negative
+            counters = counters.filter(uses__gte=-delta)
+        counters.update(uses=models.F('uses') + delta)
+    
+    def rebuild(self, client_ids=None, batch_size=2000):
+        """
+        Recount usage rows, for some clients or everyone. Returns the number
+        of counter rows written.
+        """
+        from django.db import transaction
+        
+        usages = DiscountUsage.objects.all()
+        counters = self.all()
+        if client_ids is not None:
+            usages = usages.filter(client_id__in=client_ids)
+            counters = counters.filter(client_id__in=client_ids)
+        counts = usages.order_by().values('discount_id', 'client_id').annotate(uses=models.Count('pk'))
+        with transaction.atomic():
+            counters.delete()
+            created = self.bulk_create(
+                (DiscountClientUsage(**row) for row in counts.iterator(chunk_size=batch_size)),
+                batch_size=batch_size
+            )
+        return len(created)
+
+
+class DiscountClientUsage(models.Model):
+    """How many times each client has used each discount, kept current from DiscountUsage"""
+    
+    discount = models.ForeignKey(
+        Discount,
+        on_delete=models.CASCADE,
+        related_name='client_usage_counts'
+    )
+    client = models.ForeignKey(
+        'clients.Client',
+        on_delete=models.CASCADE,
+        related_name='discount_usage_counts'
+    )
+    uses = models.PositiveIntegerField(default=0)
+    
+    objects = DiscountClientUsageManager()
+    
+    class Meta:
+        verbose_name = 'Discount Client Usage'
+        verbose_name_plural = 'Discount Client Usage'
+        constraints = [
+            models.UniqueConstraint(fields=['client', 'discount'], name='discount_client_usage_unique'),
+        ]
+    
+    def __str__(self):
+        return f"{self.client_id} used {self.discount_id} {self.uses}x"
+
+
 class Referral(models.Model):
     """Track referral program"""
     
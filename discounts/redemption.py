@@ -0,0 +1,88 @@
+"""Atomic redemption of discounts"""
+from dataclasses import dataclass
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import Discount, DiscountClientUsage, DiscountUsage
+from .validation import invalidate_client_usage
+
+
+@dataclass
+class DiscountRedemption:
+    redeemed: bool
+    reason: str = ''
+    usage: DiscountUsage = None
+
+    def __bool__(self):
+        return self.redeemed
+
+
+def redeem_discount(discount, client, original_price, package_purchase=None, appointment=None):
+    """
+    Apply `discount` for `client` to a purchase of `original_price` and
+    record the DiscountUsage. The total and per-client counters are moved by
+    conditional UPDATEs in the same transaction as the usage row, so
+    concurrent checkouts can never redeem a discount more often than its
+    limits allow. Returns a DiscountRedemption, falsy on failure.
+    """
+    today = timezone.localdate()
+    with transaction.atomic():
+        claimed = Discount.objects.filter(
+            models.Q(end_date__isnull=True) | models.Q(end_date__gte=today),
+            models.Q(max_uses_total__isnull=True) | models.Q(max_uses_total=0) |
+            models.Q(current_uses__lt=models.F('max_uses_total')),
+            pk=discount.pk,
+            is_active=True,
+            start_date__lte=today,
+        ).update(current_uses=models.F('current_uses') + 1, updated_at=timezone.now())
+        # The discount row stays locked until commit, so this is the state just claimed
+        locked = Discount.objects.filter(pk=discount.pk).first()
+        if not claimed:
+            return DiscountRedemption(False, _failure_reason(locked, today))
+        if locked.minimum_purchase_amount and original_price < locked.minimum_purchase_amount:
+            transaction.set_rollback(True)
+            return DiscountRedemption(
+                False, f"A purchase of at least {locked.minimum_purchase_amount} is required."
+            )
+
+        DiscountClientUsage.objects.bulk_create(
+            [DiscountClientUsage(discount_id=discount.pk, client_id=client.pk, uses=0)],
+            ignore_conflicts=True
+        )
+        counted = DiscountClientUsage.objects.filter(
+            discount_id=discount.pk, client_id=client.pk, uses__lt=locked.max_uses_per_client
+        ).update(uses=models.F('uses') + 1)
+        if not counted:
+            # Release the claim on the total
+            transaction.set_rollback(True)
+            return DiscountRedemption(False, "The client has already used this discount the maximum number of times.")
+
+        amount = locked.calculate_discount_amount(original_price)
+        usage = DiscountUsage(
+            discount_id=discount.pk,
+            client=client,
+            package_purchase=package_purchase,
+            appointment=appointment,
+            discount_amount=amount,
+            original_price=original_price,
+            final_price=original_price - amount,
+        )
+        # The counters above already include this usage
+        usage._counted = True
+        usage.save()
+        invalidate_client_usage(client.pk)
+        discount.current_uses = locked.current_uses
+    return DiscountRedemption(True, usage=usage)
+
+
+def _failure_reason(discount, today):
+    if discount is None:
+        return "The discount no longer exists."
+    if not discount.is_active:
+        return "The discount is not active."
+    if today < discount.start_date:
+        return f"The discount is not valid until {discount.start_date}."
+    if discount.end_date and today > discount.end_date:
+        return f"The discount expired on {discount.end_date}."
+    return "The discount has been fully redeemed."
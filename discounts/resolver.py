@@ -0,0 +1,142 @@
+"""Best legal combination of discounts for a cart
+
+Candidates come from the discount index's item -> discount maps, so only
+discounts covering something in the cart are looked at. Each is worth its
+calculate_discount_amount() on the cart items it covers, spread over those
+items by price; stacked discounts add up, but no item is discounted below
+zero. Adding a discount to a stack can therefore never lower its value, so
+under the stacking rules (a discount that can't be combined is used alone)
+the only combinations worth comparing are each discount on its own and the
+stack of every combinable one, trimmed of members that add nothing.
+"""
+from dataclasses import dataclass, field
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.utils import timezone
+
+from .validation import client_usage, get_discount_index, validate_code
+
+
+CENT = Decimal('0.01')
+
+
+@dataclass
+class DiscountPlan:
+    subtotal: Decimal
+    discount_amount: Decimal = Decimal('0.00')
+    discounts: tuple = ()
+    # Each discount's own amount; in a stack these can add up to more than discount_amount
+    amounts: dict = field(default_factory=dict)
+
+    @property
+    def total(self):
+        return self.subtotal - self.discount_amount
+
+    @property
+    def codes(self):
+        return [discount.code for discount in self.discounts]
+
+
+def cart_items(package_ids=(), service_ids=()):
+    """(kind, id, price) for every cart line at catalog prices"""
+    from services.catalog import get_catalog
+
+    catalog = get_catalog()
+    items = []
+    for kind, item_ids, entries, price in [
+        ('PACKAGE', package_ids, catalog.packages, lambda package: package.price),
+        ('SERVICE', service_ids, catalog.services, lambda service: service.base_price),
+    ]:
+        for item_id in item_ids:
+            if item_id not in entries:
+                raise ValueError(f"Unknown {kind.lower()} {item_id}.")
+            items.append((kind, item_id, price(entries[item_id])))
+    return items
+
+
+def allocate(discount, items):
+    """
+    The discount's amount on the items it covers, split over them in
+    proportion to price as {item position: amount}.
+    """
+    covered = [
+        position for position, (kind, item_id, _) in enumerate(items) if discount.covers(kind, item_id)
+    ]
+    base = sum((items[position][2] for position in covered), Decimal('0.00'))
+    amount = discount.calculate_discount_amount(base).quantize(CENT, rounding=ROUND_HALF_UP)
+    if amount <= 0:
+        return {}
+    shares, remaining = {}, amount
+    for position in covered[:-1]:
+        share = (amount * items[position][2] / base).quantize(CENT, rounding=ROUND_HALF_UP)
+        shares[position] = share
+        remaining -= share
+    # Rounding leftovers go on the last item
+    shares[covered[-1]] = remaining
+    return shares
+
+
+def stack_value(allocations, items):
+    """What a set of discounts is worth together: per item, at most its price"""
+    per_item = {}
+    for shares in allocations:
+        for position, share in shares.items():
+            per_item[position] = per_item.get(position, Decimal('0.00')) + share
+    return sum((min(amount, items[position][2]) for position, amount in per_item.items()), Decimal('0.00'))
+
+
+def best_discounts(client_id=None, package_ids=(), service_ids=(), today=None):
+    """
+    The combination of currently valid discounts that takes the most off a
+    cart of packages and services (ids may repeat for several of one item),
+    honouring dates, per-client limits, minimum purchase amounts, what each
+    discount applies to and whether it can be combined. Returns a
+    DiscountPlan; ties go to fewer discounts. Total limits are only checked
+    when the plan's discounts are redeemed.
+    """
+    items = cart_items(package_ids, service_ids)
+    subtotal = sum((price for _, _, price in items), Decimal('0.00'))
+    plan = DiscountPlan(subtotal)
+    if not items:
+        return plan
+
+    index = get_discount_index()
+    today = today or timezone.localdate()
+    usage = client_usage(client_id) if client_id is not None else None
+    allocations = {}
+    for discount in index.applicable(set(package_ids), set(service_ids)).values():
+        if not validate_code(discount.code, client_id, subtotal, today=today, index=index, usage=usage):
+            continue
+        shares = allocate(discount, items)
+        if shares:
+            allocations[discount] = shares
+    if not allocations:
+        return plan
+
+    # Smallest first, so stack members that add nothing are dropped before bigger ones
+    ranked = sorted(allocations, key=lambda discount: (sum(allocations[discount].values()), discount.code))
+    options = [[discount] for discount in ranked]
+    stack = [discount for discount in ranked if discount.can_be_combined]
+    if len(stack) > 1:
+        per_item = {}
+        for discount in stack:
+            for position, share in allocations[discount].items():
+                per_item[position] = per_item.get(position, Decimal('0.00')) + share
+        for discount in list(stack):
+            shares = allocations[discount]
+            if all(per_item[position] - share >= items[position][2] for position, share in shares.items()):
+                # Everything it covers is already free without it
+                stack.remove(discount)
+                for position, share in shares.items():
+                    per_item[position] -= share
+        options.append(stack)
+
+    best = max(
+        options,
+        key=lambda option: (stack_value([allocations[discount] for discount in option], items), -len(option))
+    )
+    plan.discounts = tuple(best)
+    for discount in best:
+        plan.amounts[discount.code] = sum(allocations[discount].values())
+    plan.discount_amount = stack_value([allocations[discount] for discount in best], items)
+    return plan
@@ -0,0 +1,89 @@
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from clients.models import Client, ReferralClosure
+from .models import Discount, DiscountClientUsage, DiscountUsage, Referral
+from .validation import invalidate_client_usage, invalidate_discount_index
+
+
+# Any change to a discount or what it applies to makes every process recompile the index
+post_save.connect(invalidate_discount_index, sender=Discount, dispatch_uid='discount-index-save')
+post_delete.connect(invalidate_discount_index, sender=Discount, dispatch_uid='discount-index-delete')
+for through in [Discount.applicable_packages.through, Discount.applicable_services.through]:
+    m2m_changed.connect(invalidate_discount_index, sender=through, dispatch_uid=f'discount-index-{through._meta.label}')
+
+
+def _record_usage(discount_id, client_id, delta):
+    DiscountClientUsage.objects.record(discount_id, client_id, delta)
+    uses = Discount.objects.filter(pk=discount_id)
+    if delta < 0:
+        uses = uses.filter(current_uses__gte=-delta)
+    uses.update(current_uses=F('current_uses') + delta)
+    invalidate_client_usage(client_id)
+
+
+@receiver(pre_save, sender=DiscountUsage)
+def remember_usage_owner(sender, instance, **kwargs):
+    """Keep the stored discount and client so a reassigned usage moves its count"""
+    instance._usage_before = None
+    if instance.pk:
+        instance._usage_before = DiscountUsage.objects.filter(pk=instance.pk).values_list(
+            'discount_id', 'client_id'
+        ).first()
+
+
+@receiver(post_save, sender=DiscountUsage)
+def count_usage(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if getattr(instance, '_counted', False):
+        # Redemptions move the counters themselves, conditionally on the limits
+        instance._counted = False
+        return
+    current = (instance.discount_id, instance.client_id)
+    before = None if created else getattr(instance, '_usage_before', None)
+    if before == current:
+        return
+    if before:
+        _record_usage(*before, -1)
+    _record_usage(*current, 1)
+
+
+@receiver(post_delete, sender=DiscountUsage)
+def uncount_usage(sender, instance, **kwargs):
+    _record_usage(instance.discount_id, instance.client_id, -1)
+
+
+def _set_referrer(client, referrer_id):
+    # Saving referred_by moves the client in the referral closure (clients.signals)
+    client.referred_by_id = referrer_id
+    client.save(update_fields=['referred_by', 'updated_at'])
+
+
+@receiver(post_save, sender=Referral)
+def link_referred_client(sender, instance, created, raw=False, **kwargs):
+    """A recorded referral becomes the client's referrer unless they already have one"""
+    if raw or not created:
+        return
+    client = Client.objects.filter(pk=instance.referred_client_id, referred_by__isnull=True).first()
+    if client is None or client.pk == instance.referrer_id:
+        return
+    if ReferralClosure.objects.filter(ancestor_id=client.pk, descendant_id=instance.referrer_id).exists():
+        # The referrer was brought in by this client; linking them would close a loop
+        return
+    _set_referrer(client, instance.referrer_id)
+
+
+@receiver(post_delete, sender=Referral)
+def unlink_referred_client(sender, instance, origin=None, **kwargs):
+    """Fall back to the client's next recorded referrer, or none, when their referral is removed"""
+    if isinstance(origin, Client) or getattr(origin, 'model', None) is Client:
+        # Deleting either client cascades here; referred_by is already handled by the deletion
+        return
+    client = Client.objects.filter(pk=instance.referred_client_id, referred_by_id=instance.referrer_id).first()
+    if client is None:
+        return
+    referrer_id = Referral.objects.filter(referred_client_id=client.pk).order_by(
+        'referral_date', 'pk'
+    ).values_list('referrer_id', flat=True).first()
+    _set_referrer(client, referrer_id)
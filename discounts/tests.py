@@ -0,0 +1,292 @@
+import random
+import threading
+from collections import Counter
+from decimal import Decimal
+from itertools import combinations
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import TestCase, TransactionTestCase
+
+from clients.models import Client, ReferralClosure
+from packages.models import Package
+from services.models import Service, ServiceType
+
+from .models import Discount, DiscountClientUsage, DiscountUsage, Referral
+from .redemption import redeem_discount
+from .resolver import allocate, best_discounts, cart_items, stack_value
+from .validation import DISCOUNT_INDEX_VERSION_KEY, get_discount_index, validate_code
+
+
+def make_client(name):
+    return Client.objects.create(
+        first_name=name, last_name='Test', email=f'{name.lower()}@example.com', phone='555-0100'
+    )
+
+
+class DiscountTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.discount = Discount.objects.create(
+            name='Spring', code='SPRING', description='Spring promotion', discount_type='PERCENTAGE',
+            applies_to='ALL', percentage_off=Decimal('10.00'), max_uses_total=1, max_uses_per_client=1,
+        )
+        self.discount.refresh_from_db()
+
+
+class DiscountIndexTests(DiscountTestCase):
+
+    def test_usage_does_not_recompile_the_index(self):
+        version = cache.get(DISCOUNT_INDEX_VERSION_KEY, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(redeem_discount(self.discount, make_client('Ann'), Decimal('100.00')))
+        with self.captureOnCommitCallbacks(execute=True):
+            DiscountUsage.objects.create(
+                discount=self.discount, client=make_client('Bob'), discount_amount=Decimal('10.00'),
+                original_price=Decimal('100.00'), final_price=Decimal('90.00'),
+            )
+
+        self.assertEqual(cache.get(DISCOUNT_INDEX_VERSION_KEY, 0), version)
+
+    def test_total_limit_is_enforced_at_redemption(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(redeem_discount(self.discount, make_client('Ann'), Decimal('100.00')))
+        other = make_client('Bob')
+
+        self.assertTrue(validate_code('SPRING', other.pk))
+        redemption = redeem_discount(self.discount, other, Decimal('100.00'))
+        self.assertFalse(redemption)
+        self.assertEqual(redemption.reason, "The discount has been fully redeemed.")
+
+
+class ResolverTests(TestCase):
+    """best_discounts() against a search of every legal combination on small carts"""
+
+    @classmethod
+    def setUpTestData(cls):
+        service_type = ServiceType.objects.create(name='Cryotherapy', code='CRYO')
+        cls.services = [
+            Service.objects.create(
+                name=name, service_type=service_type, duration_minutes=30, base_price=Decimal(price)
+            )
+            for name, price in [('Whole Body', '50.00'), ('Localized', '80.00')]
+        ]
+        cls.packages = [
+            Package.objects.create(
+                name=name, category='CUSTOM', description=name, total_sessions=10, price=Decimal(price)
+            )
+            for name, price in [('Ten Pack', '400.00'), ('Five Pack', '250.00')]
+        ]
+        cls.client_record = make_client('Ann')
+
+        def discount(code, applies_to, combinable, percentage=None, fixed=None, **fields):
+            return Discount.objects.create(
+                name=code, code=code, description=code, applies_to=applies_to, can_be_combined=combinable,
+                discount_type='PERCENTAGE' if percentage else 'FIXED',
+                percentage_off=percentage and Decimal(percentage), fixed_amount_off=fixed and Decimal(fixed),
+                **fields
+            )
+
+        discount('TENOFF', 'ALL', True, percentage='10.00')
+        discount('BIGSALE', 'ALL', False, percentage='30.00')
+        discount('TENPACK', 'PACKAGE', True, fixed='50.00').applicable_packages.add(cls.packages[0])
+        discount('SERVICES', 'SERVICE', True, percentage='20.00', minimum_purchase_amount=Decimal('200.00'))
+        discount('WHOLEBODY', 'SERVICE', True, fixed='50.00').applicable_services.add(cls.services[0])
+        discount('LOCALIZED', 'SERVICE', False, fixed='30.00').applicable_services.add(cls.services[1])
+        used = discount('WELCOME', 'ALL', True, fixed='100.00', max_uses_per_client=1)
+        DiscountUsage.objects.create(
+            discount=used, client=cls.client_record, discount_amount=Decimal('100.00'),
+            original_price=Decimal('400.00'), final_price=Decimal('300.00'),
+        )
+
+    def setUp(self):
+        cache.clear()
+        # Every test compiles its own catalog and discount index
+        for target in ['services.catalog._catalog', 'discounts.validation._index']:
+            patcher = mock.patch(target, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def exhaustive_best(self, client_id, package_ids, service_ids):
+        """(value, fewest discounts) of the best legal combination, checking every subset"""
+        items = cart_items(package_ids, service_ids)
+        subtotal = sum(price for _, _, price in items)
+        index = get_discount_index()
+        used = dict(DiscountClientUsage.objects.filter(client_id=client_id).values_list('discount_id', 'uses'))
+        allocations = {}
+        for discount in Discount.objects.all():
+            if discount.minimum_purchase_amount and subtotal < discount.minimum_purchase_amount:
+                continue
+            if client_id is not None and used.get(discount.pk, 0) >= discount.max_uses_per_client:
+                continue
+            shares = allocate(index.by_code[discount.code], items)
+            if shares:
+                allocations[discount.code] = (discount.can_be_combined, shares)
+        best = (Decimal('0.00'), 0)
+        for size in range(1, len(allocations) + 1):
+            for codes in combinations(allocations, size):
+                if size > 1 and not all(allocations[code][0] for code in codes):
+                    continue
+                value = stack_value([allocations[code][1] for code in codes], items)
+                if (value, -size) > (best[0], -best[1]):
+                    best = (value, size)
+        return best
+
+    def assertBest(self, client_id, package_ids=(), service_ids=()):
+        plan = best_discounts(client_id, package_ids, service_ids)
+        value, size = self.exhaustive_best(client_id, package_ids, service_ids)
+        self.assertEqual(
+            (plan.discount_amount, len(plan.discounts)), (value, size), f"{package_ids} {service_ids}: {plan.codes}"
+        )
+        if len(plan.discounts) > 1:
+            self.assertTrue(all(discount.can_be_combined for discount in plan.discounts))
+        return plan
+
+    def test_matches_exhaustive_search_on_small_carts(self):
+        package_ids = [package.pk for package in self.packages]
+        service_ids = [service.pk for service in self.services]
+        rng = random.Random(7)
+        for _ in range(40):
+            cart_packages = rng.choices(package_ids, k=rng.randint(0, 2))
+            cart_services = rng.choices(service_ids, k=rng.randint(0 if cart_packages else 1, 3))
+            for client_id in [self.client_record.pk, None]:
+                self.assertBest(client_id, cart_packages, cart_services)
+
+    def test_non_combinable_discount_is_used_alone(self):
+        plan = self.assertBest(self.client_record.pk, package_ids=[self.packages[1].pk])
+        # 30% off 250.00 beats the 10% any stack could add
+        self.assertEqual(plan.codes, ['BIGSALE'])
+
+    def test_minimum_purchase_amount(self):
+        whole_body, localized = [service.pk for service in self.services]
+        below = self.assertBest(self.client_record.pk, service_ids=[whole_body, localized])
+        self.assertEqual(below.codes, ['TENOFF', 'WHOLEBODY'])
+        above = self.assertBest(self.client_record.pk, service_ids=[whole_body] + [localized] * 3)
+        self.assertEqual(sorted(above.codes), ['SERVICES', 'TENOFF', 'WHOLEBODY'])
+
+    def test_discounts_limited_to_items(self):
+        plan = self.assertBest(
+            self.client_record.pk, package_ids=[self.packages[1].pk], service_ids=[self.services[1].pk]
+        )
+        self.assertFalse({'TENPACK', 'WHOLEBODY'} & set(plan.codes))
+
+    def test_used_up_client_limit(self):
+        cart = {'package_ids': [self.packages[0].pk]}
+        self.assertNotIn('WELCOME', self.assertBest(self.client_record.pk, **cart).codes)
+        self.assertIn('WELCOME', self.assertBest(make_client('Bob').pk, **cart).codes)
+
+    def test_ties_go_to_fewer_discounts(self):
+        # WHOLEBODY alone makes the service free; adding TENOFF is worth nothing more
+        plan = self.assertBest(self.client_record.pk, service_ids=[self.services[0].pk])
+        self.assertEqual(plan.codes, ['WHOLEBODY'])
+        self.assertEqual(plan.total, Decimal('0.00'))
+
+
+class ReferralTests(TestCase):
+
+    def closure(self):
+        return set(ReferralClosure.objects.values_list('ancestor__first_name', 'descendant__first_name', 'depth'))
+
+    def test_referral_links_the_referred_client(self):
+        ann, bob, cy = make_client('Ann'), make_client('Bob'), make_client('Cy')
+        Referral.objects.create(referrer=ann, referred_client=bob)
+        Referral.objects.create(referrer=bob, referred_client=cy)
+
+        bob.refresh_from_db()
+        self.assertEqual(bob.referred_by, ann)
+        self.assertEqual(self.closure(), {('Ann', 'Bob', 1), ('Bob', 'Cy', 1), ('Ann', 'Cy', 2)})
+
+    def test_existing_referrer_is_kept(self):
+        ann, bob, cy = make_client('Ann'), make_client('Bob'), make_client('Cy')
+        Referral.objects.create(referrer=ann, referred_client=cy)
+        Referral.objects.create(referrer=bob, referred_client=cy)
+
+        cy.refresh_from_db()
+        self.assertEqual(cy.referred_by, ann)
+        self.assertEqual(self.closure(), {('Ann', 'Cy', 1)})
+
+    def test_deleting_a_referral_falls_back_to_the_next_one(self):
+        ann, bob, cy = make_client('Ann'), make_client('Bob'), make_client('Cy')
+        first = Referral.objects.create(referrer=ann, referred_client=cy)
+        second = Referral.objects.create(referrer=bob, referred_client=cy)
+
+        first.delete()
+        self.assertEqual(self.closure(), {('Bob', 'Cy', 1)})
+        second.delete()
+        self.assertEqual(self.closure(), set())
+        cy.refresh_from_db()
+        self.assertIsNone(cy.referred_by)
+
+    def test_referral_that_would_close_a_loop_is_not_linked(self):
+        ann, bob = make_client('Ann'), make_client('Bob')
+        Referral.objects.create(referrer=ann, referred_client=bob)
+        Referral.objects.create(referrer=bob, referred_client=ann)
+
+        ann.refresh_from_db()
+        self.assertIsNone(ann.referred_by)
+        self.assertEqual(self.closure(), {('Ann', 'Bob', 1)})
+
+    def test_deleting_the_referrer_leaves_the_closure_consistent(self):
+        ann, bob = make_client('Ann'), make_client('Bob')
+        Referral.objects.create(referrer=ann, referred_client=bob)
+
+        ann.delete()
+
+        self.assertEqual(self.closure(), set())
+        self.assertIsNone(Client.objects.get(pk=bob.pk).referred_by)
+
+
+class ConcurrentRedemptionTests(TransactionTestCase):
+    """Redemptions from many threads at once against the test database"""
+
+    THREADS = 8
+    ATTEMPTS = 25
+
+    def test_limits_hold_under_concurrent_redemption(self):
+        discount = Discount.objects.create(
+            name='Flash sale', code='FLASH', description='Limited promotion', discount_type='PERCENTAGE',
+            applies_to='ALL', percentage_off=Decimal('10.00'), max_uses_total=30, max_uses_per_client=2,
+        )
+        # The per-client limits alone would allow 40 uses
+        clients = [make_client(f'Client{i}') for i in range(20)]
+        outcomes = Counter()
+        lock = threading.Lock()
+        start = threading.Barrier(self.THREADS)
+
+        def work():
+            local = Counter()
+            try:
+                start.wait()
+                for _ in range(self.ATTEMPTS):
+                    try:
+                        redemption = redeem_discount(discount, random.choice(clients), Decimal('100.00'))
+                        local['redeemed' if redemption else 'refused'] += 1
+                    except DatabaseError:
+                        # SQLite serializes writers; a lock timeout is a refusal, not a breach
+                        local['error'] += 1
+            finally:
+                connection.close()
+                with lock:
+                    outcomes.update(local)
+
+        threads = [threading.Thread(target=work) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        discount.refresh_from_db()
+        usages = Counter(discount.usages.values_list('client_id', flat=True))
+        self.assertEqual(sum(outcomes.values()), self.THREADS * self.ATTEMPTS)
+        self.assertGreater(outcomes['redeemed'], 0)
+        self.assertEqual(sum(usages.values()), outcomes['redeemed'])
+        self.assertEqual(discount.current_uses, outcomes['redeemed'])
+        self.assertLessEqual(discount.current_uses, discount.max_uses_total)
+        self.assertLessEqual(max(usages.values()), discount.max_uses_per_client)
+        self.assertEqual(
+            dict(DiscountClientUsage.objects.filter(discount=discount, uses__gt=0).values_list('client_id', 'uses')),
+            dict(usages)
+        )
@@ -0,0 +1,260 @@
+"""Discount code validation served from a compiled in-process index
+
+Active discounts are loaded in three queries into immutable objects keyed by
+code, with their date windows, limits and applicable packages and services,
+and reused until the index's version key in the Django cache is bumped by a
+discount change. Use counts are left out: they move with every redemption
+and would make every process recompile. A client's usage counts come from
+the DiscountClientUsage counter table and are cached per client until they
+use a discount, so a repeated validation runs no queries at all. The total
+limit is only checked when a discount is actually redeemed, and the other
+limits are re-checked then; a passing validation is not a reservation.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+
+DISCOUNT_INDEX_VERSION_KEY = 'discounts:index:version'
+CLIENT_USAGE_CACHE_KEY = 'discounts:client-usage'
+
+# Longest a process keeps an index without checking its version
+DISCOUNT_INDEX_TIMEOUT = 5 * 60
+
+# Upper bound on staleness of a client's cached usage counts
+CLIENT_USAGE_TIMEOUT = 15 * 60
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledDiscount:
+    id: int
+    code: str
+    name: str
+    discount_type: str
+    applies_to: str
+    percentage_off: Decimal
+    fixed_amount_off: Decimal
+    free_sessions: int
+    start_date: object
+    end_date: object
+    max_uses_total: int
+    max_uses_per_client: int
+    minimum_purchase_amount: Decimal
+    can_be_combined: bool
+    package_ids: frozenset
+    service_ids: frozenset
+
+    def __str__(self):
+        return f"{self.name} ({self.code})"
+
+    def calculate_discount_amount(self, original_price):
+        """Same as Discount.calculate_discount_amount"""
+        if self.discount_type == 'PERCENTAGE' and self.percentage_off:
+            return original_price * (self.percentage_off / 100)
+        elif self.discount_type == 'FIXED' and self.fixed_amount_off:
+            return min(self.fixed_amount_off, original_price)
+        return Decimal('0.00')
+
+    def covers(self, kind, item_id):
+        """Whether the discount applies to one PACKAGE or SERVICE"""
+        if self.applies_to not in (kind, 'ALL'):
+            return False
+        limited_to = self.package_ids if kind == 'PACKAGE' else self.service_ids
+        return not limited_to or item_id in limited_to
+
+    def applies_to_items(self, package_ids, service_ids):
+        """Whether the discount covers anything among the given packages and services"""
+        packages = self.applies_to in ('PACKAGE', 'ALL') and bool(package_ids) and (
+            not self.package_ids or not self.package_ids.isdisjoint(package_ids)
+        )
+        services = self.applies_to in ('SERVICE', 'ALL') and bool(service_ids) and (
+            not self.service_ids or not self.service_ids.isdisjoint(service_ids)
+        )
+        return packages or services
+
+
+class DiscountIndex:
+    __slots__ = (
+        'version', 'loaded_at', 'by_code', 'by_id',
+        'by_package', 'by_service', 'any_package', 'any_service',
+    )
+
+    def __init__(self, version, discounts):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.by_code = {discount.code: discount for discount in discounts}
+        self.by_id = {discount.id: discount for discount in discounts}
+        # Item id -> discounts limited to it, plus those covering every item of a kind
+        self.by_package, self.by_service = {}, {}
+        any_package, any_service = [], []
+        for discount in discounts:
+            for kinds, items, by_item, any_item in [
+                (('PACKAGE', 'ALL'), discount.package_ids, self.by_package, any_package),
+                (('SERVICE', 'ALL'), discount.service_ids, self.by_service, any_service),
+            ]:
+                if discount.applies_to not in kinds:
+                    continue
+                if not items:
+                    any_item.append(discount)
+                for item_id in items:
+                    by_item.setdefault(item_id, []).append(discount)
+        self.any_package = tuple(any_package)
+        self.any_service = tuple(any_service)
+
+    def applicable(self, package_ids, service_ids):
+        """Discounts covering at least one of the given packages or services, by id"""
+        found = {}
+        for item_ids, by_item, any_item in [
+            (package_ids, self.by_package, self.any_package),
+            (service_ids, self.by_service, self.any_service),
+        ]:
+            if not item_ids:
+                continue
+            for discount in any_item:
+                found[discount.id] = discount
+            for item_id in item_ids:
+                for discount in by_item.get(item_id, ()):
+                    found[discount.id] = discount
+        return found
+
+    @classmethod
+    def load(cls, version):
+        from django.db.models import Q
+        from .models import Discount
+
+        today = timezone.localdate()
+        # Discounts that can never become valid again are left out
+        active = Discount.objects.filter(is_active=True).filter(
+            Q(end_date__isnull=True) | Q(end_date__gte=today)
+        )
+        rows = list(active.values_list(
+            'id', 'code', 'name', 'discount_type', 'applies_to', 'percentage_off',
+            'fixed_amount_off', 'free_sessions', 'start_date', 'end_date', 'max_uses_total',
+            'max_uses_per_client', 'minimum_purchase_amount', 'can_be_combined'
+        ))
+        ids = [row[0] for row in rows]
+        packages, services = {}, {}
+        for through, column, items in [
+            (Discount.applicable_packages.through, 'package_id', packages),
+            (Discount.applicable_services.through, 'service_id', services),
+        ]:
+            for discount_id, item_id in through.objects.filter(discount_id__in=ids).values_list(
+                'discount_id', column
+            ):
+                items.setdefault(discount_id, set()).add(item_id)
+        return cls(version, [
+            CompiledDiscount(
+                *row,
+                frozenset(packages.get(row[0], ())),
+                frozenset(services.get(row[0], ())),
+            )
+            for row in rows
+        ])
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_discount_index():
+    """The current index; only recompiled after a discount change or timeout"""
+    global _index
+    version = cache.get(DISCOUNT_INDEX_VERSION_KEY, 0)
+    index = _index
+    if index is not None and index.version == version and (
+        time.monotonic() - index.loaded_at < DISCOUNT_INDEX_TIMEOUT
+    ):
+        return index
+    with _lock:
+        if _index is None or _index is index:
+            _index = DiscountIndex.load(version)
+        return _index
+
+
+def invalidate_discount_index(**kwargs):
+    """Signal receiver: drop every process's index once the change commits"""
+    transaction.on_commit(_bump_index_version)
+
+
+def _bump_index_version():
+    try:
+        cache.incr(DISCOUNT_INDEX_VERSION_KEY)
+    except ValueError:
+        cache.set(DISCOUNT_INDEX_VERSION_KEY, 1, None)
+
+
+def client_usage(client_id):
+    """{discount id: times used} for a client, from the cache or the counter table"""
+    from .models import DiscountClientUsage
+
+    key = f'{CLIENT_USAGE_CACHE_KEY}:{client_id}'
+    usage = cache.get(key)
+    if usage is None:
+        usage = dict(
+            DiscountClientUsage.objects.filter(client_id=client_id, uses__gt=0).values_list('discount_id', 'uses')
+        )
+        cache.set(key, usage, CLIENT_USAGE_TIMEOUT)
+    return usage
+
+
+def invalidate_client_usage(client_id):
+    """Forget a client's cached usage counts once the transaction changing them commits"""
+    transaction.on_commit(lambda: cache.delete(f'{CLIENT_USAGE_CACHE_KEY}:{client_id}'))
+
+
+@dataclass
+class Validation:
+    valid: bool
+    reason: str = ''
+    discount: CompiledDiscount = None
+
+    def __bool__(self):
+        return self.valid
+
+
+def validate_code(code, client_id=None, subtotal=None, package_ids=(), service_ids=(),
+                  today=None, index=None, usage=None):
+    """
+    Check a discount code against its date window, per-client limit,
+    minimum purchase amount and, when the cart's packages or services are
+    given, what it applies to. The total limit is left to redeem_discount().
+    Returns a Validation, falsy with a reason when the code cannot be used.
+    """
+    index = index or get_discount_index()
+    discount = index.by_code.get(code.strip())
+    if discount is None:
+        return Validation(False, f"{code} is not a valid discount code.")
+
+    today = today or timezone.localdate()
+    if today < discount.start_date:
+        return Validation(False, f"{code} is not valid until {discount.start_date}.", discount)
+    if discount.end_date and today > discount.end_date:
+        return Validation(False, f"{code} expired on {discount.end_date}.", discount)
+    if client_id is not None:
+        if usage is None:
+            usage = client_usage(client_id)
+        if usage.get(discount.id, 0) >= discount.max_uses_per_client:
+            return Validation(False, f"{code} has already been used the maximum number of times.", discount)
+    if subtotal is not None and discount.minimum_purchase_amount and subtotal < discount.minimum_purchase_amount:
+        return Validation(False, f"{code} requires a purchase of at least {discount.minimum_purchase_amount}.", discount)
+    if (package_ids or service_ids) and not discount.applies_to_items(set(package_ids), set(service_ids)):
+        return Validation(False, f"{code} does not apply to these items.", discount)
+    return Validation(True, discount=discount)
+
+
+def validate_codes(codes, client_id=None, subtotal=None, package_ids=(), service_ids=(), today=None):
+    """Validate several codes for one cart; the index and usage counts are fetched once. {code: Validation}"""
+    index = get_discount_index()
+    usage = client_usage(client_id) if client_id is not None else None
+    package_ids, service_ids = set(package_ids), set(service_ids)
+    return {
+        code: validate_code(
+            code, client_id, subtotal, package_ids, service_ids, today, index=index, usage=usage
+        )
+        for code in codes
+    }
@@ -1,6 +1,31 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Package, PackagePurchase
+from crm_cryo.exports import export_csv, export_jsonl
+from .models import (
+    BreakageForecast, BreakageForecastRun, Package, PackagePurchase, PackagePurchaseHistory,
+    RevenueDay, SessionLedgerEntry,
+)
+
+
+class PackagePurchaseHistoryInline(admin.TabularInline):
+    model = PackagePurchaseHistory
+    extra = 0
+    readonly_fields = ['previous_status', 'new_status', 'changed_at', 'notes']
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class SessionLedgerInline(admin.TabularInline):
+    model = SessionLedgerEntry
+    extra = 0
+    fields = ['created_at', 'entry_type', 'sessions', 'balance', 'amount', 'appointment', 'notes']
+    readonly_fields = fields
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Package)
@@ -72,12 +97,14 @@ class PackagePurchaseAdmin(admin.ModelAdmin):
     ]
     readonly_fields = [
         'purchase_date',
+        'sessions_used',
         'sessions_remaining',
         'created_at',
         'updated_at',
         'get_usage_percentage'
     ]
     autocomplete_fields = ['client', 'package']
+    inlines = [SessionLedgerInline, PackagePurchaseHistoryInline]
     
     fieldsets = (
         ('Purchase Information', {
@@ -119,6 +146,22 @@ class PackagePurchaseAdmin(admin.ModelAdmin):
         )
     session_progress.short_description = "Sessions Used"
     
+    actions = ['book_remaining_sessions', export_csv, export_jsonl]
+    
+    def book_remaining_sessions(self, request, queryset):
+        from django.contrib import messages
+        from django.core.exceptions import ValidationError
+        from appointments.series import create_series
+        
+        count = 0
+        for purchase in queryset.filter(status='ACTIVE'):
+            try:
+                count += len(create_series(purchase))
+            except ValidationError as e:
+                self.message_user(request, f"{purchase}: {e.messages[0]}", level=messages.WARNING)
+        self.message_user(request, f"{count} sessions booked.")
+    book_remaining_sessions.short_description = "Book remaining sessions as a series"
+    
     def save_model(self, request, obj, form, change):
         # Set initial values if creating new purchase
         if not change:
@@ -128,3 +171,64 @@ class PackagePurchaseAdmin(admin.ModelAdmin):
                 obj.discount_applied = 0
             obj.final_price = obj.original_price - obj.discount_applied
         super().save_model(request, obj, form, change)
+
+
+@admin.register(RevenueDay)
+class RevenueDayAdmin(admin.ModelAdmin):
+    list_display = ['date', 'booked', 'recognized', 'breakage', 'deferred_balance']
+    date_hierarchy = 'date'
+    readonly_fields = ['date', 'booked', 'recognized', 'breakage', 'deferred_balance', 'updated_at']
+    actions = [export_csv, export_jsonl]
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(BreakageForecast)
+class BreakageForecastAdmin(admin.ModelAdmin):
+    list_display = [
+        'purchase',
+        'expiry_date',
+        'expected_unused_sessions',
+        'probability',
+        'expected_breakage_value',
+        'forecast_date'
+    ]
+    list_select_related = ['purchase__client', 'purchase__package']
+    ordering = ['-expected_breakage_value']
+    search_fields = ['purchase__client__first_name', 'purchase__client__last_name', 'purchase__client__email']
+    readonly_fields = [
+        'purchase', 'forecast_date', 'expected_sessions_used', 'expected_unused_sessions',
+        'probability', 'expected_breakage_value'
+    ]
+    
+    def expiry_date(self, obj):
+        return obj.purchase.expiry_date
+    expiry_date.admin_order_field = 'purchase__expiry_date'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(BreakageForecastRun)
+class BreakageForecastRunAdmin(admin.ModelAdmin):
+    list_display = [
+        'forecast_date',
+        'purchases',
+        'sessions_remaining',
+        'expected_unused_sessions',
+        'expected_breakage_value'
+    ]
+    date_hierarchy = 'forecast_date'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
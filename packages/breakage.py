@@ -0,0 +1,198 @@
+"""Vectorized forecast of package sessions that will expire unused
+
+Each ACTIVE purchase is expected to use its already booked sessions plus a
+Poisson number of further visits before it expires, at a daily rate that
+blends the purchase's own pace with the client's recent visit cadence.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import BreakageForecast, BreakageForecastRun, PackagePurchase
+
+
+# Completed visits in this many days set a client's cadence
+CADENCE_DAYS = 180
+
+# Shortest span a client's visits are spread over, so one recent visit isn't a daily habit
+MIN_CADENCE_DAYS = 30
+
+# A purchase's own pace counts for half after this many days
+PRIOR_DAYS = 30
+
+OPEN_STATUSES = ['SCHEDULED', 'CONFIRMED', 'CHECKED_IN', 'IN_PROGRESS']
+
+
+def load_purchase_arrays(today, chunk_size=10000):
+    """
+    Arrays over ACTIVE purchases: ids, client ids, sessions remaining and
+    used, days since purchase, days left until expiry (inclusive) and
+    price per session, in one pass.
+    """
+    rows = PackagePurchase.objects.filter(
+        status='ACTIVE', expiry_date__gte=today, sessions_remaining__gt=0
+    ).order_by('pk').values_list(
+        'pk', 'client_id', 'sessions_remaining', 'sessions_used', 'purchase_date',
+        'expiry_date', 'final_price', 'total_sessions'
+    ).iterator(chunk_size=chunk_size)
+
+    columns = [[] for _ in range(7)]
+    ordinal = today.toordinal()
+    for pk, client_id, remaining, used, purchased, expiry, price, total in rows:
+        for column, value in zip(columns, [
+            pk, client_id, remaining, used, max(ordinal - purchased.toordinal(), 0),
+            expiry.toordinal() - ordinal + 1, float(price) / total if total else 0.0,
+        ]):
+            column.append(value)
+    ids, clients, remaining, used, age, days_left = (np.array(c, dtype=np.int64) for c in columns[:6])
+    return ids, clients, remaining, used, age, days_left, np.array(columns[6], dtype=np.float64)
+
+
+def load_client_rates(today):
+    """Sorted client ids and their completed visits per day over the cadence window"""
+    from appointments.models import Appointment
+
+    start = today - timedelta(days=CADENCE_DAYS)
+    rows = Appointment.objects.filter(
+        status='COMPLETED', appointment_date__gte=start, appointment_date__lte=today
+    ).order_by('client_id').values('client_id').annotate(
+        visits=models.Count('pk'), first_visit=models.Min('appointment_date')
+    ).values_list('client_id', 'visits', 'first_visit')
+
+    clients, rates = [], []
+    for client_id, visits, first_visit in rows:
+        clients.append(client_id)
+        # New clients are measured over the time they have been coming, but at least a month
+        rates.append(visits / max((today - first_visit).days + 1, MIN_CADENCE_DAYS))
+    return np.array(clients, dtype=np.int64), np.array(rates, dtype=np.float64)
+
+
+def load_booked_sessions(today):
+    """Sorted purchase ids and the open appointments booked on each before it expires"""
+    from appointments.models import Appointment
+
+    rows = list(
+        Appointment.objects.filter(
+            package_purchase__status='ACTIVE',
+            status__in=OPEN_STATUSES,
+            appointment_date__gte=today,
+            appointment_date__lte=models.F('package_purchase__expiry_date'),
+        ).order_by('package_purchase_id').values('package_purchase_id').annotate(
+            booked=models.Count('pk')
+        ).values_list('package_purchase_id', 'booked')
+    )
+    return (
+        np.array([pk for pk, _ in rows], dtype=np.int64),
+        np.array([booked for _, booked in rows], dtype=np.int64),
+    )
+
+
+def lookup(keys, values, wanted, default):
+    """values[i] where wanted == keys[i] (keys sorted), default where absent"""
+    result = np.full(len(wanted), default, dtype=values.dtype)
+    if len(keys):
+        position = np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)
+        found = keys[position] == wanted
+        result[found] = values[position[found]]
+    return result
+
+
+def forecast_usage(remaining, booked, rate, days_left):
+    """
+    Expected sessions used before expiry and the chance of at least one
+    going unused, when `booked` sessions are certain and further visits
+    are Poisson with mean rate * days_left.
+    """
+    booked = np.minimum(booked, remaining)
+    unbooked = remaining - booked
+    lam = rate * days_left
+
+    # E[min(N, unbooked)] = sum over k < unbooked of P(N > k)
+    pmf = np.exp(-lam)
+    cdf = pmf.copy()
+    expected = np.zeros(len(remaining), dtype=np.float64)
+    probability = np.zeros(len(remaining), dtype=np.float64)
+    for k in range(int(unbooked.max(initial=0))):
+        open_k = k < unbooked
+        expected += np.where(open_k, 1.0 - cdf, 0.0)
+        # P(N < unbooked) is the CDF at unbooked - 1
+        probability = np.where(unbooked - 1 == k, cdf, probability)
+        pmf = pmf * lam / (k + 1)
+        cdf = np.minimum(cdf + pmf, 1.0)
+    return booked + expected, probability
+
+
+def forecast_breakage(today=None, batch_size=5000):
+    """
+    Forecast every ACTIVE purchase, replace the stored forecasts and record
+    the day's totals. Returns the BreakageForecastRun.
+    """
+    today = today or timezone.localdate()
+    ids, clients, remaining, used, age, days_left, per_session = load_purchase_arrays(today)
+    client_ids, client_rates = load_client_rates(today)
+    booked_ids, booked_counts = load_booked_sessions(today)
+
+    # Clients with no recent visits get the average cadence
+    fallback = client_rates.mean() if len(client_rates) else 0.0
+    cadence = lookup(client_ids, client_rates, clients, fallback)
+
+    pace = used / np.maximum(age, 1)
+    weight = age / (age + PRIOR_DAYS)
+    rate = weight * pace + (1 - weight) * cadence
+
+    booked = lookup(booked_ids, booked_counts, ids, 0)
+    expected_used, probability = forecast_usage(remaining, booked, rate, days_left)
+    unused = remaining - expected_used
+    value = unused * per_session
+
+    forecasts = [
+        BreakageForecast(
+            purchase_id=pk,
+            forecast_date=today,
+            expected_sessions_used=Decimal(f'{expected:.2f}'),
+            expected_unused_sessions=Decimal(f'{sessions:.2f}'),
+            probability=Decimal(f'{chance:.4f}'),
+            expected_breakage_value=Decimal(f'{amount:.2f}'),
+        )
+        for pk, expected, sessions, chance, amount in zip(
+            ids.tolist(), expected_used.tolist(), unused.tolist(), probability.tolist(), value.tolist()
+        )
+    ]
+    with transaction.atomic():
+        BreakageForecast.objects.bulk_create(
+            forecasts,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['purchase'],
+            update_fields=[
+                'forecast_date', 'expected_sessions_used', 'expected_unused_sessions',
+                'probability', 'expected_breakage_value',
+            ]
+        )
+        # Purchases that stopped being ACTIVE keep no forecast
+        BreakageForecast.objects.filter(forecast_date__lt=today).delete()
+        run, _ = BreakageForecastRun.objects.update_or_create(
+            forecast_date=today,
+            defaults={
+                'purchases': len(ids),
+                'sessions_remaining': int(remaining.sum()),
+                'expected_unused_sessions': Decimal(f'{unused.sum():.2f}'),
+                'expected_breakage_value': Decimal(f'{value.sum():.2f}'),
+            }
+        )
+    return run
+
+
+def outreach_purchases(min_probability=Decimal('0.5'), expiring_within=None):
+    """ACTIVE purchases likely to expire with sessions unused, most value at stake first"""
+    purchases = PackagePurchase.objects.filter(
+        status='ACTIVE', breakage_forecast__probability__gte=min_probability
+    )
+    if expiring_within is not None:
+        purchases = purchases.filter(expiry_date__lte=timezone.localdate() + timedelta(days=expiring_within))
+    return purchases.select_related('client', 'package', 'breakage_forecast').order_by(
+        '-breakage_forecast__expected_breakage_value'
+    )
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+from packages.breakage import forecast_breakage
+
+
+class Command(BaseCommand):
+    help = 'Forecast the sessions of active packages that will expire unused'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Forecasting package breakage...')
+        started = time.perf_counter()
+        run = forecast_breakage()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {run.purchases} active packages: {run.expected_unused_sessions} of '
+            f'{run.sessions_remaining} remaining sessions expected to go unused '
+            f'(${run.expected_breakage_value}) in {elapsed:.1f}s'
+        ))
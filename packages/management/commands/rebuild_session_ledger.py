@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+from packages.models import SessionLedgerEntry
+
+
+class Command(BaseCommand):
+    help = 'Recompute running balances, earned amounts and package session counters from the session ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        self.stdout.write('Replaying session ledger...')
+        started = time.perf_counter()
+        purchases, entries = SessionLedgerEntry.objects.rebuild_projections(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Corrected {purchases} purchases and {entries} ledger entries in {elapsed:.1f}s'
+        ))
@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from packages.revenue import monthly_revenue, refresh_revenue_rollup
+
+
+class Command(BaseCommand):
+    help = 'Print recognized and deferred package revenue per month from the daily rollup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help='First day, YYYY-MM-DD')
+        parser.add_argument('--to', dest='end', help='Last day, YYYY-MM-DD')
+        parser.add_argument('--refresh', action='store_true', help='Bring the rollup up to date first')
+        parser.add_argument('--rebuild', action='store_true', help='Recompute the whole rollup first')
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end = date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError as e:
+            raise CommandError(e)
+
+        if options['refresh'] or options['rebuild']:
+            days = refresh_revenue_rollup(full=options['rebuild'])
+            self.stdout.write(self.style.SUCCESS(f'✓ Rolled up {days} days'))
+
+        self.stdout.write(f"{'Month':<8} {'Booked':>12} {'Recognized':>12} {'Breakage':>12} {'Deferred':>14}")
+        for month in monthly_revenue(start, end):
+            self.stdout.write(
+                f"{month['month']:%Y-%m}  {month['booked']:>12} {month['recognized']:>12} "
+                f"{month['breakage']:>12} {month['deferred_balance']:>14}"
+            )
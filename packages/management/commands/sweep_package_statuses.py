@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from packages.models import PackagePurchase
+
+
+class Command(BaseCommand):
+    help = 'Mark used-up package purchases COMPLETED and lapsed ones EXPIRED'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        counts = PackagePurchase.objects.sweep_statuses(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Completed {counts['COMPLETED']} and expired {counts['EXPIRED']} package purchases"
+        ))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0002_package_is_sharable'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='packagepurchase',
+            index=models.Index(condition=models.Q(('status', 'ACTIVE')), fields=['expiry_date', 'client', 'id'], name='purchase_active_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0003_packagepurchase_purchase_active_expiry_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackagePurchaseHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('previous_status', models.CharField(max_length=20)),
+                ('new_status', models.CharField(max_length=20)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+                ('notes', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Package Purchase History',
+                'verbose_name_plural': 'Package Purchase Histories',
+                'ordering': ['-changed_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='packagepurchase',
+            index=models.Index(fields=['status', 'expiry_date'], name='purchase_status_expiry_idx'),
+        ),
+        migrations.AddField(
+            model_name='packagepurchasehistory',
+            name='purchase',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='history', to='packages.packagepurchase'),
+        ),
+    ]
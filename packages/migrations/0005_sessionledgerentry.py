@@ -0,0 +1,91 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+BATCH_SIZE = 2000
+
+
+def open_ledgers(apps, schema_editor):
+    """
+    Give every purchase a ledger matching its current counters: the purchase,
+    one redemption per redeemed appointment, and entries for any remainder.
+    """
+    PackagePurchase = apps.get_model('packages', 'PackagePurchase')
+    SessionLedgerEntry = apps.get_model('packages', 'SessionLedgerEntry')
+    Appointment = apps.get_model('appointments', 'Appointment')
+    
+    last_pk = 0
+    while True:
+        purchases = list(
+            PackagePurchase.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+                'pk', 'total_sessions', 'sessions_used', 'sessions_remaining', 'created_at'
+            )[:BATCH_SIZE]
+        )
+        if not purchases:
+            break
+        last_pk = purchases[-1][0]
+        redeemed = {}
+        for purchase_id, appointment_id, completed_at in Appointment.objects.filter(
+            package_purchase_id__in=[row[0] for row in purchases], session_redeemed=True
+        ).order_by('completed_at', 'pk').values_list('package_purchase_id', 'pk', 'completed_at'):
+            redeemed.setdefault(purchase_id, []).append((appointment_id, completed_at))
+        
+        entries = []
+        for purchase_id, total, used, remaining, created_at in purchases:
+            balance = total
+            entries.append(SessionLedgerEntry(
+                purchase_id=purchase_id, entry_type='PURCHASE', sessions=total, balance=balance, created_at=created_at
+            ))
+            appointments = redeemed.get(purchase_id, [])[:used]
+            for appointment_id, completed_at in appointments:
+                balance -= 1
+                entries.append(SessionLedgerEntry(
+                    purchase_id=purchase_id, entry_type='REDEEM', sessions=-1, balance=balance,
+                    appointment_id=appointment_id, created_at=completed_at or created_at
+                ))
+            if used != len(appointments):
+                balance -= used - len(appointments)
+                entries.append(SessionLedgerEntry(
+                    purchase_id=purchase_id, entry_type='REDEEM', sessions=len(appointments) - used,
+                    balance=balance, notes="Opening balance", created_at=created_at
+                ))
+            if remaining != balance:
+                entries.append(SessionLedgerEntry(
+                    purchase_id=purchase_id, entry_type='EXPIRE', sessions=remaining - balance,
+                    balance=remaining, notes="Opening balance", created_at=created_at
+                ))
+        SessionLedgerEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0004_appointment_session_redeemed'),
+        ('packages', '0004_packagepurchasehistory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('PURCHASE', 'Purchase'), ('REDEEM', 'Redeem'), ('REFUND', 'Refund'), ('ADJUST', 'Adjust'), ('EXPIRE', 'Expire')], max_length=10)),
+                ('sessions', models.IntegerField(help_text='Change in sessions remaining')),
+                ('balance', models.IntegerField(help_text='Sessions remaining after this entry')),
+                ('notes', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('appointment', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='session_ledger', to='appointments.appointment')),
+                ('purchase', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger', to='packages.packagepurchase')),
+            ],
+            options={
+                'verbose_name': 'Session Ledger Entry',
+                'verbose_name_plural': 'Session Ledger',
+                'ordering': ['purchase', 'id'],
+                'indexes': [models.Index(fields=['purchase', '-id', 'balance'], name='session_ledger_balance_idx')],
+            },
+        ),
+        migrations.RunPython(open_ledgers, migrations.RunPython.noop),
+    ]
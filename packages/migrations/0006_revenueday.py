@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:17
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0005_sessionledgerentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('booked', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Package purchases made', max_digits=12)),
+                ('recognized', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Earned by redeemed sessions, net of refunds', max_digits=12)),
+                ('breakage', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Earned by sessions forfeited on expiry', max_digits=12)),
+                ('deferred_balance', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Paid for but not yet earned at the end of the day', max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Revenue Day',
+                'verbose_name_plural': 'Revenue Days',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='packagepurchase',
+            index=models.Index(fields=['purchase_date'], name='purchase_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sessionledgerentry',
+            index=models.Index(fields=['created_at'], name='session_ledger_created_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0006_revenueday'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BreakageForecastRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('forecast_date', models.DateField(unique=True)),
+                ('purchases', models.PositiveIntegerField()),
+                ('sessions_remaining', models.PositiveIntegerField()),
+                ('expected_unused_sessions', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('expected_breakage_value', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('created_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Breakage Forecast Run',
+                'verbose_name_plural': 'Breakage Forecast Runs',
+                'ordering': ['-forecast_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BreakageForecast',
+            fields=[
+                ('purchase', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='breakage_forecast', serialize=False, to='packages.packagepurchase')),
+                ('forecast_date', models.DateField()),
+                ('expected_sessions_used', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('expected_unused_sessions', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('probability', models.DecimalField(decimal_places=4, help_text='Chance that at least one session expires unused', max_digits=5)),
+                ('expected_breakage_value', models.DecimalField(decimal_places=2, max_digits=10)),
+            ],
+            options={
+                'verbose_name': 'Breakage Forecast',
+                'verbose_name_plural': 'Breakage Forecasts',
+                'indexes': [models.Index(fields=['probability', 'purchase'], name='breakage_probability_idx'), models.Index(fields=['-expected_breakage_value'], name='breakage_value_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:45
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0007_breakageforecast'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='packagepurchase',
+            name='purchase_active_expiry_idx',
+        ),
+    ]
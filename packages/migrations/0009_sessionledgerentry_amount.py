@@ -0,0 +1,75 @@
+# Generated by Django 4.2.7 on 2026-10-19 03:48
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.utils.timezone
+
+
+BATCH_SIZE = 2000
+
+CENT = Decimal('0.01')
+
+
+def value_entries(apps, schema_editor):
+    """Replay every purchase's ledger to store what each entry earned, as DeferredRevenue does"""
+    PackagePurchase = apps.get_model('packages', 'PackagePurchase')
+    SessionLedgerEntry = apps.get_model('packages', 'SessionLedgerEntry')
+    
+    last_pk = 0
+    while True:
+        prices = dict(
+            PackagePurchase.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'final_price')[:BATCH_SIZE]
+        )
+        if not prices:
+            break
+        last_pk = max(prices)
+        state = {pk: [Decimal('0.00'), 0] for pk in prices}
+        redeemed_rates = {}
+        valued = []
+        for entry in SessionLedgerEntry.objects.filter(purchase_id__in=prices).order_by('purchase_id', 'id').only(
+            'purchase_id', 'entry_type', 'sessions', 'balance', 'appointment_id'
+        ):
+            price, (earned, consumed) = prices[entry.purchase_id], state[entry.purchase_id]
+            sessions, balance, amount = entry.sessions, entry.balance, Decimal('0.00')
+            key = (entry.purchase_id, entry.appointment_id)
+            if entry.entry_type == 'PURCHASE':
+                pass
+            elif sessions < 0 and balance <= 0:
+                amount = price - earned
+            elif sessions < 0 and entry.entry_type != 'ADJUST':
+                amount = ((price - earned) * -sessions / (balance - sessions)).quantize(CENT)
+            elif sessions > 0 and entry.entry_type != 'ADJUST' and consumed > 0:
+                rate = redeemed_rates.get(key) if entry.entry_type == 'REFUND' else None
+                if rate is None:
+                    rate = earned / consumed
+                amount = -min(rate * min(sessions, consumed), earned).quantize(CENT)
+            if entry.entry_type == 'REDEEM' and entry.appointment_id and sessions < 0:
+                redeemed_rates[key] = amount / -sessions
+            if entry.entry_type in ('REDEEM', 'REFUND', 'EXPIRE'):
+                consumed = max(consumed - sessions, 0)
+            state[entry.purchase_id] = [earned + amount, consumed]
+            if amount:
+                entry.amount = amount
+                valued.append(entry)
+        SessionLedgerEntry.objects.bulk_update(valued, ['amount'], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0008_remove_purchase_active_expiry_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessionledgerentry',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Revenue earned by this entry, negative when given back', max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='packagepurchase',
+            name='purchase_date',
+            field=models.DateField(default=django.utils.timezone.localdate, editable=False),
+        ),
+        migrations.RunPython(value_entries, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
+from django.utils import timezone
 from services.models import Service
 
 
@@ -89,10 +90,110 @@ class Package(models.Model):
         return Decimal('0.00')
     
     def get_service_names(self):
-        return ", ".join([s.name for s in self.services.all()])
+        from services.catalog import get_catalog
+        names = get_catalog().service_names(self.pk)
+        if names is None:
+            names = ", ".join([s.name for s in self.services.all()])
+        return names
     get_service_names.short_description = "Services"
 
 
+class DeferredRevenue:
+    """
+    Running revenue state of one purchase's ledger, used to value each entry
+    as it is written. A redemption or expiry earns its share of what is still
+    deferred (deferred / sessions remaining), so total changes (ADJUST)
+    reprice the sessions after them; the entry that leaves no sessions earns
+    whatever is left, so a closed purchase has earned exactly its price.
+    A refund gives back what the redemption it reverses earned when that is
+    known, and reversed expiries the average earned per session.
+    """
+    
+    CONSUMING = ('REDEEM', 'REFUND', 'EXPIRE')
+    
+    def __init__(self, price, earned=Decimal('0.00'), consumed=0):
+        self.price = price
+        self.earned = earned
+        # Sessions redeemed or forfeited and not given back
+        self.consumed = consumed
+    
+    def value(self, entry_type, sessions, balance, reversed_rate=None):
+        """
+        Amount an entry with the given balance after it earns (negative when
+        giving back), optionally reversing sessions earned at `reversed_rate`
+        each; advances the state
+        """
+        amount = Decimal('0.00')
+        if entry_type == 'PURCHASE':
+            pass
+        elif sessions < 0 and balance <= 0:
+            amount = self.price - self.earned
+        elif sessions < 0 and entry_type != 'ADJUST':
+            amount = ((self.price - self.earned) * -sessions / (balance - sessions)).quantize(Decimal('0.01'))
+        elif sessions > 0 and entry_type != 'ADJUST' and self.consumed > 0:
+            sessions_back = min(sessions, self.consumed)
+            if reversed_rate is None:
+                reversed_rate = self.earned / self.consumed
+            amount = -min(reversed_rate * sessions_back, self.earned).quantize(Decimal('0.01'))
+        self.earned += amount
+        if entry_type in self.CONSUMING:
+            self.consumed = max(self.consumed - sessions, 0)
+        return amount
+
+
+class PackagePurchaseManager(models.Manager):
+    
+    def sweep_statuses(self, today=None, batch_size=2000):
+        """
+        Complete used-up and expire lapsed ACTIVE purchases without loading
+        them: each batch of locked ids gets one UPDATE per new status and one
+        bulk insert of history rows. Returns {new status: count}.
+        """
+        today = today or timezone.localdate()
+        # Same precedence as save(): no sessions left wins over expiry
+        transitions = [
+            ('COMPLETED', models.Q(sessions_remaining__lte=0), "Sessions used up"),
+            ('EXPIRED', models.Q(expiry_date__lt=today), f"Expired on {today}"),
+        ]
+        counts = {}
+        for status, condition, note in transitions:
+            counts[status] = 0
+            candidates = self.filter(condition, status='ACTIVE')
+            last_pk = 0
+            while True:
+                with transaction.atomic():
+                    rows = list(
+                        candidates.filter(pk__gt=last_pk).select_for_update()
+                        .order_by('pk').values_list('pk', 'sessions_remaining')[:batch_size]
+                    )
+                    if not rows:
+                        break
+                    ids = [pk for pk, _ in rows]
+                    changes = {'status': status, 'updated_at': timezone.now()}
+                    if status == 'EXPIRED':
+                        # Unused sessions are forfeited, and what they were paid for is breakage
+                        changes['sessions_remaining'] = 0
+                        forfeited = [(pk, remaining) for pk, remaining in rows if remaining > 0]
+                        revenue = SessionLedgerEntry.objects.revenue_states([pk for pk, _ in forfeited])
+                        SessionLedgerEntry.objects.bulk_create([
+                            SessionLedgerEntry(
+                                purchase_id=pk, entry_type='EXPIRE', sessions=-remaining, balance=0,
+                                amount=revenue[pk].value('EXPIRE', -remaining, 0), notes=note
+                            )
+                            for pk, remaining in forfeited
+                        ])
+                    self.filter(pk__in=ids).update(**changes)
+                    PackagePurchaseHistory.objects.bulk_create([
+                        PackagePurchaseHistory(
+                            purchase_id=pk, previous_status='ACTIVE', new_status=status, notes=note
+                        )
+                        for pk in ids
+                    ])
+                counts[status] += len(ids)
+                last_pk = ids[-1]
+        return counts
+
+
 class PackagePurchase(models.Model):
     """Track client purchases of packages"""
     
@@ -115,7 +216,8 @@ class PackagePurchase(models.Model):
     )
     
     # Purchase details
-    purchase_date = models.DateField(auto_now_add=True)
+    # The local day, as the revenue rollup buckets ledger entries
+    purchase_date = models.DateField(default=timezone.localdate, editable=False)
     expiry_date = models.DateField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='ACTIVE')
     
@@ -148,32 +250,81 @@ class PackagePurchase(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = PackagePurchaseManager()
+    
     class Meta:
         ordering = ['-purchase_date']
         verbose_name = 'Package Purchase'
         verbose_name_plural = 'Package Purchases'
+        indexes = [
+            # Status sweeps, status filters by date and send_package_expiry_warnings
+            models.Index(fields=['status', 'expiry_date'], name='purchase_status_expiry_idx'),
+            # Revenue rollup refreshes
+            models.Index(fields=['purchase_date'], name='purchase_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.client.get_full_name()} - {self.package.name}"
     
+    @transaction.atomic
     def save(self, *args, **kwargs):
+        previous = None
+        if self.pk:
+            # Locked so no redemption moves the counters between this read and the write
+            previous = PackagePurchase.objects.select_for_update().filter(pk=self.pk).values_list(
+                'status', 'total_sessions', 'sessions_remaining', 'sessions_used'
+            ).first()
+        counters_guarded = previous is not None and kwargs.get('update_fields') is None
+        if counters_guarded:
+            # Sessions are used and given back only through redeem_session() and
+            # refund_session(); a stale copy must not overwrite their counts
+            self.sessions_used = previous[3]
+        
         # Set expiry date based on package validity
         if not self.expiry_date and self.package:
             from datetime import timedelta
             self.expiry_date = self.purchase_date + timedelta(days=self.package.validity_days)
         
-        # Calculate sessions remaining
-        self.sessions_remaining = self.total_sessions - self.sessions_used
-        
-        # Update status based on sessions and expiry
-        if self.sessions_remaining <= 0:
-            self.status = 'COMPLETED'
-        elif self.expiry_date:
-            from django.utils import timezone
-            if timezone.now().date() > self.expiry_date:
-                self.status = 'EXPIRED'
+        if self.status != 'EXPIRED':
+            # Calculate sessions remaining
+            self.sessions_remaining = self.total_sessions - self.sessions_used
+            
+            # Update status based on sessions and expiry
+            if self.sessions_remaining <= 0:
+                self.status = 'COMPLETED'
+            elif self.expiry_date:
+                if timezone.now().date() > self.expiry_date:
+                    self.status = 'EXPIRED'
+        if self.status == 'EXPIRED':
+            # Unused sessions are forfeited
+            self.sessions_remaining = 0
         
+        if counters_guarded:
+            # sessions_remaining is only written when the total or an expiry changed it
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ('sessions_used', 'sessions_remaining')
+            ]
+            if self.sessions_remaining != previous[2]:
+                kwargs['update_fields'].append('sessions_remaining')
         super().save(*args, **kwargs)
+        SessionLedgerEntry.objects.append(self.pk, self._ledger_changes(previous and previous[:3]))
+    
+    def _ledger_changes(self, previous):
+        """Ledger entries explaining the counters written by save()"""
+        old_status, old_total, old_remaining = previous or (None, 0, 0)
+        entries = []
+        if previous is None:
+            entries.append(('PURCHASE', self.total_sessions, None, ''))
+        elif self.total_sessions != old_total:
+            entries.append(('ADJUST', self.total_sessions - old_total, None, f"Total sessions {old_total} -> {self.total_sessions}"))
+        # Whatever the total does not explain came from sessions_used or from expiry
+        residual = self.sessions_remaining - old_remaining - (self.total_sessions - old_total)
+        if residual and 'EXPIRED' in (old_status, self.status):
+            entries.append(('EXPIRE', residual, None, "Unused sessions forfeited" if residual < 0 else "Expiry reversed"))
+        elif residual:
+            entries.append(('REDEEM' if residual < 0 else 'REFUND', residual, None, "Sessions used edited"))
+        return entries
     
     def get_usage_percentage(self):
         if self.total_sessions > 0:
@@ -188,3 +339,281 @@ class PackagePurchase(models.Model):
             self.sessions_remaining > 0 and
             self.expiry_date >= timezone.now().date()
         )
+
+
+class PackagePurchaseHistory(models.Model):
+    """Track package purchase status changes"""
+    
+    purchase = models.ForeignKey(
+        PackagePurchase,
+        on_delete=models.CASCADE,
+        related_name='history'
+    )
+    previous_status = models.CharField(max_length=20)
+    new_status = models.CharField(max_length=20)
+    changed_at = models.DateTimeField(auto_now_add=True)
+    notes = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['-changed_at']
+        verbose_name = 'Package Purchase History'
+        verbose_name_plural = 'Package Purchase Histories'
+    
+    def __str__(self):
+        return f"{self.purchase_id} - {self.previous_status} to {self.new_status}"
+
+
+class SessionLedgerManager(models.Manager):
+    
+    def balance(self, purchase_id):
+        """Sessions left according to the ledger: one seek on the running balance index"""
+        return self.filter(purchase_id=purchase_id).order_by('-id').values_list('balance', flat=True).first() or 0
+    
+    def revenue_states(self, purchase_ids):
+        """{purchase id: DeferredRevenue} as of the purchases' latest ledger entries"""
+        from django.db.models.functions import Coalesce
+        
+        if not purchase_ids:
+            return {}
+        rows = PackagePurchase.objects.filter(pk__in=purchase_ids).order_by().annotate(
+            earned=Coalesce(models.Sum('ledger__amount'), models.Value(Decimal('0.00'))),
+            consumed=Coalesce(
+                models.Sum('ledger__sessions', filter=models.Q(ledger__entry_type__in=DeferredRevenue.CONSUMING)),
+                models.Value(0)
+            ),
+        ).values_list('pk', 'final_price', 'earned', 'consumed')
+        return {pk: DeferredRevenue(price, earned, max(-consumed, 0)) for pk, price, earned, consumed in rows}
+    
+    def append(self, purchase_id, entries):
+        """
+        Append (entry type, sessions, appointment id, notes) entries to a
+        purchase's ledger with their running balances and the revenue each
+        earns. The caller must hold the purchase row lock, e.g. by having
+        just updated it.
+        """
+        if not entries:
+            return []
+        balance = self.balance(purchase_id)
+        revenue = self.revenue_states([purchase_id])[purchase_id]
+        rows = []
+        for entry_type, sessions, appointment_id, notes in entries:
+            balance += sessions
+            rate = self.redeemed_rate(purchase_id, appointment_id) if entry_type == 'REFUND' else None
+            rows.append(SessionLedgerEntry(
+                purchase_id=purchase_id, entry_type=entry_type, sessions=sessions, balance=balance,
+                amount=revenue.value(entry_type, sessions, balance, rate), appointment_id=appointment_id, notes=notes
+            ))
+        return self.bulk_create(rows)
+    
+    def redeemed_rate(self, purchase_id, appointment_id):
+        """What each session redeemed for an appointment earned, or None"""
+        if appointment_id is None:
+            return None
+        redeemed = self.filter(
+            purchase_id=purchase_id, appointment_id=appointment_id, entry_type='REDEEM'
+        ).order_by('-id').values_list('amount', 'sessions').first()
+        return redeemed[0] / -redeemed[1] if redeemed and redeemed[1] < 0 else None
+    
+    def rebuild_projections(self, batch_size=2000):
+        """
+        Recompute running balances, the revenue each entry earns (at the
+        purchases' current prices) and every purchase's session counters
+        from the ledger, a batch of purchases at a time. Returns the number
+        of (purchases, entries) corrected.
+        """
+        fixed_purchases = fixed_entries = 0
+        last_pk = 0
+        while True:
+            purchases = list(
+                PackagePurchase.objects.filter(pk__gt=last_pk).order_by('pk')
+                .only('final_price', 'total_sessions', 'sessions_used', 'sessions_remaining')[:batch_size]
+            )
+            if not purchases:
+                break
+            last_pk = purchases[-1].pk
+            by_pk = {purchase.pk: purchase for purchase in purchases}
+            projections = {pk: [0, 0, 0] for pk in by_pk}
+            revenue = {pk: DeferredRevenue(purchase.final_price) for pk, purchase in by_pk.items()}
+            # (purchase id, appointment id) -> what each session redeemed for it earned
+            redeemed_rates = {}
+            wrong_entries = []
+            for entry in self.filter(purchase_id__in=by_pk).order_by('purchase_id', 'id').only(
+                'purchase_id', 'entry_type', 'sessions', 'balance', 'amount', 'appointment_id'
+            ).iterator(chunk_size=batch_size):
+                projection = projections[entry.purchase_id]
+                if entry.entry_type in ('PURCHASE', 'ADJUST'):
+                    projection[0] += entry.sessions
+                elif entry.entry_type in ('REDEEM', 'REFUND'):
+                    projection[1] -= entry.sessions
+                projection[2] += entry.sessions
+                key = (entry.purchase_id, entry.appointment_id)
+                rate = redeemed_rates.get(key) if entry.entry_type == 'REFUND' else None
+                amount = revenue[entry.purchase_id].value(entry.entry_type, entry.sessions, projection[2], rate)
+                if entry.entry_type == 'REDEEM' and entry.appointment_id and entry.sessions < 0:
+                    redeemed_rates[key] = amount / -entry.sessions
+                if (entry.balance, entry.amount) != (projection[2], amount):
+                    entry.balance, entry.amount = projection[2], amount
+                    wrong_entries.append(entry)
+            
+            stale = []
+            for pk, (total, used, remaining) in projections.items():
+                purchase = by_pk[pk]
+                if (purchase.total_sessions, purchase.sessions_used, purchase.sessions_remaining) != (total, used, remaining):
+                    purchase.total_sessions, purchase.sessions_used, purchase.sessions_remaining = total, used, remaining
+                    stale.append(purchase)
+            with transaction.atomic():
+                self.bulk_update(wrong_entries, ['balance', 'amount'], batch_size=batch_size)
+                PackagePurchase.objects.bulk_update(
+                    stale, ['total_sessions', 'sessions_used', 'sessions_remaining'], batch_size=batch_size
+                )
+            fixed_purchases += len(stale)
+            fixed_entries += len(wrong_entries)
+        return fixed_purchases, fixed_entries
+
+
+class SessionLedgerEntry(models.Model):
+    """
+    Append-only record of every change to a purchase's sessions. The
+    purchase's total_sessions, sessions_used and sessions_remaining are a
+    projection of its entries.
+    """
+    
+    ENTRY_TYPES = [
+        ('PURCHASE', 'Purchase'),
+        ('REDEEM', 'Redeem'),
+        ('REFUND', 'Refund'),
+        ('ADJUST', 'Adjust'),
+        ('EXPIRE', 'Expire'),
+    ]
+    
+    purchase = models.ForeignKey(
+        PackagePurchase,
+        on_delete=models.CASCADE,
+        related_name='ledger'
+    )
+    entry_type = models.CharField(max_length=10, choices=ENTRY_TYPES)
+    sessions = models.IntegerField(help_text="Change in sessions remaining")
+    balance = models.IntegerField(help_text="Sessions remaining after this entry")
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text="Revenue earned by this entry, negative when given back"
+    )
+    appointment = models.ForeignKey(
+        'appointments.Appointment',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='session_ledger',
+        # The table may be partitioned, which leaves nothing to reference (appointments.partitioning)
+        db_constraint=False
+    )
+    notes = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    
+    objects = SessionLedgerManager()
+    
+    class Meta:
+        ordering = ['purchase', 'id']
+        verbose_name = 'Session Ledger Entry'
+        verbose_name_plural = 'Session Ledger'
+        indexes = [
+            # Latest running balance of a purchase straight from the index
+            models.Index(fields=['purchase', '-id', 'balance'], name='session_ledger_balance_idx'),
+            # Revenue rollup refreshes
+            models.Index(fields=['created_at'], name='session_ledger_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.purchase_id} {self.entry_type} {self.sessions:+d} = {self.balance}"
+
+
+class RevenueDay(models.Model):
+    """Daily rollup of package revenue, written by packages.revenue"""
+    
+    date = models.DateField(unique=True)
+    booked = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text="Package purchases made"
+    )
+    recognized = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text="Earned by redeemed sessions, net of refunds"
+    )
+    breakage = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text="Earned by sessions forfeited on expiry"
+    )
+    deferred_balance = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text="Paid for but not yet earned at the end of the day"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-date']
+        verbose_name = 'Revenue Day'
+        verbose_name_plural = 'Revenue Days'
+    
+    def __str__(self):
+        return f"{self.date}: {self.recognized} recognized, {self.deferred_balance} deferred"
+
+
+class BreakageForecast(models.Model):
+    """Latest forecast of the sessions an ACTIVE purchase will leave unused"""
+    
+    purchase = models.OneToOneField(
+        PackagePurchase,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='breakage_forecast'
+    )
+    forecast_date = models.DateField()
+    expected_sessions_used = models.DecimalField(max_digits=7, decimal_places=2)
+    expected_unused_sessions = models.DecimalField(max_digits=7, decimal_places=2)
+    probability = models.DecimalField(
+        max_digits=5,
+        decimal_places=4,
+        help_text="Chance that at least one session expires unused"
+    )
+    expected_breakage_value = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    class Meta:
+        verbose_name = 'Breakage Forecast'
+        verbose_name_plural = 'Breakage Forecasts'
+        indexes = [
+            # Outreach picks the likeliest and most valuable first
+            models.Index(fields=['probability', 'purchase'], name='breakage_probability_idx'),
+            models.Index(fields=['-expected_breakage_value'], name='breakage_value_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.purchase_id}: {self.expected_unused_sessions} sessions ({self.probability:.0%})"
+
+
+class BreakageForecastRun(models.Model):
+    """Totals of one day's breakage forecast"""
+    
+    forecast_date = models.DateField(unique=True)
+    purchases = models.PositiveIntegerField()
+    sessions_remaining = models.PositiveIntegerField()
+    expected_unused_sessions = models.DecimalField(max_digits=12, decimal_places=2)
+    expected_breakage_value = models.DecimalField(max_digits=14, decimal_places=2)
+    created_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-forecast_date']
+        verbose_name = 'Breakage Forecast Run'
+        verbose_name_plural = 'Breakage Forecast Runs'
+    
+    def __str__(self):
+        return f"{self.forecast_date}: {self.expected_breakage_value} expected breakage"
@@ -0,0 +1,130 @@
+"""Recognized and deferred package revenue
+
+A purchase's price is deferred when it is paid and recognized one session
+at a time as sessions are redeemed, reversed by refunds; whatever is
+forfeited on expiry is recognized as breakage. Each ledger entry stores the
+amount it earned when it was written (see DeferredRevenue), so later price
+or total changes don't rewrite the past, and a closed purchase's recognized
+revenue and breakage add up to its price. Daily figures are streamed from
+the database in date order, bucketed by local day like purchase_date, and
+stored in RevenueDay, which the reports read.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from heapq import merge
+from itertools import groupby
+
+from django.db import models, transaction
+from django.db.models.functions import TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import PackagePurchase, RevenueDay, SessionLedgerEntry
+
+
+CENT = Decimal('0.01')
+
+# Days before the last rollup recomputed on each refresh, for late ledger entries
+REOPEN_DAYS = 2
+
+
+def _ledger_amounts(entry_types, start):
+    """(day, amount earned) per local day from the given ledger entries, in date order"""
+    entries = SessionLedgerEntry.objects.filter(entry_type__in=entry_types)
+    if start:
+        entries = entries.filter(created_at__gte=timezone.make_aware(datetime.combine(start, time.min)))
+    return entries.annotate(day=TruncDate('created_at')).order_by('day').values('day').annotate(
+        earned=models.Sum('amount')
+    ).values_list('day', 'earned').iterator()
+
+
+def daily_revenue(start=None):
+    """
+    Yield (day, booked, recognized, breakage) for every day with activity
+    from `start` on, in date order. Three per-day aggregate streams are
+    merged, so memory stays constant however long the history is.
+    """
+    purchases = PackagePurchase.objects.all()
+    if start:
+        purchases = purchases.filter(purchase_date__gte=start)
+    booked = purchases.order_by('purchase_date').values('purchase_date').annotate(
+        amount=models.Sum('final_price')
+    ).values_list('purchase_date', 'amount').iterator()
+
+    streams = [
+        ((day, 0, amount) for day, amount in booked),
+        ((day, 1, amount) for day, amount in _ledger_amounts(['REDEEM', 'REFUND', 'ADJUST'], start)),
+        ((day, 2, amount) for day, amount in _ledger_amounts(['EXPIRE'], start)),
+    ]
+    for day, rows in groupby(merge(*streams), key=lambda row: row[0]):
+        totals = [Decimal('0.00')] * 3
+        for _, kind, amount in rows:
+            totals[kind] += Decimal(amount or 0).quantize(CENT)
+        yield (day, *totals)
+
+
+def refresh_revenue_rollup(since=None, full=False, batch_size=2000):
+    """
+    Recompute RevenueDay from `since` (by default the last few days already
+    rolled up) or, with full=True, from the beginning. Returns the number of
+    days written.
+    """
+    if full:
+        since = None
+    elif since is None:
+        last = RevenueDay.objects.order_by('-date').values_list('date', flat=True).first()
+        since = last - timedelta(days=REOPEN_DAYS) if last else None
+
+    opening = Decimal('0.00')
+    if since:
+        opening = RevenueDay.objects.filter(date__lt=since).order_by('-date').values_list(
+            'deferred_balance', flat=True
+        ).first() or Decimal('0.00')
+
+    written = 0
+    with transaction.atomic():
+        stale = RevenueDay.objects.all()
+        if since:
+            stale = stale.filter(date__gte=since)
+        stale.delete()
+
+        balance, batch = opening, []
+        for day, booked, recognized, breakage in daily_revenue(since):
+            balance += booked - recognized - breakage
+            batch.append(RevenueDay(
+                date=day, booked=booked, recognized=recognized, breakage=breakage, deferred_balance=balance
+            ))
+            if len(batch) >= batch_size:
+                RevenueDay.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        RevenueDay.objects.bulk_create(batch)
+    return written + len(batch)
+
+
+def monthly_revenue(start=None, end=None):
+    """
+    Per-month totals from the rollup as dicts with month, booked,
+    recognized, breakage and the closing deferred balance.
+    """
+    days = RevenueDay.objects.all()
+    if start:
+        days = days.filter(date__gte=start)
+    if end:
+        days = days.filter(date__lte=end)
+    months = list(days.annotate(month=TruncMonth('date')).order_by('month').values('month').annotate(
+        booked=models.Sum('booked'),
+        recognized=models.Sum('recognized'),
+        breakage=models.Sum('breakage'),
+        last_day=models.Max('date'),
+    ))
+    closing = dict(days.filter(date__in=[month['last_day'] for month in months]).values_list('date', 'deferred_balance'))
+    return [
+        {
+            'month': month['month'],
+            'booked': month['booked'].quantize(CENT),
+            'recognized': month['recognized'].quantize(CENT),
+            'breakage': month['breakage'].quantize(CENT),
+            'deferred_balance': closing[month['last_day']],
+        }
+        for month in months
+    ]
@@ -0,0 +1,123 @@
+"""Atomic redemption of package sessions"""
+from dataclasses import dataclass
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import PackagePurchase, PackagePurchaseHistory, SessionLedgerEntry
+
+
+@dataclass
+class Redemption:
+    redeemed: bool
+    reason: str = ''
+    sessions_remaining: int = None
+
+    def __bool__(self):
+        return self.redeemed
+
+
+def redeem_session(purchase, appointment):
+    """
+    Use one session of `purchase` for `appointment`. The appointment is
+    claimed and the session counters moved by conditional UPDATEs, so
+    concurrent check-ins can neither redeem an appointment twice nor take a
+    purchase below zero sessions. Returns a Redemption, falsy on failure.
+    """
+    from appointments.models import Appointment
+
+    if appointment.client_id != purchase.client_id and not purchase.package.is_sharable:
+        return Redemption(False, "The package belongs to another client.")
+
+    with transaction.atomic():
+        claimed = Appointment.objects.filter(pk=appointment.pk, session_redeemed=False).update(
+            session_redeemed=True
+        )
+        if not claimed:
+            return Redemption(False, "A session was already redeemed for this appointment.")
+
+        used = PackagePurchase.objects.filter(
+            pk=purchase.pk,
+            status='ACTIVE',
+            sessions_remaining__gt=0,
+            expiry_date__gte=appointment.appointment_date,
+        ).update(
+            sessions_used=models.F('sessions_used') + 1,
+            sessions_remaining=models.F('sessions_remaining') - 1,
+            status=models.Case(
+                models.When(sessions_remaining=1, then=models.Value('COMPLETED')),
+                default=models.F('status'),
+            ),
+            updated_at=timezone.now(),
+        )
+        row = PackagePurchase.objects.filter(pk=purchase.pk).values_list(
+            'status', 'sessions_used', 'sessions_remaining', 'expiry_date'
+        ).first()
+        if not used:
+            # Release the claim on the appointment
+            transaction.set_rollback(True)
+            return Redemption(False, _failure_reason(row, appointment), row[2] if row else None)
+
+        purchase.status, purchase.sessions_used, purchase.sessions_remaining, _ = row
+        appointment.session_redeemed = True
+        SessionLedgerEntry.objects.append(purchase.pk, [('REDEEM', -1, appointment.pk, '')])
+        if purchase.status == 'COMPLETED':
+            PackagePurchaseHistory.objects.create(
+                purchase_id=purchase.pk, previous_status='ACTIVE', new_status='COMPLETED',
+                notes="Sessions used up"
+            )
+    return Redemption(True, sessions_remaining=purchase.sessions_remaining)
+
+
+def refund_session(purchase, appointment):
+    """
+    Give back the session `appointment` used, e.g. when a completion is
+    reverted. Only a redeemed appointment on an active or completed
+    purchase can be refunded. Returns a Redemption, falsy on failure.
+    """
+    from appointments.models import Appointment
+
+    with transaction.atomic():
+        released = Appointment.objects.filter(pk=appointment.pk, session_redeemed=True).update(
+            session_redeemed=False
+        )
+        if not released:
+            return Redemption(False, "No session was redeemed for this appointment.")
+
+        previous_status = PackagePurchase.objects.select_for_update().filter(
+            pk=purchase.pk
+        ).values_list('status', flat=True).first()
+        refunded = PackagePurchase.objects.filter(
+            pk=purchase.pk, status__in=['ACTIVE', 'COMPLETED'], sessions_used__gt=0
+        ).update(
+            sessions_used=models.F('sessions_used') - 1,
+            sessions_remaining=models.F('sessions_remaining') + 1,
+            status=models.Value('ACTIVE'),
+            updated_at=timezone.now(),
+        )
+        if not refunded:
+            transaction.set_rollback(True)
+            return Redemption(False, "The package can no longer take the session back.")
+
+        purchase.status, purchase.sessions_used, purchase.sessions_remaining = PackagePurchase.objects.filter(
+            pk=purchase.pk
+        ).values_list('status', 'sessions_used', 'sessions_remaining').get()
+        appointment.session_redeemed = False
+        SessionLedgerEntry.objects.append(purchase.pk, [('REFUND', 1, appointment.pk, '')])
+        if previous_status == 'COMPLETED':
+            PackagePurchaseHistory.objects.create(
+                purchase_id=purchase.pk, previous_status='COMPLETED', new_status='ACTIVE',
+                notes="Session refunded"
+            )
+    return Redemption(True, sessions_remaining=purchase.sessions_remaining)
+
+
+def _failure_reason(row, appointment):
+    if row is None:
+        return "The package purchase no longer exists."
+    status, _, remaining, expiry_date = row
+    if status != 'ACTIVE':
+        return f"The package is {status.lower()}."
+    if remaining <= 0:
+        return "No sessions remain on the package."
+    return f"The package expired on {expiry_date}."
@@ -0,0 +1,28 @@
+from celery import shared_task
+
+
+@shared_task
+def sweep_package_statuses():
+    """Nightly completion and expiry of ACTIVE package purchases"""
+    from .models import PackagePurchase
+    
+    counts = PackagePurchase.objects.sweep_statuses()
+    return f"Completed {counts['COMPLETED']} and expired {counts['EXPIRED']} package purchases"
+
+
+@shared_task
+def forecast_breakage():
+    """Nightly forecast of package sessions likely to expire unused"""
+    from .breakage import forecast_breakage as run_forecast
+    
+    run = run_forecast()
+    return f"Forecast {run.expected_unused_sessions} unused sessions across {run.purchases} active packages"
+
+
+@shared_task
+def rollup_revenue():
+    """Nightly refresh of the daily recognized / deferred revenue rollup"""
+    from .revenue import refresh_revenue_rollup
+    
+    days = refresh_revenue_rollup()
+    return f"Rolled up revenue for {days} days"
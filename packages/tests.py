@@ -0,0 +1,269 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+from django.utils import timezone
+
+from appointments.models import Appointment
+from clients.models import Client
+from services.models import Service, ServiceType
+
+from .breakage import MIN_CADENCE_DAYS, load_client_rates
+from .models import Package, PackagePurchase, PackagePurchaseHistory, RevenueDay, SessionLedgerEntry
+from .revenue import refresh_revenue_rollup
+from .sessions import redeem_session, refund_session
+
+
+class PackageTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        service_type = ServiceType.objects.create(name='Cryotherapy', code='CRYO')
+        cls.service = Service.objects.create(
+            name='Whole Body', service_type=service_type, duration_minutes=30, base_price=Decimal('50.00')
+        )
+        cls.package = Package.objects.create(
+            name='Ten Pack', category='CUSTOM', description='Ten sessions', total_sessions=10,
+            price=Decimal('400.00')
+        )
+        cls.client_record = Client.objects.create(
+            first_name='Ann', last_name='Smith', email='ann@example.com', phone='555-0100'
+        )
+
+    def make_purchase(self, sessions=10, price=Decimal('400.00')):
+        return PackagePurchase.objects.create(
+            client=self.client_record, package=self.package,
+            expiry_date=timezone.localdate() + timedelta(days=90),
+            original_price=price, final_price=price,
+            total_sessions=sessions, sessions_remaining=sessions,
+        )
+
+    def complete_visit(self, purchase, start_at=None):
+        """A completed appointment on the purchase, which redeems one of its sessions"""
+        return Appointment.objects.create(
+            client=self.client_record, service=self.service, duration_minutes=30,
+            start_at=start_at or timezone.now() - timedelta(hours=1),
+            package_purchase=purchase, status='COMPLETED',
+        )
+
+
+    def book_visit(self, purchase, client=None):
+        """A scheduled appointment on the purchase, which has not used a session yet"""
+        return Appointment.objects.create(
+            client=client or self.client_record, service=self.service, duration_minutes=30,
+            start_at=timezone.now() - timedelta(hours=1), package_purchase=purchase,
+        )
+
+
+class SessionTests(PackageTestCase):
+
+    def assertNotRedeemed(self, appointment, purchase, remaining):
+        self.assertFalse(Appointment.objects.get(pk=appointment.pk).session_redeemed)
+        self.assertEqual(PackagePurchase.objects.get(pk=purchase.pk).sessions_remaining, remaining)
+        self.assertEqual(SessionLedgerEntry.objects.balance(purchase.pk), remaining)
+
+    def test_expired_package_is_refused(self):
+        purchase = self.make_purchase()
+        PackagePurchase.objects.filter(pk=purchase.pk).update(expiry_date=timezone.localdate() - timedelta(days=1))
+        appointment = self.book_visit(purchase)
+
+        redemption = redeem_session(purchase, appointment)
+
+        self.assertFalse(redemption)
+        self.assertEqual(redemption.reason, f"The package expired on {timezone.localdate() - timedelta(days=1)}.")
+        self.assertNotRedeemed(appointment, purchase, 10)
+
+    def test_used_up_package_is_refused(self):
+        purchase = self.make_purchase(sessions=1)
+        self.complete_visit(purchase)
+        appointment = self.book_visit(purchase)
+
+        redemption = redeem_session(purchase, appointment)
+
+        self.assertFalse(redemption)
+        self.assertEqual(redemption.reason, "The package is completed.")
+        self.assertEqual(redemption.sessions_remaining, 0)
+        self.assertNotRedeemed(appointment, purchase, 0)
+
+    def test_appointment_is_redeemed_once(self):
+        purchase = self.make_purchase()
+        appointment = self.complete_visit(purchase)
+
+        redemption = redeem_session(purchase, appointment)
+
+        self.assertFalse(redemption)
+        self.assertEqual(redemption.reason, "A session was already redeemed for this appointment.")
+        self.assertEqual(PackagePurchase.objects.get(pk=purchase.pk).sessions_remaining, 9)
+
+    def test_other_clients_cannot_use_an_unsharable_package(self):
+        purchase = self.make_purchase()
+        other = Client.objects.create(first_name='Bob', last_name='Jones', email='bob@example.com', phone='555-0101')
+        appointment = self.book_visit(purchase, client=other)
+
+        redemption = redeem_session(purchase, appointment)
+
+        self.assertFalse(redemption)
+        self.assertEqual(redemption.reason, "The package belongs to another client.")
+        self.assertNotRedeemed(appointment, purchase, 10)
+
+    def test_refund_reopens_a_completed_package(self):
+        purchase = self.make_purchase(sessions=1)
+        appointment = self.complete_visit(purchase)
+        self.assertEqual(PackagePurchase.objects.get(pk=purchase.pk).status, 'COMPLETED')
+
+        refund = refund_session(purchase, appointment)
+
+        self.assertTrue(refund)
+        self.assertEqual(refund.sessions_remaining, 1)
+        purchase.refresh_from_db()
+        self.assertEqual((purchase.status, purchase.sessions_used, purchase.sessions_remaining), ('ACTIVE', 0, 1))
+        self.assertEqual(SessionLedgerEntry.objects.balance(purchase.pk), 1)
+        self.assertTrue(PackagePurchaseHistory.objects.filter(
+            purchase=purchase, previous_status='COMPLETED', new_status='ACTIVE'
+        ).exists())
+        self.assertFalse(refund_session(purchase, appointment))
+
+    def test_refused_completion_rolls_back_the_save(self):
+        purchase = self.make_purchase()
+        PackagePurchase.objects.filter(pk=purchase.pk).update(expiry_date=timezone.localdate() - timedelta(days=1))
+        appointment = self.book_visit(purchase)
+
+        appointment.status = 'COMPLETED'
+        with self.assertRaisesMessage(ValidationError, "The package expired on"):
+            appointment.save()
+
+        self.assertEqual(Appointment.objects.get(pk=appointment.pk).status, 'SCHEDULED')
+
+
+class SweepTests(PackageTestCase):
+
+    def test_used_up_and_lapsed_purchases_are_closed(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        used_up = self.make_purchase()
+        PackagePurchase.objects.filter(pk=used_up.pk).update(sessions_used=10, sessions_remaining=0)
+        # No sessions left wins over expiry
+        used_up_and_lapsed = self.make_purchase()
+        PackagePurchase.objects.filter(pk=used_up_and_lapsed.pk).update(
+            sessions_used=10, sessions_remaining=0, expiry_date=yesterday
+        )
+        lapsed = self.make_purchase(sessions=5)
+        self.complete_visit(lapsed)
+        PackagePurchase.objects.filter(pk=lapsed.pk).update(expiry_date=yesterday)
+        current = self.make_purchase()
+        cancelled = self.make_purchase()
+        PackagePurchase.objects.filter(pk=cancelled.pk).update(status='CANCELLED', expiry_date=yesterday)
+
+        counts = PackagePurchase.objects.sweep_statuses(batch_size=1)
+
+        self.assertEqual(counts, {'COMPLETED': 2, 'EXPIRED': 1})
+        statuses = dict(PackagePurchase.objects.values_list('pk', 'status'))
+        self.assertEqual(
+            [statuses[purchase.pk] for purchase in [used_up, used_up_and_lapsed, lapsed, current, cancelled]],
+            ['COMPLETED', 'COMPLETED', 'EXPIRED', 'ACTIVE', 'CANCELLED']
+        )
+        history = PackagePurchaseHistory.objects.filter(
+            notes__in=["Sessions used up", f"Expired on {timezone.localdate()}"]
+        )
+        self.assertEqual(
+            set(history.values_list('purchase_id', 'previous_status', 'new_status')),
+            {
+                (used_up.pk, 'ACTIVE', 'COMPLETED'),
+                (used_up_and_lapsed.pk, 'ACTIVE', 'COMPLETED'),
+                (lapsed.pk, 'ACTIVE', 'EXPIRED'),
+            }
+        )
+
+        # The lapsed purchase's four unused sessions are forfeited
+        lapsed.refresh_from_db()
+        self.assertEqual((lapsed.sessions_used, lapsed.sessions_remaining), (1, 0))
+        expire = SessionLedgerEntry.objects.get(purchase=lapsed, entry_type='EXPIRE')
+        self.assertEqual((expire.sessions, expire.balance), (-4, 0))
+        self.assertEqual(expire.amount, Decimal('320.00'))
+        self.assertEqual(SessionLedgerEntry.objects.balance(lapsed.pk), 0)
+
+        self.assertEqual(PackagePurchase.objects.sweep_statuses(), {'COMPLETED': 0, 'EXPIRED': 0})
+
+
+class PurchaseSaveTests(PackageTestCase):
+
+    def test_stale_copy_does_not_overwrite_session_counters(self):
+        purchase = self.make_purchase()
+        stale = PackagePurchase.objects.get(pk=purchase.pk)
+        self.complete_visit(purchase)
+
+        stale.notes = 'Paid by card'
+        stale.save()
+
+        purchase.refresh_from_db()
+        self.assertEqual((purchase.sessions_used, purchase.sessions_remaining), (1, 9))
+        self.assertEqual(purchase.notes, 'Paid by card')
+        self.assertEqual(SessionLedgerEntry.objects.balance(purchase.pk), 9)
+        self.assertFalse(SessionLedgerEntry.objects.filter(purchase=purchase, notes='Sessions used edited').exists())
+
+    def test_total_change_on_stale_copy_keeps_redemptions(self):
+        purchase = self.make_purchase()
+        stale = PackagePurchase.objects.get(pk=purchase.pk)
+        self.complete_visit(purchase)
+
+        stale.total_sessions = 12
+        stale.save()
+
+        purchase.refresh_from_db()
+        self.assertEqual((purchase.sessions_used, purchase.sessions_remaining), (1, 11))
+        self.assertEqual(SessionLedgerEntry.objects.balance(purchase.pk), 11)
+
+
+class ClientRateTests(PackageTestCase):
+
+    def test_single_visit_today_is_not_a_daily_cadence(self):
+        self.complete_visit(None)
+
+        clients, rates = load_client_rates(timezone.localdate())
+
+        self.assertEqual(clients.tolist(), [self.client_record.pk])
+        self.assertAlmostEqual(rates[0], 1 / MIN_CADENCE_DAYS)
+
+    def test_regular_visitor_is_measured_since_the_first_visit(self):
+        today = timezone.localdate()
+        for weeks in range(1, 13):
+            self.complete_visit(None, timezone.make_aware(datetime.combine(today - timedelta(weeks=weeks), time(12))))
+
+        _, rates = load_client_rates(today)
+
+        self.assertAlmostEqual(rates[0], 12 / 85)
+
+
+class RevenueTests(PackageTestCase):
+
+    def test_closed_purchase_recognizes_exactly_its_price(self):
+        purchase = self.make_purchase(sessions=10, price=Decimal('400.00'))
+        self.assertEqual(purchase.purchase_date, timezone.localdate())
+        self.complete_visit(purchase)
+        self.complete_visit(purchase)
+        # Two sessions taken off the package reprice the rest
+        purchase.refresh_from_db()
+        purchase.total_sessions = 8
+        purchase.save()
+        refunded = self.complete_visit(purchase)
+        self.assertTrue(refund_session(purchase, refunded))
+        self.complete_visit(purchase)
+        PackagePurchase.objects.filter(pk=purchase.pk).update(expiry_date=timezone.localdate() - timedelta(days=1))
+        PackagePurchase.objects.sweep_statuses()
+
+        amounts = dict(
+            (entry_type, amount) for entry_type, amount in SessionLedgerEntry.objects.filter(
+                purchase=purchase, entry_type__in=['ADJUST', 'EXPIRE']
+            ).values_list('entry_type', 'amount')
+        )
+        self.assertEqual(amounts['ADJUST'], Decimal('0.00'))
+        # 80.00 for two sessions at 40.00, then 320.00 over six sessions for the third
+        self.assertEqual(amounts['EXPIRE'], Decimal('400.00') - Decimal('80.00') - Decimal('53.33'))
+        # Replaying the ledger values every entry the same way
+        self.assertEqual(SessionLedgerEntry.objects.rebuild_projections(), (0, 0))
+
+        refresh_revenue_rollup(full=True)
+        day = RevenueDay.objects.get()
+        self.assertEqual(day.booked, Decimal('400.00'))
+        self.assertEqual(day.recognized + day.breakage, day.booked)
+        self.assertEqual(day.deferred_balance, Decimal('0.00'))
@@ -0,0 +1,142 @@
+"""In-process cache of the service and package catalog
+
+The whole catalog (service types, services, packages and their services)
+is loaded in four queries into immutable objects and reused until its
+version key in the Django cache is bumped by a catalog change. With a
+per-process cache backend (the default LocMemCache) changes made in another
+process are only picked up once CATALOG_TIMEOUT has passed; configure a
+shared cache in production.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+CATALOG_VERSION_KEY = 'services:catalog:version'
+
+# Longest a process keeps a catalog without checking its version
+CATALOG_TIMEOUT = 5 * 60
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogServiceType:
+    id: int
+    name: str
+    code: str
+    display_order: int
+    is_active: bool
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogService:
+    id: int
+    name: str
+    service_type_id: int
+    service_type_name: str
+    duration_minutes: int
+    base_price: Decimal
+    is_active: bool
+
+    def __str__(self):
+        return f"{self.name} ({self.service_type_name})"
+
+
+@dataclass(frozen=True, slots=True)
+class CatalogPackage:
+    id: int
+    name: str
+    category: str
+    total_sessions: int
+    price: Decimal
+    validity_days: int
+    is_active: bool
+    service_ids: tuple
+
+    def __str__(self):
+        return f"{self.name} ({self.total_sessions} sessions)"
+
+
+class Catalog:
+    __slots__ = ('version', 'loaded_at', 'service_types', 'services', 'packages')
+
+    def __init__(self, version, service_types, services, packages):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.service_types = service_types
+        self.services = services
+        self.packages = packages
+
+    @classmethod
+    def load(cls, version):
+        from packages.models import Package
+        from services.models import Service, ServiceType
+
+        service_types = {
+            row[0]: CatalogServiceType(*row)
+            for row in ServiceType.objects.values_list('id', 'name', 'code', 'display_order', 'is_active')
+        }
+        services = {
+            pk: CatalogService(pk, name, type_id, service_types[type_id].name, duration, price, active)
+            for pk, name, type_id, duration, price, active in Service.objects.values_list(
+                'id', 'name', 'service_type_id', 'duration_minutes', 'base_price', 'is_active'
+            )
+        }
+        package_services = {}
+        for package_id, service_id in Package.services.through.objects.values_list(
+            'package_id', 'service_id'
+        ):
+            package_services.setdefault(package_id, []).append(service_id)
+
+        def order(pk):
+            # Same order as Service.Meta.ordering
+            return service_types[services[pk].service_type_id].display_order, services[pk].name
+
+        packages = {
+            row[0]: CatalogPackage(*row, tuple(sorted(package_services.get(row[0], ()), key=order)))
+            for row in Package.objects.values_list(
+                'id', 'name', 'category', 'total_sessions', 'price', 'validity_days', 'is_active'
+            )
+        }
+        return cls(version, service_types, services, packages)
+
+    def service_names(self, package_id):
+        """Comma separated names of a package's services, None for an unknown package"""
+        package = self.packages.get(package_id)
+        if package is None:
+            return None
+        return ", ".join(self.services[pk].name for pk in package.service_ids)
+
+
+_catalog = None
+_lock = threading.Lock()
+
+
+def get_catalog():
+    """The current catalog; only reloaded after a catalog change or timeout"""
+    global _catalog
+    version = cache.get(CATALOG_VERSION_KEY, 0)
+    catalog = _catalog
+    if catalog is not None and catalog.version == version and (
+        time.monotonic() - catalog.loaded_at < CATALOG_TIMEOUT
+    ):
+        return catalog
+    with _lock:
+        if _catalog is None or _catalog is catalog:
+            _catalog = Catalog.load(version)
+        return _catalog
+
+
+def invalidate_catalog(**kwargs):
+    """Signal receiver: drop every process's catalog once the change commits"""
+    transaction.on_commit(_bump_catalog_version)
+
+
+def _bump_catalog_version():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOG_VERSION_KEY, 1, None)
@@ -4,7 +4,7 @@ from datetime import timedelta
 from decimal import Decimal
 from services.models import ServiceType, Service
 from packages.models import Package
-from clients.models import Client
+from clients.models import Client, ClientProfile
 from appointments.models import Appointment
 from discounts.models import Discount
 
@@ -307,14 +307,23 @@ class Command(BaseCommand):
             },
         ]
         
+        profile_fields = [
+            'address_line1', 'city', 'state', 'zip_code',
+            'medical_conditions', 'medications', 'allergies', 'notes'
+        ]
+        
         clients = {}
         for client_data in clients_data:
+            profile_data = {
+                field: client_data.pop(field) for field in profile_fields if field in client_data
+            }
             client, created = Client.objects.get_or_create(
                 email=client_data['email'],
                 defaults=client_data
             )
             clients[client_data['email']] = client
             if created:
+                ClientProfile.objects.create(client=client, **profile_data)
                 self.stdout.write(self.style.SUCCESS(f'  ✓ Created client: {client.get_full_name()}'))
             else:
                 self.stdout.write(f'  - Client exists: {client.get_full_name()}')
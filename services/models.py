@@ -69,7 +69,11 @@ class Service(models.Model):
         verbose_name_plural = 'Services'
     
     def __str__(self):
-        return f"{self.name} ({self.service_type.name})"
+        from .catalog import get_catalog
+        service_type = get_catalog().service_types.get(self.service_type_id)
+        if service_type is None:
+            service_type = self.service_type
+        return f"{self.name} ({service_type.name})"
     
     def get_price_with_currency(self):
         return f"${self.base_price}"
@@ -0,0 +1,11 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from packages.models import Package
+from .catalog import invalidate_catalog
+from .models import Service, ServiceType
+
+
+# Any change to the catalog tables makes every process reload the catalog
+for model in [ServiceType, Service, Package]:
+    post_save.connect(invalidate_catalog, sender=model, dispatch_uid=f'catalog-save-{model._meta.label}')
+    post_delete.connect(invalidate_catalog, sender=model, dispatch_uid=f'catalog-delete-{model._meta.label}')
+m2m_changed.connect(invalidate_catalog, sender=Package.services.through, dispatch_uid='catalog-package-services')
@@ -0,0 +1,62 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from packages.models import Package
+
+from .catalog import CATALOG_VERSION_KEY, get_catalog
+from .models import Service, ServiceType
+
+
+class CatalogTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.service_type = ServiceType.objects.create(name='Cryotherapy', code='CRYO')
+        cls.service = Service.objects.create(
+            name='Whole Body', service_type=cls.service_type, duration_minutes=30, base_price=Decimal('50.00')
+        )
+
+    def setUp(self):
+        cache.clear()
+        # Every test starts without a catalog loaded in this process
+        patcher = mock.patch('services.catalog._catalog', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_catalog_is_reused_until_its_version_changes(self):
+        catalog = get_catalog()
+
+        with self.assertNumQueries(0):
+            self.assertIs(get_catalog(), catalog)
+        self.assertEqual(catalog.services[self.service.pk].base_price, Decimal('50.00'))
+
+    def test_committed_change_reloads_the_catalog(self):
+        catalog = get_catalog()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.service.base_price = Decimal('60.00')
+            self.service.save()
+        # Until the change commits every process keeps the catalog it has
+        self.assertIs(get_catalog(), catalog)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(cache.get(CATALOG_VERSION_KEY), catalog.version + 1)
+        self.assertEqual(get_catalog().services[self.service.pk].base_price, Decimal('60.00'))
+
+    def test_package_services_are_part_of_the_catalog(self):
+        get_catalog()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            package = Package.objects.create(
+                name='Ten Pack', category='CUSTOM', description='Ten sessions', total_sessions=10,
+                price=Decimal('400.00')
+            )
+            package.services.add(self.service)
+
+        catalog = get_catalog()
+        self.assertEqual(catalog.packages[package.pk].service_ids, (self.service.pk,))
+        self.assertEqual(catalog.service_names(package.pk), 'Whole Body')